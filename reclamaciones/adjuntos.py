@@ -0,0 +1,272 @@
+"""
+Adjuntos de las reclamaciones (fotos y PDFs de evidencia).
+
+El contenido se guarda por su SHA-256 en DIRECTORIO/ab/cd/<hash>: dos subidas con los
+mismos bytes ocupan un solo archivo, y la ruta nunca sale de lo que mande el cliente.
+La subida se escribe a disco por bloques mientras se calcula el hash
+(AdjuntoUploadHandler), sin armar el archivo en memoria. La descarga la sirve Django
+con FileResponse (sendfile del servidor WSGI) o nginx/Apache con X-Accel-Redirect /
+X-Sendfile, según RECLAMACIONES_ADJUNTOS['DESCARGA'].
+
+Borrar un adjunto no borra su contenido: otra subida con los mismos bytes puede estar
+reutilizándolo sin haber hecho commit todavía. Los archivos sin adjuntos se limpian con
+`manage.py limpiar_adjuntos`, que solo toca los que llevan más de GRACIA_HUERFANOS
+segundos sin usarse (guardar() les renueva la fecha al reutilizarlos).
+"""
+import hashlib
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.db.models import Count, Sum
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header
+
+
+SALT_TOKEN = 'reclamaciones.adjuntos'
+CAMPO = 'archivo'
+
+# Tipos aceptados, reconocidos por los primeros bytes (no por lo que diga el navegador)
+FIRMAS = (
+    (b'%PDF-', 'application/pdf'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+)
+ES_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+def config():
+    valores = {
+        'DIRECTORIO': os.path.join(settings.BASE_DIR, 'adjuntos'),
+        'TAMANO_MAXIMO': 10 * 1024 * 1024,
+        'CUOTA_PROVEEDOR': 1024 ** 3,
+        'VENTANA_ANONIMA': 3600,
+        # Lo que el cliente sin cuenta puede subir a una misma reclamación
+        'MAXIMO_ANONIMOS': 5,
+        'CUOTA_ANONIMA': 25 * 1024 * 1024,
+        'GRACIA_HUERFANOS': 24 * 3600,
+        'DESCARGA': 'django',
+        'PREFIJO_INTERNO': '/_adjuntos/',
+    }
+    valores.update(getattr(settings, 'RECLAMACIONES_ADJUNTOS', {}))
+    return valores
+
+
+def tipo_por_firma(inicio):
+    for firma, tipo in FIRMAS:
+        if inicio.startswith(firma):
+            return tipo
+    if inicio[:4] == b'RIFF' and inicio[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def ruta_relativa(sha256):
+    return os.path.join(sha256[:2], sha256[2:4], sha256)
+
+
+def ruta_absoluta(sha256):
+    if not ES_SHA256.match(sha256 or ''):
+        raise ValueError('Hash inválido')
+    return Path(config()['DIRECTORIO']) / ruta_relativa(sha256)
+
+
+# --- Token para que el cliente anónimo suba evidencias a la reclamación que acaba de crear ---
+
+def token_adjuntos(reclamacion_id):
+    return signing.dumps(reclamacion_id, salt=SALT_TOKEN)
+
+
+def token_valido(token, reclamacion_id):
+    try:
+        return signing.loads(token, salt=SALT_TOKEN, max_age=config()['VENTANA_ANONIMA']) == reclamacion_id
+    except signing.BadSignature:  # incluye SignatureExpired
+        return False
+
+
+def espacio_usado(proveedor_id):
+    from .models import ArchivoAdjunto
+    return ArchivoAdjunto.objects.filter(proveedor_id=proveedor_id).aggregate(total=Sum('tamano'))['total'] or 0
+
+
+def uso_de_reclamacion(reclamacion_id):
+    """(cantidad, bytes) de los adjuntos de una reclamación."""
+    from .models import ArchivoAdjunto
+    uso = ArchivoAdjunto.objects.filter(reclamacion_id=reclamacion_id).aggregate(cantidad=Count('id'), total=Sum('tamano'))
+    return uso['cantidad'], uso['total'] or 0
+
+
+# --- Subida ---
+
+class ArchivoRecibido(UploadedFile):
+    """Archivo ya escrito en el directorio temporal del almacén, con su hash y tipo real."""
+
+    def __init__(self, file, name, content_type, size, sha256):
+        super().__init__(file, name, content_type, size)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class AdjuntoUploadHandler(FileUploadHandler):
+    """
+    Escribe el campo `archivo` directamente a un temporal del almacén (mismo disco que
+    el destino, así guardar es un rename) calculando el SHA-256 en el camino. Corta la
+    subida apenas pasa el tamaño máximo o si los primeros bytes no son de un tipo aceptado.
+    El resto de archivos del formulario se descartan.
+    """
+
+    def __init__(self, request=None, tamano_maximo=None):
+        super().__init__(request)
+        self.tamano_maximo = tamano_maximo or config()['TAMANO_MAXIMO']
+        self.error = None
+        self.temporal = None
+        self.recibido = None
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.activo = field_name == CAMPO and self.recibido is None
+        if self.activo:
+            directorio = Path(config()['DIRECTORIO']) / 'tmp'
+            directorio.mkdir(parents=True, exist_ok=True)
+            self.temporal = tempfile.NamedTemporaryFile(dir=directorio, delete=False)
+            self.hash = hashlib.sha256()
+            self.tipo = None
+            self.escrito = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.activo:
+            return None
+        if start == 0:
+            self.tipo = tipo_por_firma(raw_data[:16])
+            if self.tipo is None:
+                self.cancelar('tipo')
+        self.escrito += len(raw_data)
+        if self.escrito > self.tamano_maximo:
+            self.cancelar('tamano')
+        self.hash.update(raw_data)
+        self.temporal.write(raw_data)
+        return None
+
+    def cancelar(self, error):
+        self.error = error
+        self.upload_interrupted()
+        raise StopUpload(connection_reset=False)
+
+    def file_complete(self, file_size):
+        if not self.activo:
+            return None
+        self.activo = False
+        if file_size == 0:
+            self.error = 'vacio'
+            self.upload_interrupted()
+            return None
+        self.temporal.flush()
+        self.temporal.seek(0)
+        self.recibido = ArchivoRecibido(
+            self.temporal, os.path.basename(self.file_name or 'archivo')[:255],
+            self.tipo, file_size, self.hash.hexdigest(),
+        )
+        return self.recibido
+
+    def upload_interrupted(self):
+        descartar_temporal(self.temporal)
+        self.temporal = None
+
+
+def descartar_temporal(temporal):
+    if temporal is None:
+        return
+    temporal.close()
+    try:
+        os.unlink(temporal.name)
+    except FileNotFoundError:
+        pass
+
+
+def guardar(recibido):
+    """
+    Mueve el temporal a su ruta por hash. Si ese contenido ya existía, solo borra el
+    temporal y le renueva la fecha al existente, para que limpiar_huerfanos no lo borre
+    antes de que el adjunto nuevo haga commit.
+    """
+    destino = ruta_absoluta(recibido.sha256)
+    recibido.file.close()
+    try:
+        os.utime(destino)
+    except FileNotFoundError:
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(recibido.temporary_file_path(), destino)
+        return True
+    descartar_temporal(recibido.file)
+    return False
+
+
+def limpiar_huerfanos(gracia=None):
+    """
+    Borra el contenido que ningún adjunto usa y los temporales de subidas cortadas, si
+    llevan más de `gracia` segundos sin tocarse. Devuelve la cantidad de archivos borrados.
+    """
+    from .models import ArchivoAdjunto
+    if gracia is None:
+        gracia = config()['GRACIA_HUERFANOS']
+    directorio = Path(config()['DIRECTORIO'])
+    limite = time.time() - gracia
+
+    def viejo(ruta):
+        try:
+            return ruta.stat().st_mtime < limite
+        except FileNotFoundError:
+            return False
+
+    def borrar(ruta):
+        try:
+            ruta.unlink()
+            return 1
+        except FileNotFoundError:
+            return 0
+
+    borrados = 0
+    for ruta in directorio.glob('tmp/*'):
+        if ruta.is_file() and viejo(ruta):
+            borrados += borrar(ruta)
+
+    candidatos = [ruta for ruta in directorio.glob('??/??/*') if ES_SHA256.match(ruta.name) and viejo(ruta)]
+    for inicio in range(0, len(candidatos), 500):
+        lote = candidatos[inicio:inicio + 500]
+        usados = set(ArchivoAdjunto.objects.filter(sha256__in=[ruta.name for ruta in lote]).values_list('sha256', flat=True))
+        for ruta in lote:
+            # Se vuelve a mirar la fecha: una subida pudo reutilizarlo después de la consulta
+            if ruta.name not in usados and viejo(ruta):
+                borrados += borrar(ruta)
+    return borrados
+
+
+# --- Descarga ---
+
+def respuesta_descarga(archivo):
+    ajustes = config()
+    ruta = ruta_absoluta(archivo.sha256)
+    disposicion = content_disposition_header(True, archivo.nombre_archivo)
+    modo = ajustes['DESCARGA']
+
+    if modo in ('x-accel', 'x-sendfile'):
+        # El servidor web lee y envía el archivo; Django solo responde las cabeceras
+        response = HttpResponse(content_type=archivo.content_type or 'application/octet-stream')
+        if modo == 'x-accel':
+            response['X-Accel-Redirect'] = ajustes['PREFIJO_INTERNO'].rstrip('/') + '/' + ruta_relativa(archivo.sha256)
+        else:
+            response['X-Sendfile'] = str(ruta)
+        response['Content-Disposition'] = disposicion
+        return response
+
+    response = FileResponse(open(ruta, 'rb'), content_type=archivo.content_type or None)
+    response['Content-Disposition'] = disposicion
+    return response
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ReclamacionesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reclamaciones'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .cache import exigir_caches_compartidos
+        from .limites import config
+
+        limites = config()
+        if limites['BACKEND'] == 'cache':
+            exigir_caches_compartidos(RECLAMACIONES_LIMITES=limites['DJANGO_CACHE'])
@@ -0,0 +1,367 @@
+"""
+Micro-benchmarks de las rutas calientes de reclamaciones.
+
+Se corren con `python manage.py benchmark [nombre ...]`. Cada corrida arma datos
+sintéticos dentro de una transacción que se revierte al terminar, así se puede
+apuntar a cualquier base (incluida la de desarrollo) sin dejar filas.
+Para agregar uno nuevo basta con decorar una función con @benchmark('nombre');
+recibe los datos sintéticos y el número de repeticiones y devuelve un dict.
+"""
+import http.client
+import io
+import json
+import statistics
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from .cache import invalidar_libros
+from .middleware import brotli, comprimir
+from .models import Cliente, Establecimiento, EstadoReclamacion, LibroReclamacion, Marca, Proveedor, Reclamacion
+from .perfil import construir_arbol_proveedor
+from .proyecciones import ProyeccionPlana
+from .renderers import RapidJSONParser, RapidJSONRenderer
+from .serializers import ReclamacionPlanoSerializer
+from usuarios.authentication import TenantRefreshToken
+from usuarios.models import Usuario
+from usuarios.views import LoginView
+
+
+BENCHMARKS = {}
+
+# Enlace con el que se estima el tiempo de transferencia (un 4G/ADSL modesto)
+ENLACE_MBPS = 10
+
+
+def benchmark(nombre):
+    def registrar(funcion):
+        BENCHMARKS[nombre] = funcion
+        return funcion
+    return registrar
+
+
+def medir(funcion, repeticiones):
+    """Mediana en segundos de `repeticiones` llamadas, después de una de calentamiento."""
+    funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos)
+
+
+def por_segundo(cantidad, segundos):
+    return round(cantidad / segundos, 1) if segundos else None
+
+
+@dataclass
+class DatosSinteticos:
+    proveedor: Proveedor
+    libro: LibroReclamacion
+    estado: EstadoReclamacion
+    filas: int
+
+
+def crear_datos(filas):
+    proveedor = Proveedor.objects.create(
+        razon_social='Proveedor benchmark', ruc='99999999999', domicilio_fiscal='Benchmark',
+        telefono='000000000', email_contacto='benchmark@canal.invalid'
+    )
+    marca = Marca.objects.create(proveedor=proveedor, nombre_marca='Benchmark', descripcion='Benchmark')
+    establecimiento = Establecimiento.objects.create(
+        marca=marca, nombre_establecimiento='Tienda benchmark',
+        telefono='000000000', email_contacto='benchmark@canal.invalid'
+    )
+    libro = LibroReclamacion.objects.create(
+        establecimiento=establecimiento, codigo_libro='BENCHMARK', establecimiento_slug='benchmark', estado='activo'
+    )
+    estado = EstadoReclamacion.objects.create(nombre_estado_reclamo='Recibido')
+
+    # Un tipo de documento propio: el par (tipo, número) es único y la base puede tener clientes reales
+    clientes = Cliente.objects.bulk_create([
+        Cliente(
+            nombre_cliente=f'Cliente {i}', tipo_doc_cliente='BENCHMARK', doc_id_cliente=f'{i:08d}',
+            fecha_nacimiento='1990-01-01', email=f'cliente{i}@canal.invalid', telefono='999888777'
+        )
+        for i in range(filas)
+    ], batch_size=1000)
+    if clientes and clientes[0].pk is None:
+        # MySQL no devuelve los ids de un INSERT masivo
+        clientes = list(Cliente.objects.filter(email__endswith='@canal.invalid').order_by('id'))
+
+    ahora = timezone.now()
+    Reclamacion.objects.bulk_create([
+        Reclamacion(
+            libro=libro, cliente=cliente, proveedor=proveedor, estado=estado,
+            fecha=ahora - timedelta(minutes=i), codigo_hoja=f'BENCH-{i:08d}',
+            tipo='reclamo' if i % 2 else 'queja', tipo_bien='producto',
+            descripcion_bien='Producto', detalle=f'Detalle de la reclamación {i}'
+        )
+        for i, cliente in enumerate(clientes)
+    ], batch_size=1000)
+    return DatosSinteticos(proveedor=proveedor, libro=libro, estado=estado, filas=filas)
+
+
+def correr(nombres, filas, repeticiones):
+    resultados = {}
+    with transaction.atomic():
+        datos = crear_datos(filas)
+        for nombre in nombres:
+            resultados[nombre] = BENCHMARKS[nombre](datos, repeticiones)
+        transaction.set_rollback(True)
+    return resultados
+
+
+@benchmark('tabla')
+def tabla(datos, repeticiones):
+    """reclamaciones/tabla: ReclamacionPlanoSerializer contra la proyección .values_list(), hasta los bytes JSON."""
+    renderer = JSONRenderer()
+    queryset = Reclamacion.objects.filter(proveedor=datos.proveedor).order_by('-fecha', '-id')
+    con_modelos = queryset.select_related('estado', 'cliente', 'libro__establecimiento')
+    proyeccion = ProyeccionPlana(ReclamacionPlanoSerializer)
+
+    serializer = medir(lambda: renderer.render(ReclamacionPlanoSerializer(con_modelos, many=True).data), repeticiones)
+    proyectado = medir(lambda: renderer.render(list(proyeccion.filas(queryset))), repeticiones)
+    return {
+        'filas': datos.filas,
+        'serializer_filas_s': por_segundo(datos.filas, serializer),
+        'proyeccion_filas_s': por_segundo(datos.filas, proyectado),
+        'aceleracion': round(serializer / proyectado, 2) if proyectado else None,
+    }
+
+
+def cargas_json(datos):
+    """Los dos payloads grandes de la API: el árbol de /api/perfil/ y la tabla completa."""
+    return {
+        'perfil': construir_arbol_proveedor(datos.proveedor),
+        'tabla': list(ProyeccionPlana(ReclamacionPlanoSerializer).filas(Reclamacion.objects.filter(proveedor=datos.proveedor))),
+    }
+
+
+@benchmark('json')
+def json_render(datos, repeticiones):
+    """Render y parseo: JSONRenderer/JSONParser de DRF contra los de orjson (renderers.py)."""
+    resultado = {}
+    for nombre, carga in cargas_json(datos).items():
+        drf = medir(lambda: JSONRenderer().render(carga), repeticiones)
+        rapido = medir(lambda: RapidJSONRenderer().render(carga), repeticiones)
+        cuerpo = JSONRenderer().render(carga)
+        parse_drf = medir(lambda: JSONParser().parse(io.BytesIO(cuerpo)), repeticiones)
+        parse_rapido = medir(lambda: RapidJSONParser().parse(io.BytesIO(cuerpo)), repeticiones)
+        resultado[nombre] = {
+            'bytes': len(cuerpo),
+            'identico': RapidJSONRenderer().render(carga) == cuerpo,
+            'render_drf_ms': round(drf * 1000, 2),
+            'render_rapido_ms': round(rapido * 1000, 2),
+            'parse_drf_ms': round(parse_drf * 1000, 2),
+            'parse_rapido_ms': round(parse_rapido * 1000, 2),
+        }
+    return resultado
+
+
+def transferencia_ms(cantidad_bytes):
+    return round(cantidad_bytes * 8 / (ENLACE_MBPS * 1_000_000) * 1000, 1)
+
+
+@benchmark('compresion')
+def compresion(datos, repeticiones):
+    """Tamaño, tiempo de compresión y transferencia estimada (a ENLACE_MBPS) con y sin CompresionMiddleware."""
+    config = getattr(settings, 'RECLAMACIONES_COMPRESION', {})
+    codificaciones = ('gzip', 'br') if brotli is not None else ('gzip',)
+    resultado = {}
+    for nombre, carga in cargas_json(datos).items():
+        cuerpo = RapidJSONRenderer().render(carga)
+        resultado[nombre] = {'identity': {'bytes': len(cuerpo), 'transferencia_ms': transferencia_ms(len(cuerpo))}}
+        for codificacion in codificaciones:
+            comprimido = comprimir(cuerpo, codificacion, config)
+            segundos = medir(lambda: comprimir(cuerpo, codificacion, config), repeticiones)
+            resultado[nombre][codificacion] = {
+                'bytes': len(comprimido),
+                'compresion_ms': round(segundos * 1000, 2),
+                'transferencia_ms': transferencia_ms(len(comprimido)),
+            }
+    return resultado
+
+
+@benchmark('login')
+def login(datos, repeticiones):
+    """POST /api/login completo (búsqueda, hasher y tokens) con las iteraciones de USUARIOS_PBKDF2_ITERACIONES."""
+    credenciales = {'email': 'login@benchmark.invalid', 'password': 'ClaveBenchmark123'}
+    Usuario.objects.create_user(proveedor=datos.proveedor, **credenciales)
+    vista = LoginView.as_view()
+    factory = APIRequestFactory()
+
+    def entrar():
+        response = vista(factory.post('/api/login', credenciales, format='json'))
+        assert response.status_code == 200, response.data
+
+    segundos = medir(entrar, repeticiones)
+    with CaptureQueriesContext(connection) as consultas:
+        entrar()
+    return {
+        'iteraciones': get_hasher().iterations,
+        'login_ms': round(segundos * 1000, 2),
+        'logins_s': por_segundo(1, segundos),
+        'consultas': len(consultas),
+    }
+
+
+# --- Extremo a extremo por el URLconf (api, api_listas) ---
+# django.test.Client recorre lo mismo que un request real (middleware, autenticación
+# JWT, throttles, vista, renderer) sin levantar un servidor. Por endpoint se reporta
+# p50/p95, consultas por request y el pico de memoria de Python (tracemalloc, en un
+# request aparte para no inflar las latencias).
+
+RUTAS_LISTAS = ['proveedores', 'marcas', 'establecimientos', 'libros', 'clientes', 'estados', 'reclamos', 'archivos']
+
+
+def medir_request(enviar, repeticiones):
+    enviar()
+    latencias, consultas = [], []
+    for _ in range(repeticiones):
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            response = enviar()
+            latencias.append(time.perf_counter() - inicio)
+        consultas.append(len(capturadas))
+
+    tracemalloc.start()
+    try:
+        enviar()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    cuerpo = b''.join(response.streaming_content) if response.streaming else response.content
+    return {
+        'status': response.status_code,
+        'bytes': len(cuerpo),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 2),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 2),
+        'consultas': max(consultas),
+        'memoria_pico_kb': round(pico / 1024),
+    }
+
+
+def cliente_api(datos):
+    """Client con el token JWT de un admin del proveedor sintético."""
+    email = 'api@benchmark.invalid'
+    usuario = Usuario.objects.filter(email=email).first() or Usuario.objects.create_user(
+        email=email, password='ClaveBenchmark123', proveedor=datos.proveedor, role='admin'
+    )
+    token = TenantRefreshToken.for_user(usuario).access_token
+    return Client(HTTP_AUTHORIZATION=f'Bearer {token}'), usuario
+
+
+@benchmark('api')
+def api(datos, repeticiones):
+    """Tabla, perfil, login y crear-reclamo por el URLconf real, con el proveedor de `filas` reclamaciones."""
+    client, usuario = cliente_api(datos)
+    numeros = iter(range(10**7, 10**8))
+    credenciales = {'email': usuario.email, 'password': 'ClaveBenchmark123'}
+
+    def crear_reclamo():
+        cuerpo = cuerpo_intake(datos.libro.codigo_libro, datos.estado.pk, next(numeros))
+        return Client().post('/api/reclamaciones/crear-reclamo/', cuerpo, content_type='application/json')
+
+    casos = {
+        'tabla': lambda: client.get('/api/reclamaciones/tabla/'),
+        'tabla_pagina': lambda: client.get('/api/reclamaciones/tabla/', {'page_size': 50}),
+        'perfil': lambda: client.get('/api/perfil/'),
+        'login': lambda: Client().post('/api/login', credenciales, content_type='application/json'),
+        'crear_reclamo': crear_reclamo,
+    }
+    # Todo sale de la misma IP: sin cubetas ni corte por p95 de la base (limites.py)
+    try:
+        with override_settings(RECLAMACIONES_LIMITES={'CUBETAS': {}, 'P95_BD_MAXIMO_MS': 0}):
+            return {nombre: medir_request(enviar, repeticiones) for nombre, enviar in casos.items()}
+    finally:
+        # Las reclamaciones y el libro se revierten con la transacción: que no queden en el cache
+        invalidar_libros()
+
+
+@benchmark('api_listas')
+def api_listas(datos, repeticiones):
+    """Los listados del router (/api/<recurso>/) tal como los ve un admin de proveedor."""
+    client, _ = cliente_api(datos)
+    return {ruta: medir_request(lambda: client.get(f'/api/{ruta}/'), repeticiones) for ruta in RUTAS_LISTAS}
+
+
+# --- Carga HTTP contra un servidor corriendo (manage.py carga_intake) ---
+# No usa la transacción de arriba: las reclamaciones se crean de verdad en el servidor
+# medido, así que hay que apuntarlo a una base de pruebas.
+
+def cuerpo_intake(codigo_libro, estado_id, numero):
+    return json.dumps({
+        'cliente': {
+            'nombre_cliente': f'Carga {numero}', 'tipo_doc_cliente': 'DNI', 'doc_id_cliente': f'{numero:08d}',
+            'fecha_nacimiento': '1990-01-01', 'email': f'carga{numero}@canal.invalid', 'telefono': '999888777',
+        },
+        'estado_id': estado_id, 'libro': codigo_libro, 'tipo': 'reclamo', 'tipo_bien': 'producto',
+        'descripcion_bien': 'Producto', 'detalle': f'Prueba de carga {numero}',
+    }).encode()
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def medir_carga(url, cuerpos, concurrencia, timeout=30):
+    """POST de cada cuerpo a `url` con `concurrencia` conexiones keep-alive en paralelo."""
+    partes = urlsplit(url)
+    clase = http.client.HTTPSConnection if partes.scheme == 'https' else http.client.HTTPConnection
+    local = threading.local()
+    latencias, estados, lock = [], Counter(), threading.Lock()
+
+    def enviar(cuerpo):
+        if not hasattr(local, 'conexion'):
+            local.conexion = clase(partes.netloc, timeout=timeout)
+        inicio = time.perf_counter()
+        try:
+            local.conexion.request('POST', partes.path, body=cuerpo, headers={'Content-Type': 'application/json'})
+            respuesta = local.conexion.getresponse()
+            respuesta.read()
+            estado = respuesta.status
+        except (OSError, http.client.HTTPException) as exc:
+            local.conexion.close()
+            del local.conexion
+            estado = type(exc).__name__
+        with lock:
+            latencias.append(time.perf_counter() - inicio)
+            estados[estado] += 1
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+        list(executor.map(enviar, cuerpos))
+    segundos = time.perf_counter() - inicio
+
+    return {
+        'url': url,
+        'requests': len(cuerpos),
+        'concurrencia': concurrencia,
+        'segundos': round(segundos, 2),
+        'requests_s': por_segundo(len(cuerpos), segundos),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 1),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 1),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 1),
+        'estados': {str(estado): cantidad for estado, cantidad in sorted(estados.items(), key=str)},
+    }
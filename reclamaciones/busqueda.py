@@ -0,0 +1,111 @@
+"""
+Búsqueda de texto completo sobre las reclamaciones (detalle, descripción del bien,
+pedido del cliente y nombre/documento del cliente).
+
+El índice es la tabla reclamaciones_busqueda, creada y llenada por la migración 0009:
+una tabla virtual FTS5 en SQLite y una tabla InnoDB con índice FULLTEXT en MySQL. Guarda
+solo el texto; el proveedor se filtra con un join a reclamaciones_reclamacion, así los cambios
+de dueño de un libro no tocan el índice. Se mantiene al día desde signals.py dentro de
+la misma transacción que la reclamación, y crear_reclamaciones_en_lote indexa su lote.
+"""
+import re
+
+from django.db import connection
+
+from .models import Reclamacion
+
+
+TABLA = 'reclamaciones_busqueda'
+MOTORES = ('sqlite', 'mysql')
+# Campos de Reclamacion que, si cambian, obligan a reindexar la fila
+CAMPOS_INDEXADOS = frozenset({'detalle', 'descripcion_bien', 'solicitud_cliente', 'cliente'})
+MAXIMO_TERMINOS = 10
+TERMINO = re.compile(r'\w+')
+
+SQL = {
+    'sqlite': {
+        'insertar': f"INSERT INTO {TABLA} (rowid, detalle, descripcion_bien, solicitud_cliente, cliente) VALUES (%s, %s, %s, %s, %s)",
+        'quitar': f"DELETE FROM {TABLA} WHERE rowid IN ({{}})",
+        # bm25 es menor cuanto más relevante
+        'buscar': (
+            f"SELECT {TABLA}.rowid FROM {TABLA} JOIN reclamaciones_reclamacion r ON r.id = {TABLA}.rowid "
+            f"WHERE {TABLA} MATCH %s {{filtro}} ORDER BY bm25({TABLA}), {TABLA}.rowid DESC LIMIT %s OFFSET %s"
+        ),
+    },
+    'mysql': {
+        'insertar': f"REPLACE INTO {TABLA} (reclamacion_id, detalle, descripcion_bien, solicitud_cliente, cliente) VALUES (%s, %s, %s, %s, %s)",
+        'quitar': f"DELETE FROM {TABLA} WHERE reclamacion_id IN ({{}})",
+        'buscar': (
+            f"SELECT b.reclamacion_id FROM {TABLA} b JOIN reclamaciones_reclamacion r ON r.id = b.reclamacion_id "
+            "WHERE MATCH (b.detalle, b.descripcion_bien, b.solicitud_cliente, b.cliente) AGAINST (%s IN BOOLEAN MODE) {filtro} "
+            "ORDER BY MATCH (b.detalle, b.descripcion_bien, b.solicitud_cliente, b.cliente) AGAINST (%s IN BOOLEAN MODE) DESC, "
+            "b.reclamacion_id DESC LIMIT %s OFFSET %s"
+        ),
+    },
+}
+
+
+def disponible():
+    return connection.vendor in MOTORES
+
+
+def _sql(nombre):
+    return SQL[connection.vendor][nombre]
+
+
+def _documentos(reclamaciones):
+    for id, detalle, descripcion, solicitud, nombre, documento in reclamaciones.values_list(
+        'id', 'detalle', 'descripcion_bien', 'solicitud_cliente', 'cliente__nombre_cliente', 'cliente__doc_id_cliente'
+    ):
+        yield id, detalle, descripcion, solicitud or '', f'{nombre} {documento}'
+
+
+def quitar(ids):
+    ids = [int(id) for id in ids]
+    if not ids or not disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(_sql('quitar').format(', '.join(['%s'] * len(ids))), ids)
+
+
+def indexar(ids):
+    """(Re)indexa las reclamaciones con esos ids; se llama dentro de la transacción que las escribe."""
+    ids = list(ids)
+    if not ids or not disponible():
+        return
+    quitar(ids)
+    with connection.cursor() as cursor:
+        cursor.executemany(_sql('insertar'), list(_documentos(Reclamacion.objects.filter(pk__in=ids))))
+
+
+def terminos(texto):
+    return TERMINO.findall(texto or '')[:MAXIMO_TERMINOS]
+
+
+def expresion(palabras):
+    """Todas las palabras, cada una como prefijo ("reembol" encuentra "reembolso")."""
+    if connection.vendor == 'mysql':
+        return ' '.join(f'+{palabra}*' for palabra in palabras)
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+def buscar(texto, proveedor_id=None, limite=100, desplazamiento=0):
+    """
+    Ids de reclamaciones que contienen todas las palabras de `texto`, de la más a la
+    menos relevante. `proveedor_id=None` busca en todas (superusuario).
+    """
+    palabras = terminos(texto)
+    if not palabras or not disponible():
+        return []
+    consulta = expresion(palabras)
+    filtro, parametros = '', []
+    if proveedor_id is not None:
+        filtro, parametros = 'AND r.proveedor_id = %s', [proveedor_id]
+    sql = _sql('buscar').format(filtro=filtro)
+    if connection.vendor == 'mysql':
+        parametros = [consulta, *parametros, consulta, limite, desplazamiento]
+    else:
+        parametros = [consulta, *parametros, limite, desplazamiento]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        return [fila[0] for fila in cursor.fetchall()]
@@ -0,0 +1,253 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from .models import EstadoReclamacion, LibroReclamacion, normalizar_codigo
+
+
+def exigir_caches_compartidos(**aliases):
+    """
+    Falla al arrancar si, con varios workers (settings.WORKERS), alguno de los caches que
+    tienen que verse entre procesos es LocMem: las marcas de invalidación y los contadores
+    quedarían en el worker que los escribió. `aliases`: nombre del setting -> alias de CACHES.
+    """
+    if getattr(settings, 'WORKERS', 1) <= 1:
+        return
+    locales = [f'{nombre} ({alias!r})' for nombre, alias in aliases.items() if isinstance(caches[alias], LocMemCache)]
+    if locales:
+        raise ImproperlyConfigured(
+            f"Con WORKERS={settings.WORKERS} estos caches no pueden ser LocMemCache, que es de cada proceso: "
+            f"{', '.join(locales)}. Configurar CACHE_BACKEND/CACHE_LOCATION con Redis o Memcached."
+        )
+
+
+# Cache LRU en memoria con expiración (un diccionario por proceso)
+class CacheLRU:
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            expira, valor = entrada
+            if expira < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+
+# Resolución de libros para el formulario público sin leer la base de datos.
+# Primer nivel: LRU del proceso. Segundo nivel (opcional): el cache de Django
+# compartido entre workers. Los cambios en libros/establecimientos/marcas limpian
+# el LRU local y suben una "generación" en el cache compartido, lo que invalida
+# todas sus claves de una vez. Otros procesos ven el cambio al expirar su LRU (TTL).
+# Los códigos y slugs vienen del usuario: en el cache compartido van hasheados, como
+# las claves de limites.py, para que no pasen a Redis/memcached tal como llegan.
+# El proveedor del libro cacheado es solo para leer: las escrituras lo vuelven a
+# leer de la base (Reclamacion.save y crear_reclamaciones_en_lote).
+class CacheLibros:
+    CLAVE_GENERACION = 'reclamaciones:libros:generacion'
+
+    def __init__(self, maxsize=1024, ttl=60, alias=None):
+        self.ttl = ttl
+        self.local = CacheLRU(maxsize=maxsize, ttl=ttl)
+        self.alias = alias
+
+    @classmethod
+    def desde_settings(cls):
+        config = getattr(settings, 'RECLAMACIONES_CACHE_LIBROS', {})
+        return cls(
+            maxsize=config.get('MAXSIZE', 1024),
+            ttl=config.get('TTL', 60),
+            alias=config.get('DJANGO_CACHE'),
+        )
+
+    @property
+    def compartido(self):
+        return caches[self.alias] if self.alias else None
+
+    @staticmethod
+    def _clave_compartida(clave, generacion):
+        digest = hashlib.sha256('|'.join(clave).encode()).hexdigest()[:32]
+        return f"reclamaciones:libros:{generacion}:{clave[0]}:{digest}"
+
+    def obtener(self, clave, cargar):
+        libro = self.local.get(clave)
+        if libro is None and self.compartido is not None:
+            clave_compartida = self._clave_compartida(clave, self.compartido.get(self.CLAVE_GENERACION, 0))
+            libro = self.compartido.get(clave_compartida)
+            if libro is not None:
+                self.local.set(clave, libro)
+        if libro is None:
+            libro = cargar()
+            if libro is None:
+                return None  # los códigos inexistentes no se guardan
+            self.local.set(clave, libro)
+            if self.compartido is not None:
+                self.compartido.set(clave_compartida, libro, self.ttl)
+        # Copia para que cada request tenga su propia instancia
+        return copy.copy(libro)
+
+    async def aobtener(self, clave, acargar):
+        """Igual que obtener() para las vistas async: el cache compartido y la BD se esperan."""
+        libro = self.local.get(clave)
+        if libro is None and self.compartido is not None:
+            generacion = await self.compartido.aget(self.CLAVE_GENERACION, 0)
+            clave_compartida = self._clave_compartida(clave, generacion)
+            libro = await self.compartido.aget(clave_compartida)
+            if libro is not None:
+                self.local.set(clave, libro)
+        if libro is None:
+            libro = await acargar()
+            if libro is None:
+                return None
+            self.local.set(clave, libro)
+            if self.compartido is not None:
+                await self.compartido.aset(clave_compartida, libro, self.ttl)
+        return copy.copy(libro)
+
+    def _activos(self, codigo_libro):
+        return LibroReclamacion.objects.filter(codigo_libro=codigo_libro, estado='activo').order_by('id')
+
+    def _por_slugs(self, libro_slug, establecimiento_slug):
+        return LibroReclamacion.objects.filter(libro_slug=libro_slug, establecimiento_slug=establecimiento_slug)
+
+    def libro_activo(self, codigo_libro):
+        return self.obtener(('codigo', codigo_libro), lambda: self._activos(codigo_libro).first())
+
+    def libro_por_slugs(self, libro_slug, establecimiento_slug):
+        return self.obtener(
+            ('slugs', libro_slug, establecimiento_slug),
+            lambda: self._por_slugs(libro_slug, establecimiento_slug).first(),
+        )
+
+    async def alibro_activo(self, codigo_libro):
+        return await self.aobtener(('codigo', codigo_libro), self._activos(codigo_libro).afirst)
+
+    async def alibro_por_slugs(self, libro_slug, establecimiento_slug):
+        return await self.aobtener(
+            ('slugs', libro_slug, establecimiento_slug), self._por_slugs(libro_slug, establecimiento_slug).afirst
+        )
+
+    def invalidar(self):
+        self.local.clear()
+        if self.compartido is not None:
+            try:
+                self.compartido.incr(self.CLAVE_GENERACION)
+            except ValueError:
+                self.compartido.add(self.CLAVE_GENERACION, 1, None)
+
+
+_cache_libros = None
+
+
+def cache_libros():
+    global _cache_libros
+    if _cache_libros is None:
+        _cache_libros = CacheLibros.desde_settings()
+    return _cache_libros
+
+
+def invalidar_libros():
+    # Se invalida ya y otra vez después del commit, para que nadie vuelva a guardar
+    # los datos viejos mientras la transacción sigue abierta
+    cache_libros().invalidar()
+    transaction.on_commit(lambda: cache_libros().invalidar())
+
+
+# Estados de reclamación: son pocos y casi nunca cambian, así que cada proceso los
+# carga todos de una vez y los busca por id o por código/nombre normalizado sin ir
+# a la base de datos. Los cambios (signals.py) limpian el registro de este proceso;
+# los demás lo recargan al vencer el TTL. Un id desconocido recarga antes de tiempo
+# (puede ser un estado nuevo de otro proceso), pero a lo sumo una vez cada
+# RECARGA_MINIMA segundos: ids inventados en el intake no llegan a la base.
+class RegistroEstados:
+    def __init__(self, ttl=300, recarga_minima=5):
+        self.ttl = ttl
+        self.recarga_minima = recarga_minima
+        self._lock = threading.Lock()
+        self._datos = None
+        self._expira = 0
+        self._cargado = None
+
+    @classmethod
+    def desde_settings(cls):
+        config = getattr(settings, 'RECLAMACIONES_CACHE_ESTADOS', {})
+        return cls(ttl=config.get('TTL', 300), recarga_minima=config.get('RECARGA_MINIMA', 5))
+
+    def _cargar(self):
+        datos = self._datos
+        if datos is not None and self._expira > time.monotonic():
+            return datos
+        with self._lock:
+            if self._datos is None or self._expira <= time.monotonic():
+                estados = list(EstadoReclamacion.objects.order_by('id'))
+                por_codigo = {}
+                for estado in estados:
+                    # Si dos estados comparten código o nombre gana el más antiguo
+                    por_codigo.setdefault(normalizar_codigo(estado.codigo), estado)
+                    por_codigo.setdefault(normalizar_codigo(estado.nombre_estado_reclamo), estado)
+                self._datos = (estados, {estado.pk: estado for estado in estados}, por_codigo)
+                self._cargado = time.monotonic()
+                self._expira = self._cargado + self.ttl
+            return self._datos
+
+    def todos(self):
+        return [copy.copy(estado) for estado in self._cargar()[0]]
+
+    def por_id(self, estado_id):
+        estado = self._cargar()[1].get(estado_id)
+        if estado is None and time.monotonic() - self._cargado >= self.recarga_minima:
+            # Puede ser un estado creado en otro proceso después de la última carga
+            self.invalidar()
+            estado = self._cargar()[1].get(estado_id)
+        return copy.copy(estado) if estado is not None else None
+
+    def por_codigo(self, codigo):
+        """Por código o por nombre, sin importar mayúsculas, tildes ni espacios."""
+        estado = self._cargar()[2].get(normalizar_codigo(codigo))
+        return copy.copy(estado) if estado is not None else None
+
+    def invalidar(self):
+        with self._lock:
+            self._datos = None
+
+
+_registro_estados = None
+
+
+def registro_estados():
+    global _registro_estados
+    if _registro_estados is None:
+        _registro_estados = RegistroEstados.desde_settings()
+    return _registro_estados
+
+
+def invalidar_estados():
+    registro_estados().invalidar()
+    transaction.on_commit(lambda: registro_estados().invalidar())
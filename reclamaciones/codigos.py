@@ -0,0 +1,93 @@
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from .models import SecuenciaHoja
+
+
+# Generadores de codigo_hoja. Se elige uno con RECLAMACIONES_CODIGO_HOJA['GENERADOR'].
+class GeneradorCodigoHoja:
+    def generar(self, libro):
+        raise NotImplementedError
+
+    def generar_lote(self, libro, cantidad):
+        return [self.generar(libro) for _ in range(cantidad)]
+
+
+# Formato anterior: 8 caracteres aleatorios. Depende del índice único ante choques.
+class GeneradorUUID(GeneradorCodigoHoja):
+    def generar(self, libro):
+        return f"H-{uuid.uuid4().hex[:8].upper()}"
+
+
+# Numeración correlativa por libro estilo SUNAT: <libro>-<número>, p. ej. 0007-00000123.
+#
+# Cada proceso reserva un bloque de números con un solo UPDATE ... SET siguiente =
+# siguiente + bloque y los reparte en memoria, así que la fila del contador solo se
+# bloquea una vez por bloque y dos workers nunca reciben el mismo número. Los números
+# de un bloque que no se llega a usar (reinicio del worker) quedan como saltos.
+#
+# Dentro de una transacción abierta solo se reserva lo que se va a usar: si la
+# transacción se revierte, la reserva se revierte con ella y no queda nada en memoria.
+class GeneradorSecuencial(GeneradorCodigoHoja):
+    formato = '{libro:04d}-{numero:08d}'
+
+    def __init__(self, bloque=50):
+        self.bloque = bloque
+        self._rangos = {}  # libro_id -> [siguiente, fin)
+        self._lock = threading.Lock()
+
+    def generar(self, libro):
+        return self.generar_lote(libro, 1)[0]
+
+    def generar_lote(self, libro, cantidad):
+        numeros = []
+        if connection.in_atomic_block:
+            inicio = self.reservar(libro.pk, cantidad)
+            numeros = list(range(inicio, inicio + cantidad))
+        else:
+            with self._lock:
+                while len(numeros) < cantidad:
+                    siguiente, fin = self._rangos.get(libro.pk, (0, 0))
+                    if siguiente >= fin:
+                        faltan = cantidad - len(numeros)
+                        tamano = max(self.bloque, faltan)
+                        siguiente = self.reservar(libro.pk, tamano)
+                        fin = siguiente + tamano
+                    tomar = min(cantidad - len(numeros), fin - siguiente)
+                    numeros.extend(range(siguiente, siguiente + tomar))
+                    self._rangos[libro.pk] = (siguiente + tomar, fin)
+        return [self.formato.format(libro=libro.pk, numero=numero) for numero in numeros]
+
+    def reservar(self, libro_id, cantidad):
+        """Reserva `cantidad` números seguidos del libro y devuelve el primero."""
+        with transaction.atomic():
+            actualizadas = SecuenciaHoja.objects.filter(libro_id=libro_id).update(
+                siguiente=F('siguiente') + cantidad
+            )
+            if not actualizadas:
+                try:
+                    with transaction.atomic():
+                        SecuenciaHoja.objects.create(libro_id=libro_id, siguiente=1 + cantidad)
+                    return 1
+                except IntegrityError:
+                    # Otro worker creó el contador al mismo tiempo
+                    SecuenciaHoja.objects.filter(libro_id=libro_id).update(siguiente=F('siguiente') + cantidad)
+            fin = SecuenciaHoja.objects.filter(libro_id=libro_id).values_list('siguiente', flat=True).get()
+        return fin - cantidad
+
+
+_generador = None
+
+
+def generador_codigo_hoja():
+    global _generador
+    if _generador is None:
+        config = getattr(settings, 'RECLAMACIONES_CODIGO_HOJA', {})
+        clase = import_string(config.get('GENERADOR', 'reclamaciones.codigos.GeneradorSecuencial'))
+        _generador = clase(**config.get('OPCIONES', {}))
+    return _generador
@@ -0,0 +1,50 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .models import VersionDatos
+
+
+def validadores(request, extra=''):
+    """
+    (ETag, Last-Modified) de la respuesta para el proveedor del usuario, o None si no aplica
+    (superusuario o usuario sin proveedor: sus datos no dependen de una sola versión).
+    El ETag es fuerte: mientras la versión no cambie, la misma URL devuelve los mismos bytes.
+    `extra` es lo que además de la URL cambia la respuesta (p. ej. la fecha de hoy).
+    """
+    user = request.user
+    proveedor_id = getattr(user, 'proveedor_id', None)
+    if user.is_superuser or not proveedor_id:
+        return None
+    version, actualizado = VersionDatos.de_proveedor(proveedor_id)
+    # El cuerpo también depende del usuario (perfil), de la URL (depth, cursor...) y del renderer
+    variante = '|'.join([str(user.pk), request.get_full_path(), request.accepted_media_type or '', extra])
+    etag = f'"v{version}-{hashlib.sha256(variante.encode()).hexdigest()[:20]}"'
+    return etag, int(actualizado.timestamp()) if actualizado else None
+
+
+# GET condicional para los tableros: si el ETag (o Last-Modified) que manda el cliente
+# sigue vigente se responde 304 con una sola consulta, sin tocar los querysets pesados.
+# Si la respuesta depende de algo que no está en la URL, la vista lo devuelve en
+# variante_condicional(request) y entra en el ETag.
+def get_condicional(handler):
+    @wraps(handler)
+    def envoltura(self, request, *args, **kwargs):
+        variante = getattr(self, 'variante_condicional', None)
+        validador = validadores(request, variante(request) if variante else '')
+        if validador is None:
+            return handler(self, request, *args, **kwargs)
+
+        etag, ultima_modificacion = validador
+        condicional = get_conditional_response(request, etag=etag, last_modified=ultima_modificacion)
+        response = condicional or handler(self, request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if ultima_modificacion is not None:
+                response['Last-Modified'] = http_date(ultima_modificacion)
+            # El navegador guarda la respuesta pero la revalida en cada consulta del tablero
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return envoltura
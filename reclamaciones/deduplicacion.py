@@ -0,0 +1,115 @@
+"""
+Fusión de clientes duplicados: antes de Cliente.resolver cada reclamación creaba su
+propio Cliente, aunque fuera el mismo documento.
+
+Deja un solo Cliente por (tipo_doc_cliente, doc_id_cliente) normalizados: el más
+antiguo, con sus propios datos de contacto (los duplicados solo completan los que
+tenga vacíos, igual que Cliente.resolver). Las reclamaciones y los
+representantes legales de los demás pasan a él. Se trabaja de a `lote` documentos por
+transacción, así una tabla grande no queda bloqueada de una vez. Lo usa
+manage.py dedupe_clientes; la migración 0012 hace lo mismo (con una copia propia)
+antes de crear el índice único, así que correr el comando antes de migrar deja la
+migración casi sin trabajo.
+"""
+from django.db import models, transaction
+from django.db.models import Case, Count, Value, When
+
+from . import busqueda
+from .models import Cliente, Reclamacion, RepresentanteLegal, VersionDatos, normalizar_documento
+
+
+CAMPOS_DOCUMENTO = ['tipo_doc_cliente', 'doc_id_cliente']
+
+
+def reemplazar_cliente(queryset, reemplazos):
+    """UPDATE ... SET cliente_id = CASE ... de todas las filas de `queryset` en una consulta."""
+    casos = [When(cliente_id=viejo, then=Value(nuevo)) for viejo, nuevo in reemplazos.items()]
+    return queryset.filter(cliente_id__in=reemplazos).update(
+        cliente_id=Case(*casos, output_field=models.BigIntegerField())
+    )
+
+
+def fusionar(grupos):
+    """
+    Cada grupo es una lista de clientes del mismo documento ordenada por pk. Queda el
+    primero, con el documento normalizado; de los demás, en orden, solo se toman los
+    datos de contacto que le falten. Devuelve cuántos clientes borró.
+    """
+    reemplazos, conservados = {}, []
+    for clientes in grupos:
+        conservado = clientes[0]
+        conservado.tipo_doc_cliente, conservado.doc_id_cliente = normalizar_documento(
+            conservado.tipo_doc_cliente, conservado.doc_id_cliente
+        )
+        for duplicado in clientes[1:]:
+            Cliente.completar_vacios(conservado, {campo: getattr(duplicado, campo) for campo in Cliente.CAMPOS_CONTACTO})
+        conservados.append(conservado)
+        reemplazos.update({cliente.pk: conservado.pk for cliente in clientes[1:]})
+    if not conservados:
+        return 0
+
+    with transaction.atomic():
+        todos = [cliente.pk for clientes in grupos for cliente in clientes]
+        afectadas = list(Reclamacion.objects.filter(cliente_id__in=todos).values_list('pk', 'proveedor_id'))
+        reemplazar_cliente(Reclamacion.objects.all(), reemplazos)
+        reemplazar_cliente(RepresentanteLegal.objects.all(), reemplazos)
+        # Primero se borran los duplicados, así el documento normalizado queda libre en el índice único
+        Cliente.objects.filter(pk__in=reemplazos).delete()
+        Cliente.objects.bulk_update(conservados, [*CAMPOS_DOCUMENTO, *Cliente.CAMPOS_CONTACTO])
+        # update() no dispara signals: el nombre del cliente se busca y sale en las tablas
+        busqueda.indexar(pk for pk, _ in afectadas)
+        VersionDatos.incrementar_al_confirmar(*{proveedor_id for _, proveedor_id in afectadas})
+    return len(reemplazos)
+
+
+def agrupar(clientes, documentos=None):
+    """{documento normalizado: [clientes]} ordenados por pk; solo `documentos` si se indican."""
+    grupos = {}
+    for cliente in sorted(clientes, key=lambda cliente: cliente.pk):
+        clave = normalizar_documento(cliente.tipo_doc_cliente, cliente.doc_id_cliente)
+        if documentos is None or clave in documentos:
+            grupos.setdefault(clave, []).append(cliente)
+    return grupos
+
+
+def normalizar_documentos(lote=500):
+    """
+    Normaliza el documento de los clientes guardados antes de normalizar_documento. Si
+    al normalizarlo choca con otro cliente, se fusionan. Devuelve cuántos clientes borró.
+    """
+    borrados = 0
+    ultimo = 0
+    while True:
+        tramo = list(Cliente.objects.filter(pk__gt=ultimo).order_by('pk')[:lote])
+        if not tramo:
+            return borrados
+        ultimo = tramo[-1].pk
+        pendientes = agrupar(
+            cliente for cliente in tramo
+            if normalizar_documento(cliente.tipo_doc_cliente, cliente.doc_id_cliente) != (cliente.tipo_doc_cliente, cliente.doc_id_cliente)
+        )
+        if not pendientes:
+            continue
+        # Los que ya tienen ese documento normalizado (de este tramo o de otros)
+        ya_normalizados = Cliente.objects.filter(
+            doc_id_cliente__in={numero for _, numero in pendientes}
+        ).exclude(pk__in=[cliente.pk for clientes in pendientes.values() for cliente in clientes])
+        for clave, clientes in agrupar(ya_normalizados, pendientes).items():
+            pendientes[clave] = sorted(pendientes[clave] + clientes, key=lambda cliente: cliente.pk)
+        borrados += fusionar(list(pendientes.values()))
+
+
+def documentos_duplicados():
+    grupos = Cliente.objects.values(*CAMPOS_DOCUMENTO).annotate(n=Count('id')).filter(n__gt=1).order_by()
+    return [(grupo['tipo_doc_cliente'], grupo['doc_id_cliente']) for grupo in grupos]
+
+
+def fusionar_duplicados(lote=500):
+    """(documentos con duplicados, clientes borrados)."""
+    borrados = normalizar_documentos(lote)
+    documentos = documentos_duplicados()
+    for inicio in range(0, len(documentos), lote):
+        tramo = set(documentos[inicio:inicio + lote])
+        clientes = Cliente.objects.filter(doc_id_cliente__in={numero for _, numero in tramo})
+        borrados += fusionar([grupo for grupo in agrupar(clientes, tramo).values() if len(grupo) > 1])
+    return len(documentos), borrados
@@ -0,0 +1,68 @@
+"""
+Estadísticas del tablero sobre la tabla ReclamacionStatsDiario.
+
+Las consultas suman filas ya agregadas por día (a lo más una por establecimiento, tipo,
+tipo de bien y estado en cada día), así un rango de meses lee unas cuantas filas por día
+en vez de agrupar todas las reclamaciones del proveedor.
+"""
+from datetime import timedelta
+
+from django.db.models import Sum
+from django.utils import timezone
+
+
+DIAS_POR_DEFECTO = 30
+
+# ?agrupar= -> columnas de ReclamacionStatsDiario y nombre con que salen en la respuesta
+AGRUPACIONES = {
+    'dia': {'fecha': 'fecha'},
+    'establecimiento': {'establecimiento_id': 'establecimiento_id', 'establecimiento__nombre_establecimiento': 'establecimiento'},
+    'tipo': {'tipo': 'tipo'},
+    'tipo_bien': {'tipo_bien': 'tipo_bien'},
+    'estado': {'estado_id': 'estado_id', 'estado__nombre_estado_reclamo': 'estado'},
+}
+
+
+def _monto(valor):
+    # Como DecimalField de DRF: texto con dos decimales, sin pasar por float
+    return f'{valor or 0:.2f}'
+
+
+def rango(filtros):
+    hasta = filtros.get('hasta') or timezone.localdate()
+    desde = filtros.get('desde') or hasta - timedelta(days=DIAS_POR_DEFECTO - 1)
+    return desde, hasta
+
+
+def consultar(queryset, filtros):
+    """`queryset` de ReclamacionStatsDiario ya filtrado por tenant; `filtros` validados."""
+    desde, hasta = rango(filtros)
+    queryset = queryset.filter(fecha__range=(desde, hasta))
+    for campo in ('establecimiento', 'estado', 'tipo', 'tipo_bien'):
+        if filtros.get(campo):
+            queryset = queryset.filter(**{campo: filtros[campo]})
+
+    agrupar = filtros.get('agrupar') or ['dia']
+    columnas = {columna: nombre for grupo in agrupar for columna, nombre in AGRUPACIONES[grupo].items()}
+    filas = (
+        queryset.values(*columnas)
+        .annotate(total=Sum('cantidad'), monto=Sum('monto_reclamado'))
+        .filter(total__gt=0)
+        .order_by(*columnas)
+    )
+    resultados = []
+    cantidad, monto = 0, 0
+    for fila in filas:
+        resultado = {nombre: fila[columna] for columna, nombre in columnas.items()}
+        resultado['cantidad'] = fila['total']
+        resultado['monto_reclamado'] = _monto(fila['monto'])
+        resultados.append(resultado)
+        cantidad += fila['total']
+        monto += fila['monto'] or 0
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'agrupar': agrupar,
+        'total': {'cantidad': cantidad, 'monto_reclamado': _monto(monto)},
+        'resultados': resultados,
+    }
@@ -0,0 +1,198 @@
+"""
+Exportación del libro de reclamaciones completo (CSV o XLSX) para entregarlo a INDECOPI.
+
+Las filas salen de la proyección de ReclamacionExportacionSerializer con .iterator(),
+así que exportar cientos de miles de reclamaciones usa memoria constante: ni la vista
+(StreamingHttpResponse) ni el comando exportar_reclamaciones arman el archivo completo.
+El XLSX se escribe como un zip en streaming con celdas inlineStr, sin tabla de strings
+compartidos ni librerías externas.
+"""
+import codecs
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime, time, timedelta
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.utils import timezone
+
+from .proyecciones import ProyeccionPlana
+from .serializers import ReclamacionExportacionSerializer
+
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+proyeccion = ProyeccionPlana(ReclamacionExportacionSerializer)
+COLUMNAS = [nombre for nombre, *_ in proyeccion.campos]
+
+# Filas por cada bloque de bytes que se entrega al cliente o al archivo
+FILAS_POR_BLOQUE = 500
+
+# Una celda que empieza así la evalúa Excel/LibreOffice como fórmula al abrir el CSV
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+# Caracteres de control que XML 1.0 no admite
+CONTROL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+MAXIMO_CELDA_XLSX = 32767
+
+
+def filtrar(queryset, filtros):
+    """Aplica los filtros ya validados por FiltrosExportacionSerializer, en orden cronológico."""
+    if filtros.get('desde'):
+        queryset = queryset.filter(fecha__gte=timezone.make_aware(datetime.combine(filtros['desde'], time.min)))
+    if filtros.get('hasta'):
+        # Hasta el final del día: < día siguiente, para que use el índice sobre fecha
+        siguiente = filtros['hasta'] + timedelta(days=1)
+        queryset = queryset.filter(fecha__lt=timezone.make_aware(datetime.combine(siguiente, time.min)))
+    if filtros.get('estado'):
+        queryset = queryset.filter(estado_id=filtros['estado'])
+    if filtros.get('establecimiento'):
+        queryset = queryset.filter(libro__establecimiento_id=filtros['establecimiento'])
+    return queryset.order_by('fecha', 'id')
+
+
+def nombre_archivo(formato):
+    return f"reclamaciones-{timezone.localdate():%Y%m%d}.{formato}"
+
+
+def filas(queryset, chunk_size=None):
+    """Cada reclamación como lista de valores en el orden de COLUMNAS (None si no hay valor)."""
+    chunk_size = chunk_size or getattr(settings, 'RECLAMACIONES_STREAM_CHUNK_SIZE', 2000)
+    for fila in proyeccion.filas(queryset, chunk_size=chunk_size):
+        yield [fila.get(columna) for columna in COLUMNAS]
+
+
+def exportar(queryset, formato, chunk_size=None):
+    """Iterador de bytes del archivo completo."""
+    generador = {'csv': generar_csv, 'xlsx': generar_xlsx}[formato]
+    return generador(filas(queryset, chunk_size))
+
+
+# --- CSV ---
+
+def celda_csv(valor):
+    if valor is None:
+        return ''
+    valor = str(valor)
+    if valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def generar_csv(filas):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUMNAS)
+    pendientes = 0
+    # BOM para que Excel reconozca UTF-8 (tildes y eñes del formulario)
+    yield codecs.BOM_UTF8
+    for fila in filas:
+        escritor.writerow([celda_csv(valor) for valor in fila])
+        pendientes += 1
+        if pendientes == FILAS_POR_BLOQUE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            pendientes = 0
+    yield buffer.getvalue().encode()
+
+
+# --- XLSX ---
+
+class _Tubo:
+    """Destino sin seek() para zipfile: guarda lo escrito hasta que el generador lo entrega."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+PARTES_FIJAS_XLSX = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Reclamaciones" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def celda_xlsx(valor):
+    if valor is None:
+        return '<c/>'
+    texto = CONTROL_XML.sub('', str(valor))[:MAXIMO_CELDA_XLSX]
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(texto)}</t></is></c>'
+
+
+def fila_xlsx(valores):
+    return '<row>' + ''.join(celda_xlsx(valor) for valor in valores) + '</row>'
+
+
+def generar_xlsx(filas):
+    tubo = _Tubo()
+    with zipfile.ZipFile(tubo, 'w', compression=zipfile.ZIP_DEFLATED) as libro:
+        for nombre, contenido in PARTES_FIJAS_XLSX.items():
+            libro.writestr(nombre, contenido)
+        yield tubo.vaciar()
+
+        # force_zip64: el tamaño de la hoja no se conoce al empezar y puede pasar de 2 GB
+        with libro.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja:
+            hoja.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + fila_xlsx(COLUMNAS)
+            ).encode())
+            bloque = []
+            for fila in filas:
+                bloque.append(fila_xlsx(fila))
+                if len(bloque) == FILAS_POR_BLOQUE:
+                    hoja.write(''.join(bloque).encode())
+                    bloque = []
+                    yield tubo.vaciar()
+            hoja.write((''.join(bloque) + '</sheetData></worksheet>').encode())
+        yield tubo.vaciar()
+    # Directorio central del zip
+    yield tubo.vaciar()
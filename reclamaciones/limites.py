@@ -0,0 +1,207 @@
+"""
+Límites del formulario público (crear-reclamo), que no pide autenticación.
+
+Cada envío gasta una ficha de dos cubetas (token bucket): la de su IP y la de la
+huella del cliente (X-Client-Fingerprint si el front la manda, si no User-Agent +
+Accept-Language + IP). Las cubetas se llenan a POR_MINUTO fichas por minuto hasta
+CAPACIDAD, así se permite una ráfaga corta pero no un goteo sostenido. Sin fichas en
+alguna se responde 429 con Retry-After.
+
+No hay cubeta por libro a propósito: la llenaría cualquiera que conozca el código y
+dejaría sin poder reclamar a los clientes reales de ese libro.
+
+La IP sale de REMOTE_ADDR, o de X-Forwarded-For si REST_FRAMEWORK['NUM_PROXIES'] dice
+cuántos proxys propios hay delante (nginx = 1). Con NUM_PROXIES en None DRF usaría el
+X-Forwarded-For que manda el cliente y cada envío podría estrenar cubetas.
+
+Backend 'local': un diccionario por proceso (cada worker cuenta lo suyo). 'cache': en
+CACHES[DJANGO_CACHE], compartido entre workers; leer y escribir la cubeta no es atómico,
+así que bajo mucha concurrencia puede dejar pasar algún envío de más.
+
+Antes de todo eso, si el p95 de las consultas recientes de este proceso pasa
+P95_BD_MAXIMO_MS se responde 503 sin parsear ni validar nada: mejor rechazar pronto
+que dejar que los envíos anónimos agoten las conexiones a la base.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import BaseThrottle
+
+from .middleware import latencias_bd
+
+
+def config():
+    valores = {
+        'BACKEND': 'local',
+        'DJANGO_CACHE': 'default',
+        'MAXSIZE': 10000,
+        'CUBETAS': {
+            'ip': {'CAPACIDAD': 30, 'POR_MINUTO': 30},
+            'huella': {'CAPACIDAD': 5, 'POR_MINUTO': 5},
+        },
+        'P95_BD_MAXIMO_MS': 500,
+        'MINIMO_MUESTRAS': 50,
+        'RETRY_AFTER_SATURACION': 5,
+    }
+    valores.update(getattr(settings, 'RECLAMACIONES_LIMITES', {}))
+    return valores
+
+
+def llenar(estado, capacidad, por_segundo, ahora):
+    """Fichas disponibles ahora, a partir del estado guardado (fichas, instante)."""
+    if estado is None:
+        return capacidad
+    fichas, instante = estado
+    return min(capacidad, fichas + (ahora - instante) * por_segundo)
+
+
+def espera(fichas, por_segundo):
+    """Segundos hasta tener una ficha entera."""
+    return max(1, math.ceil((1 - fichas) / por_segundo))
+
+
+# --- Backends ---
+
+class CubetasLocales:
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._cubetas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, clave, capacidad, por_segundo):
+        """0 si había ficha (y la gasta); si no, los segundos a esperar."""
+        ahora = time.time()
+        with self._lock:
+            fichas = llenar(self._cubetas.get(clave), capacidad, por_segundo, ahora)
+            resultado = 0 if fichas >= 1 else espera(fichas, por_segundo)
+            self._cubetas[clave] = (fichas - 1 if fichas >= 1 else fichas, ahora)
+            self._cubetas.move_to_end(clave)
+            while len(self._cubetas) > self.maxsize:
+                self._cubetas.popitem(last=False)
+        return resultado
+
+    def reiniciar(self):
+        with self._lock:
+            self._cubetas.clear()
+
+
+class CubetasCache:
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    def consumir(self, clave, capacidad, por_segundo):
+        cache = caches[self.alias]
+        ahora = time.time()
+        clave = f'reclamaciones:limites:{clave}'
+        fichas = llenar(cache.get(clave), capacidad, por_segundo, ahora)
+        resultado = 0 if fichas >= 1 else espera(fichas, por_segundo)
+        # Expira cuando la cubeta ya estaría llena de nuevo
+        cache.set(clave, (fichas - 1 if fichas >= 1 else fichas, ahora), math.ceil(capacidad / por_segundo) + 1)
+        return resultado
+
+    def reiniciar(self):
+        pass  # las entradas expiran solas
+
+
+_backends = {}
+
+
+def backend(ajustes=None):
+    ajustes = ajustes or config()
+    clave = (ajustes['BACKEND'], ajustes['DJANGO_CACHE'])
+    if clave not in _backends:
+        if ajustes['BACKEND'] == 'cache':
+            _backends[clave] = CubetasCache(ajustes['DJANGO_CACHE'])
+        else:
+            _backends[clave] = CubetasLocales(ajustes['MAXSIZE'])
+    return _backends[clave]
+
+
+# --- Intake ---
+
+def ip_cliente(request):
+    # Igual que los throttles de DRF: REMOTE_ADDR, o el X-Forwarded-For que agregó el
+    # último de NUM_PROXIES proxys (ver settings)
+    return BaseThrottle().get_ident(request)
+
+
+def huella(request):
+    meta = request.META
+    propia = meta.get('HTTP_X_CLIENT_FINGERPRINT')
+    partes = [propia] if propia else [meta.get('HTTP_USER_AGENT', ''), meta.get('HTTP_ACCEPT_LANGUAGE', ''), ip_cliente(request)]
+    return hashlib.sha256('|'.join(partes).encode()).hexdigest()[:32]
+
+
+def claves_intake(request):
+    return {'ip': ip_cliente(request), 'huella': huella(request)}
+
+
+def consumir_intake(request):
+    """
+    Gasta una ficha de cada cubeta del envío. 0 si pasa; si no, los segundos para
+    Retry-After. Las cubetas que sí tenían ficha la gastan igual: quien insiste sin
+    esperar no recupera fichas en ninguna.
+    """
+    ajustes = config()
+    cubetas = backend(ajustes)
+    esperas = [0]
+    for nombre, valor in claves_intake(request).items():
+        limite = ajustes['CUBETAS'].get(nombre)
+        if not limite:
+            continue
+        por_segundo = limite['POR_MINUTO'] / 60
+        esperas.append(cubetas.consumir(f'intake:{nombre}:{valor}', limite['CAPACIDAD'], por_segundo))
+    return max(esperas)
+
+
+def saturacion_bd():
+    """Segundos para Retry-After si la base va demasiado lenta, o None."""
+    ajustes = config()
+    maximo = ajustes['P95_BD_MAXIMO_MS']
+    if not maximo:
+        return None
+    p95, _ = latencias_bd.p95(minimo_muestras=ajustes['MINIMO_MUESTRAS'])
+    if p95 is not None and p95 * 1000 > maximo:
+        return ajustes['RETRY_AFTER_SATURACION']
+    return None
+
+
+class BaseSaturada(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'El servicio está saturado. Intente nuevamente en unos segundos.'
+    default_code = 'saturado'
+
+    def __init__(self, wait):
+        super().__init__()
+        # El exception handler de DRF lo pone en Retry-After
+        self.wait = wait
+
+
+# --- Throttles de DRF (CrearReclamacionConClienteView) ---
+
+class SaturacionBDThrottle(BaseThrottle):
+    """Va primero: corta con 503 sin parsear el cuerpo."""
+
+    def allow_request(self, request, view):
+        segundos = saturacion_bd()
+        if segundos:
+            raise BaseSaturada(segundos)
+        return True
+
+
+class IntakeThrottle(BaseThrottle):
+    """No lee el cuerpo: un envío limitado se corta sin parsearlo."""
+
+    def allow_request(self, request, view):
+        self.segundos = consumir_intake(request)
+        return not self.segundos
+
+    def wait(self):
+        return self.segundos
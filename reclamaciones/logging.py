@@ -0,0 +1,121 @@
+"""
+Logging estructurado para las vistas y serializers.
+
+Se configura desde LOGGING en settings: cada logger ('reclamaciones.intake',
+'usuarios.login', ...) se prende con su propio nivel. Los registros pasan por
+MuestreoFilter (tasa configurable, warnings y errores siempre pasan), por
+RedactarFilter (oculta contraseñas, tokens y datos personales) y se escriben
+desde un hilo aparte con NonBlockingHandler, así el request nunca espera al pipe.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+
+REDACTADO = '***'
+
+# Claves que nunca se escriben tal cual (en cualquier nivel del payload)
+CLAVES_SECRETAS = {
+    'password', 'contrasena', 'actual', 'nueva', 'confirmar',
+    'token', 'access', 'refresh', 'secret', 'authorization',
+}
+CLAVES_PERSONALES = {
+    'nombre_cliente', 'doc_id_cliente', 'documento_identidad', 'fecha_nacimiento',
+    'email', 'telefono', 'nombre_representante', 'doc_id_representante',
+}
+
+
+def redactar(datos, claves=CLAVES_SECRETAS | CLAVES_PERSONALES):
+    """Devuelve una copia de `datos` con los valores sensibles reemplazados."""
+    if isinstance(datos, dict):
+        return {
+            clave: REDACTADO if str(clave).lower() in claves else redactar(valor, claves)
+            for clave, valor in datos.items()
+        }
+    if isinstance(datos, (list, tuple)):
+        return [redactar(valor, claves) for valor in datos]
+    return datos
+
+
+class RedactarFilter(logging.Filter):
+    def filter(self, record):
+        # extra={'email': ...} queda como atributo del registro: se oculta igual que dentro de datos
+        for clave in (CLAVES_SECRETAS | CLAVES_PERSONALES) & record.__dict__.keys():
+            setattr(record, clave, REDACTADO)
+        if hasattr(record, 'datos'):
+            record.datos = redactar(record.datos)
+        return True
+
+
+class MuestreoFilter(logging.Filter):
+    def __init__(self, tasa=1.0):
+        super().__init__()
+        self.tasa = tasa
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.tasa >= 1:
+            return True
+        return random.random() < self.tasa
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        linea = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if hasattr(record, 'datos'):
+            linea['datos'] = record.datos
+        if record.exc_info:
+            linea['exc'] = self.formatException(record.exc_info)
+        return json.dumps(linea, ensure_ascii=False, default=str)
+
+
+class NonBlockingHandler(logging.handlers.QueueHandler):
+    """
+    Encola los registros y los escribe en `stream` desde un QueueListener.
+    El formateo también ocurre en el hilo del listener.
+
+    El listener arranca con el primer registro de cada proceso y no al configurar el
+    logging: con gunicorn --preload la configuración corre en el master, y el hilo no
+    pasa a los workers forkeados. Si el pid cambió, el worker arma su propia cola.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.destino = logging.StreamHandler(stream or sys.stderr)
+        self.listener = None
+        self.pid = None
+        atexit.register(self.detener)
+
+    def enqueue(self, record):
+        # handle() ya tiene tomado self.lock, que logging reinicia en los forks
+        if self.pid != os.getpid():
+            self.queue = queue.SimpleQueue()
+            self.listener = logging.handlers.QueueListener(self.queue, self.destino)
+            self.listener.start()
+            self.pid = os.getpid()
+        super().enqueue(record)
+
+    def detener(self):
+        """Escribe lo que quede en la cola y termina el hilo, si es de este proceso."""
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+            self.pid = None
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.destino.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Mismo proceso: no hace falta formatear ni copiar el registro antes de encolarlo
+        return record
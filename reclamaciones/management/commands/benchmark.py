@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from reclamaciones.benchmarks import BENCHMARKS, correr
+
+
+class Command(BaseCommand):
+    help = (
+        "Corre los micro-benchmarks de reclamaciones sobre datos sintéticos "
+        "(dentro de una transacción que se revierte al final)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('nombres', nargs='*', help=f"Benchmarks a correr (por defecto todos): {', '.join(BENCHMARKS)}.")
+        parser.add_argument('--filas', type=int, default=5000, help='Reclamaciones sintéticas a crear.')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Repeticiones medidas por caso (se reporta la mediana).')
+        parser.add_argument('--json', action='store_true', help='Imprime el resultado como JSON.')
+        parser.add_argument('--salida', help='Además guarda el resultado en este archivo JSON, para comparar corridas.')
+
+    def handle(self, *args, **options):
+        nombres = options['nombres'] or list(BENCHMARKS)
+        desconocidos = [nombre for nombre in nombres if nombre not in BENCHMARKS]
+        if desconocidos:
+            raise CommandError(f"Benchmarks desconocidos: {', '.join(desconocidos)}")
+        if options['filas'] < 1 or options['repeticiones'] < 1:
+            raise CommandError('--filas y --repeticiones deben ser mayores a cero.')
+
+        resultados = correr(nombres, options['filas'], options['repeticiones'])
+
+        if options['salida']:
+            corrida = {
+                'fecha': timezone.now().isoformat(), 'motor': connection.vendor,
+                'filas': options['filas'], 'repeticiones': options['repeticiones'], 'resultados': resultados,
+            }
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(corrida, archivo, indent=2, ensure_ascii=False)
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+        for nombre, resultado in resultados.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(nombre))
+            for clave, valor in resultado.items():
+                self.stdout.write(f"  {clave}: {valor}")
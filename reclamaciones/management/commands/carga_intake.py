@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reclamaciones.benchmarks import cuerpo_intake, medir_carga
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga del formulario público: envía reclamaciones concurrentes a uno o más "
+        "servidores ya levantados y compara requests/s y latencias. Ej.: gunicorn (WSGI, vista "
+        "síncrona) contra uvicorn con INTAKE_ASYNC=True. Crea reclamaciones reales: usar una base de pruebas. "
+        "Todo sale de una IP: levantar el servidor con LIMITE_IP_* y LIMITE_HUELLA_* altos (limites.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', required=True,
+                            help='URL de crear-reclamo; se puede repetir para comparar despliegues.')
+        parser.add_argument('--libro', required=True, help='Código de un libro activo.')
+        parser.add_argument('--estado', type=int, default=1, help='id del estado inicial.')
+        parser.add_argument('--total', type=int, default=1000, help='Reclamaciones a enviar por URL.')
+        parser.add_argument('--concurrencia', type=int, default=50, help='Conexiones simultáneas.')
+        parser.add_argument('--json', action='store_true', help='Imprime el resultado como JSON.')
+
+    def handle(self, *args, **options):
+        if options['total'] < 1 or options['concurrencia'] < 1:
+            raise CommandError('--total y --concurrencia deben ser mayores a cero.')
+
+        resultados = []
+        for n, url in enumerate(options['url']):
+            base = n * options['total']
+            cuerpos = [cuerpo_intake(options['libro'], options['estado'], base + i) for i in range(options['total'])]
+            resultados.append(medir_carga(url, cuerpos, options['concurrencia']))
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2))
+            return
+        for resultado in resultados:
+            self.stdout.write(self.style.MIGRATE_HEADING(resultado['url']))
+            for clave, valor in resultado.items():
+                if clave != 'url':
+                    self.stdout.write(f"  {clave}: {valor}")
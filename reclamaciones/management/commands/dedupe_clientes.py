@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reclamaciones.deduplicacion import fusionar_duplicados
+
+
+class Command(BaseCommand):
+    help = (
+        "Fusiona los clientes con el mismo tipo y número de documento: queda el más antiguo, con sus "
+        "datos de contacto (los duplicados solo completan los vacíos), y recibe las reclamaciones y representantes de los demás. "
+        "Conviene correrlo antes de aplicar la migración que crea el índice único."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Documentos fusionados por transacción.')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor a cero.')
+        documentos, borrados = fusionar_duplicados(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"{documentos} documentos duplicados, {borrados} clientes fusionados"))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reclamaciones import exportacion
+from reclamaciones.models import Proveedor, Reclamacion
+from reclamaciones.serializers import FiltrosExportacionSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta el libro de reclamaciones a CSV o XLSX (el mismo archivo que "
+        "/api/reclamaciones/exportar/), escribiendo por bloques sin cargarlo en memoria."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('salida', help='Archivo a escribir.')
+        parser.add_argument('--formato', default='csv', help='csv (por defecto) o xlsx.')
+        parser.add_argument('--proveedor', type=int, help='Solo las reclamaciones de este proveedor (por defecto todas).')
+        parser.add_argument('--desde', help='Fecha inicial, AAAA-MM-DD.')
+        parser.add_argument('--hasta', help='Fecha final (incluida), AAAA-MM-DD.')
+        parser.add_argument('--estado', type=int, help='Id del estado.')
+        parser.add_argument('--establecimiento', type=int, help='Id del establecimiento.')
+
+    def handle(self, *args, **options):
+        parametros = {
+            clave: options[clave]
+            for clave in ('formato', 'desde', 'hasta', 'estado', 'establecimiento')
+            if options[clave] is not None
+        }
+        filtros = FiltrosExportacionSerializer(data=parametros)
+        if not filtros.is_valid():
+            raise CommandError('; '.join(f"{campo}: {' '.join(errores)}" for campo, errores in filtros.errors.items()))
+
+        reclamaciones = Reclamacion.objects.all()
+        if options['proveedor']:
+            if not Proveedor.objects.filter(pk=options['proveedor']).exists():
+                raise CommandError(f"No existe el proveedor {options['proveedor']}")
+            reclamaciones = reclamaciones.filter(proveedor_id=options['proveedor'])
+        reclamaciones = exportacion.filtrar(reclamaciones, filtros.validated_data)
+
+        total = 0
+        with open(options['salida'], 'wb') as salida:
+            for bloque in exportacion.exportar(reclamaciones, filtros.validated_data['formato']):
+                salida.write(bloque)
+                total += len(bloque)
+        self.stdout.write(self.style.SUCCESS(f"{options['salida']}: {total} bytes"))
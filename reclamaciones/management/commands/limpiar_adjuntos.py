@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reclamaciones.adjuntos import config, limpiar_huerfanos
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra del almacén de adjuntos el contenido que ya ningún adjunto usa y los temporales de "
+        "subidas cortadas. Solo toca archivos sin usarse por más de --gracia segundos, para no "
+        "borrar uno que una subida en curso está reutilizando. Pensado para un cron diario."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--gracia', type=int,
+            help=f"Segundos sin uso antes de borrar (por defecto GRACIA_HUERFANOS, {config()['GRACIA_HUERFANOS']}).",
+        )
+
+    def handle(self, *args, **options):
+        if options['gracia'] is not None and options['gracia'] < 0:
+            raise CommandError('--gracia no puede ser negativo.')
+        borrados = limpiar_huerfanos(options['gracia'])
+        self.stdout.write(self.style.SUCCESS(f"{borrados} archivos borrados"))
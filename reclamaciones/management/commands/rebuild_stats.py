@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from reclamaciones.models import ReclamacionStatsDiario
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula las estadísticas diarias (ReclamacionStatsDiario) desde las reclamaciones. "
+        "Para la carga inicial o después de cambios masivos hechos fuera del ORM."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--proveedor', type=int, action='append', dest='proveedores',
+            help='Solo este proveedor (se puede repetir). Por defecto, todos.',
+        )
+
+    def handle(self, *args, **options):
+        filas = ReclamacionStatsDiario.reconstruir(options['proveedores'])
+        self.stdout.write(self.style.SUCCESS(f"{filas} filas de estadísticas"))
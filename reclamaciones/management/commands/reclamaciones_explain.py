@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from reclamaciones.models import LibroReclamacion, Marca, Proveedor, Reclamacion
+from reclamaciones.pagination import KeysetPagination
+from reclamaciones.views import (
+    EditarLibroCompletoAPIView, LibroReclamacionViewSet, ReclamacionesPlanasView, ReclamacionViewSet,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta EXPLAIN (MySQL) / EXPLAIN QUERY PLAN (SQLite) sobre las consultas que arman "
+        "las vistas de reclamaciones y marca los recorridos completos de tabla."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--proveedor', type=int, help='Proveedor con el que se arman las consultas (por defecto el primero).')
+        parser.add_argument('--fail-on-scan', action='store_true', help='Termina con error si alguna consulta recorre una tabla completa.')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'mysql'):
+            raise CommandError(f"Motor no soportado: {connection.vendor}")
+
+        proveedor_id = options['proveedor'] or Proveedor.objects.values_list('id', flat=True).first() or 0
+        libro = LibroReclamacion.objects.filter(proveedor_id=proveedor_id).first() or LibroReclamacion(pk=0)
+
+        con_recorrido = []
+        for nombre, queryset in self.consultas(proveedor_id, libro):
+            sql, params = queryset.query.get_compiler(connection=connection).as_sql()
+            recorridos, plan = self.explicar(sql, params)
+            self.stdout.write(self.style.MIGRATE_HEADING(nombre))
+            for linea in plan:
+                self.stdout.write(f"  {linea}")
+            if recorridos:
+                con_recorrido.append(nombre)
+                for tabla in recorridos:
+                    self.stdout.write(self.style.WARNING(f"  ! recorrido completo de {tabla}"))
+
+        if con_recorrido and options['fail_on_scan']:
+            raise CommandError(f"Consultas con recorrido completo: {', '.join(con_recorrido)}")
+        if not con_recorrido:
+            self.stdout.write(self.style.SUCCESS('Ninguna consulta recorre una tabla completa.'))
+
+    # Querysets tal como los arma cada vista, para un usuario del proveedor y para el superusuario
+    def consultas(self, proveedor_id, libro):
+        proveedor = SimpleNamespace(is_superuser=False, proveedor_id=proveedor_id)
+        superusuario = SimpleNamespace(is_superuser=True, proveedor_id=None)
+        paginador = KeysetPagination()
+
+        def desde_vista(view_class, user, **kwargs):
+            view = view_class(**kwargs)
+            view.request = Request(APIRequestFactory().get('/'))
+            view.request.user = user
+            view.kwargs = {}
+            view.format_kwarg = None
+            return view.get_queryset()
+
+        def pagina(queryset):
+            return queryset.order_by(*paginador.ordering)[:paginador.page_size + 1]
+
+        def tabla(user):
+            return ReclamacionesPlanasView.proyeccion.queryset(desde_vista(ReclamacionesPlanasView, user))
+
+        return [
+            ('reclamaciones/tabla (proveedor)', pagina(tabla(proveedor))),
+            ('reclamaciones/tabla (superusuario)', pagina(tabla(superusuario))),
+            ('reclamos (proveedor)', desde_vista(ReclamacionViewSet, proveedor, action='list')),
+            ('reclamos por estado (proveedor)', pagina(
+                desde_vista(ReclamacionViewSet, proveedor, action='list').filter(estado_id=1)
+            )),
+            ('libros (proveedor)', desde_vista(LibroReclamacionViewSet, proveedor, action='list')),
+            ('libros/<id>/reclamaciones', pagina(Reclamacion.objects.filter(libro_id=libro.pk))),
+            ('libros/<id>/editar-completo', desde_vista(EditarLibroCompletoAPIView, proveedor).filter(pk=libro.pk)),
+            ('crear-reclamo: validate_libro', LibroReclamacion.objects.filter(codigo_libro=libro.codigo_libro, estado='activo')),
+            ('libro/obtener-url', LibroReclamacion.objects.filter(
+                libro_slug=libro.libro_slug, establecimiento_slug=libro.establecimiento_slug
+            )),
+            ('perfil: marcas', Marca.objects.filter(proveedor_id=proveedor_id).order_by('id')),
+        ]
+
+    def explicar(self, sql, params):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                # (id, parent, notused, detail); "SCAN tabla" sin índice = recorrido completo
+                plan = [fila[-1] for fila in cursor.fetchall()]
+                recorridos = [
+                    linea.split()[1] for linea in plan
+                    if linea.startswith('SCAN ') and 'USING' not in linea and 'CONSTANT ROW' not in linea
+                ]
+            else:
+                cursor.execute(f'EXPLAIN {sql}', params)
+                columnas = [col[0] for col in cursor.description]
+                filas = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+                plan = [
+                    f"{fila['table']}: type={fila['type']} key={fila['key']} rows={fila['rows']} {fila.get('Extra') or ''}"
+                    for fila in filas
+                ]
+                # type=ALL = recorrido completo de la tabla
+                recorridos = [fila['table'] for fila in filas if fila['type'] == 'ALL']
+        return recorridos, plan
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reclamaciones.sembrado import ESCALAS, PASSWORD, sembrar
+
+
+class Command(BaseCommand):
+    help = (
+        "Llena la base con proveedores, marcas, establecimientos, libros, clientes y reclamaciones "
+        "sintéticos (bulk_create por lotes) para medir la API con volumen real. Las filas quedan "
+        "guardadas: usar una base de pruebas. Cada proveedor tiene un usuario admin@<ruc>.canal.invalid "
+        "con --password. Después: manage.py benchmark api api_listas --salida antes.json."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', choices=list(ESCALAS), default='10k', help='Reclamaciones a crear.')
+        parser.add_argument('--reclamaciones', type=int, help='Cantidad exacta de reclamaciones (en lugar de --escala).')
+        parser.add_argument('--proveedores', type=int, help='Por defecto uno cada 1000 reclamaciones.')
+        parser.add_argument('--clientes', type=int, help='Clientes distintos; por defecto uno cada 3 reclamaciones.')
+        parser.add_argument('--lote', type=int, default=5000, help='Reclamaciones por transacción.')
+        parser.add_argument('--semilla', type=int, help='Semilla del azar, para repetir exactamente los mismos datos.')
+        parser.add_argument('--password', default=PASSWORD, help='Contraseña de los usuarios creados.')
+
+    def handle(self, *args, **options):
+        reclamaciones = options['reclamaciones'] or ESCALAS[options['escala']]
+        for opcion in ('reclamaciones', 'proveedores', 'clientes', 'lote'):
+            if options[opcion] is not None and options[opcion] < 1:
+                raise CommandError(f'--{opcion} debe ser mayor a cero.')
+
+        inicio = time.perf_counter()
+
+        def progreso(creadas):
+            segundos = time.perf_counter() - inicio
+            self.stdout.write(f"  {creadas}/{reclamaciones} reclamaciones ({creadas / segundos:.0f}/s)")
+
+        resumen = sembrar(
+            reclamaciones, proveedores=options['proveedores'], clientes=options['clientes'], lote=options['lote'],
+            semilla=options['semilla'], password=options['password'], progreso=progreso,
+        )
+        detalle = ', '.join(f'{cantidad} {nombre}' for nombre, cantidad in resumen.items())
+        self.stdout.write(self.style.SUCCESS(f"{detalle} en {time.perf_counter() - inicio:.1f} s"))
@@ -0,0 +1,304 @@
+import gzip
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se usa gzip
+    brotli = None
+
+logger = logging.getLogger('reclamaciones.rendimiento')
+
+
+# Mide las consultas SQL de un request (se instala con connection.execute_wrapper)
+class MedidorConsultas:
+    def __init__(self):
+        self.cantidad = 0
+        self.tiempo = 0.0
+        self.huellas = Counter()
+        self.sql = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.tiempo += duracion
+            self.cantidad += 1
+            latencias_bd.agregar(duracion)
+            # La huella es el SQL sin parámetros: la misma huella muchas veces = N+1
+            huella = hashlib.sha1(sql.encode()).hexdigest()[:12]
+            self.huellas[huella] += 1
+            self.sql.setdefault(huella, sql)
+
+    def repetidas(self):
+        return {huella: veces for huella, veces in self.huellas.items() if veces > 1}
+
+
+# Acumulado por vista en este proceso. Cada worker de gunicorn tiene el suyo.
+class RegistroMetricas:
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vistas = defaultdict(lambda: {
+            'requests': 0, 'segundos': 0.0, 'db_segundos': 0.0, 'consultas': 0,
+            'repetidas': 0, 'excedidas': 0, 'buckets': [0] * len(self.BUCKETS),
+        })
+
+    def registrar(self, vista, segundos, medidor, excedida):
+        with self._lock:
+            datos = self._vistas[vista]
+            datos['requests'] += 1
+            datos['segundos'] += segundos
+            datos['db_segundos'] += medidor.tiempo
+            datos['consultas'] += medidor.cantidad
+            datos['repetidas'] += sum(veces - 1 for veces in medidor.repetidas().values())
+            datos['excedidas'] += int(excedida)
+            for i, limite in enumerate(self.BUCKETS):
+                if segundos <= limite:
+                    datos['buckets'][i] += 1
+
+    def prometheus(self):
+        with self._lock:
+            vistas = {vista: {**datos, 'buckets': list(datos['buckets'])} for vista, datos in self._vistas.items()}
+
+        lineas = []
+
+        def metrica(nombre, tipo, ayuda, valores):
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+            lineas.extend(valores)
+
+        def por_vista(nombre, clave):
+            return [f'{nombre}{{view="{vista}"}} {datos[clave]}' for vista, datos in vistas.items()]
+
+        buckets = []
+        for vista, datos in vistas.items():
+            for limite, cantidad in zip(self.BUCKETS, datos['buckets']):
+                buckets.append(f'canal_request_seconds_bucket{{view="{vista}",le="{limite}"}} {cantidad}')
+            buckets.append(f'canal_request_seconds_bucket{{view="{vista}",le="+Inf"}} {datos["requests"]}')
+            buckets.append(f'canal_request_seconds_sum{{view="{vista}"}} {datos["segundos"]}')
+            buckets.append(f'canal_request_seconds_count{{view="{vista}"}} {datos["requests"]}')
+
+        metrica('canal_request_seconds', 'histogram', 'Tiempo total del request por vista.', buckets)
+        metrica('canal_db_seconds_total', 'counter', 'Tiempo en la base de datos por vista.', por_vista('canal_db_seconds_total', 'db_segundos'))
+        metrica('canal_db_queries_total', 'counter', 'Consultas SQL por vista.', por_vista('canal_db_queries_total', 'consultas'))
+        metrica('canal_db_repeated_queries_total', 'counter', 'Consultas con la misma huella repetidas en un request (N+1).', por_vista('canal_db_repeated_queries_total', 'repetidas'))
+        metrica('canal_query_budget_exceeded_total', 'counter', 'Requests que superaron el presupuesto de consultas.', por_vista('canal_query_budget_exceeded_total', 'excedidas'))
+        return '\n'.join(lineas) + '\n'
+
+
+registro_metricas = RegistroMetricas()
+
+
+# Duración de las últimas consultas SQL de este proceso (las mide MedidorConsultas).
+# limites.py mira su p95 para dejar de aceptar envíos anónimos cuando la base ya va lenta.
+class VentanaLatencias:
+    def __init__(self, segundos=30, maximo=5000):
+        self.segundos = segundos
+        self._lock = threading.Lock()
+        self._muestras = deque(maxlen=maximo)
+        self._p95 = None  # (calculado_en, muestras, valor)
+
+    def agregar(self, duracion):
+        with self._lock:
+            self._muestras.append((time.monotonic(), duracion))
+
+    def p95(self, minimo_muestras=1, cada=1.0):
+        """(p95 en segundos, muestras) de la ventana; se recalcula como mucho cada `cada` segundos."""
+        ahora = time.monotonic()
+        calculado = self._p95
+        if calculado is not None and ahora - calculado[0] < cada:
+            valor, muestras = calculado[2], calculado[1]
+        else:
+            with self._lock:
+                while self._muestras and self._muestras[0][0] < ahora - self.segundos:
+                    self._muestras.popleft()
+                duraciones = sorted(duracion for _, duracion in self._muestras)
+            muestras = len(duraciones)
+            valor = duraciones[min(muestras - 1, int(muestras * 0.95))] if duraciones else None
+            self._p95 = (ahora, muestras, valor)
+        if muestras < minimo_muestras:
+            return None, muestras
+        return valor, muestras
+
+    def reiniciar(self):
+        with self._lock:
+            self._muestras.clear()
+            self._p95 = None
+
+
+latencias_bd = VentanaLatencias()
+
+
+def nombre_vista(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'sin_ruta'
+    return match.view_name or match._func_path
+
+
+def presupuesto_consultas(vista):
+    presupuestos = getattr(settings, 'RECLAMACIONES_PRESUPUESTO_CONSULTAS', {})
+    return presupuestos.get(vista, presupuestos.get('default'))
+
+
+# Registra tiempo total, tiempo en BD, número de consultas y consultas repetidas de
+# cada request y avisa si la vista pasa su presupuesto. Server-Timing solo va con DEBUG
+# o para usuarios staff: a cualquiera más le muestra cuánto cuesta cada vista.
+# Sirve igual bajo WSGI y ASGI: con vistas async no fuerza el paso a síncrono.
+class MetricasMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medidor = MedidorConsultas()
+        inicio = time.perf_counter()
+        with self.medir(medidor):
+            response = self.get_response(request)
+        return self.registrar(request, response, medidor, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        medidor = MedidorConsultas()
+        inicio = time.perf_counter()
+        with self.medir(medidor):
+            response = await self.get_response(request)
+        return self.registrar(request, response, medidor, time.perf_counter() - inicio)
+
+    @staticmethod
+    def medir(medidor):
+        stack = ExitStack()
+        for conexion in connections.all():
+            stack.enter_context(conexion.execute_wrapper(medidor))
+        return stack
+
+    def registrar(self, request, response, medidor, segundos):
+        vista = nombre_vista(request)
+        presupuesto = presupuesto_consultas(vista)
+        excedida = presupuesto is not None and medidor.cantidad > presupuesto
+        if excedida:
+            repetidas = sorted(medidor.repetidas().items(), key=lambda par: -par[1])[:5]
+            logger.warning(
+                "La vista %s hizo %d consultas (presupuesto %d)", vista, medidor.cantidad, presupuesto,
+                extra={'datos': [{'huella': h, 'veces': v, 'sql': medidor.sql[h][:300]} for h, v in repetidas]},
+            )
+        registro_metricas.registrar(vista, segundos, medidor, excedida)
+
+        # DRF deja en request.user al usuario que autenticó (JWT); si no, es el de la sesión
+        if settings.DEBUG or getattr(getattr(request, 'user', None), 'is_staff', False):
+            response['Server-Timing'] = (
+                f'app;dur={segundos * 1000:.1f}, '
+                f'db;dur={medidor.tiempo * 1000:.1f};desc="{medidor.cantidad} queries"'
+            )
+        return response
+
+
+def codificaciones_aceptadas(accept_encoding):
+    """{'gzip': 1.0, 'br': 0.5, ...} a partir del header Accept-Encoding."""
+    aceptadas = {}
+    for parte in accept_encoding.split(','):
+        nombre, _, parametros = parte.strip().partition(';')
+        calidad = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                continue
+        if nombre:
+            aceptadas[nombre.strip().lower()] = calidad
+    return aceptadas
+
+
+def comprimir(contenido, codificacion, config):
+    if codificacion == 'br':
+        return brotli.compress(contenido, quality=config.get('NIVEL_BROTLI', 4))
+    return gzip.compress(contenido, compresslevel=config.get('NIVEL_GZIP', 6), mtime=0)
+
+
+# Comprime con brotli (si está instalado y el cliente lo acepta) o gzip las respuestas
+# de al menos MIN_BYTES. Las respuestas en streaming (StreamingHttpResponse del
+# listado/exportación) se dejan tal cual: comprimirlas bloque a bloque obliga a
+# bufferizar o rompe el envío progresivo.
+# El ETag sigue siendo fuerte pero se le agrega la codificación ("abc-gzip"),
+# porque el cuerpo comprimido es otra representación (RFC 9110 8.8.3).
+class CompresionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    SUFIJO_ETAG = re.compile(r'-(gzip|br)"')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = getattr(settings, 'RECLAMACIONES_COMPRESION', {})
+        self.codificaciones = ('br', 'gzip') if brotli is not None else ('gzip',)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sufijo = self.quitar_sufijo(request)
+        return self.procesar(request, self.get_response(request), sufijo)
+
+    async def __acall__(self, request):
+        sufijo = self.quitar_sufijo(request)
+        return self.procesar(request, await self.get_response(request), sufijo)
+
+    def quitar_sufijo(self, request):
+        # El cliente devuelve el ETag con el sufijo que le pusimos; la vista compara sin él
+        si_no_coincide = request.META.get('HTTP_IF_NONE_MATCH')
+        if not si_no_coincide:
+            return None
+        encontrado = self.SUFIJO_ETAG.search(si_no_coincide)
+        request.META['HTTP_IF_NONE_MATCH'] = self.SUFIJO_ETAG.sub('"', si_no_coincide)
+        return encontrado and encontrado.group(1)
+
+    def procesar(self, request, response, sufijo):
+        if response.status_code == 304:
+            etag = response.get('ETag')
+            if sufijo and etag and etag.endswith('"'):
+                response.headers['ETag'] = f'{etag[:-1]}-{sufijo}"'
+            return response
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if len(response.content) < self.config.get('MIN_BYTES', 1024):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        aceptadas = codificaciones_aceptadas(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        candidatas = [c for c in self.codificaciones if aceptadas.get(c, aceptadas.get('*', 0)) > 0]
+        if not candidatas:
+            return response
+        codificacion = max(candidatas, key=lambda c: aceptadas.get(c, aceptadas.get('*', 0)))
+
+        comprimido = comprimir(response.content, codificacion, self.config)
+        if len(comprimido) >= len(response.content):
+            return response
+        response.content = comprimido
+        response.headers['Content-Length'] = str(len(comprimido))
+        response.headers['Content-Encoding'] = codificacion
+
+        etag = response.get('ETag')
+        if etag and etag.endswith('"'):
+            response.headers['ETag'] = f'{etag[:-1]}-{codificacion}"'
+        return response
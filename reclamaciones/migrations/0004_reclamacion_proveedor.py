@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-17 21:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+# Llena la columna desnormalizada para los datos que ya existen
+def llenar_proveedor(apps, schema_editor):
+    Establecimiento = apps.get_model('reclamaciones', 'Establecimiento')
+    LibroReclamacion = apps.get_model('reclamaciones', 'LibroReclamacion')
+    Reclamacion = apps.get_model('reclamaciones', 'Reclamacion')
+
+    LibroReclamacion.objects.update(proveedor_id=Subquery(
+        Establecimiento.objects.filter(pk=OuterRef('establecimiento_id')).values('marca__proveedor_id')[:1]
+    ))
+    Reclamacion.objects.update(proveedor_id=Subquery(
+        LibroReclamacion.objects.filter(pk=OuterRef('libro_id')).values('proveedor_id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reclamaciones', '0003_rename_direccion_establecimeinto_establecimiento_direccion_establecimiento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libroreclamacion',
+            name='proveedor',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='libros', to='reclamaciones.proveedor'),
+        ),
+        migrations.AddField(
+            model_name='reclamacion',
+            name='proveedor',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reclamaciones', to='reclamaciones.proveedor'),
+        ),
+        migrations.RunPython(llenar_proveedor, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-17 21:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reclamaciones', '0004_reclamacion_proveedor'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='libroreclamacion',
+            index=models.Index(fields=['codigo_libro', 'estado'], name='libro_codigo_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reclamacion',
+            index=models.Index(fields=['proveedor', 'fecha', 'id'], name='reclamacion_prov_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reclamacion',
+            index=models.Index(fields=['proveedor', 'estado', 'fecha'], name='reclamacion_prov_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reclamacion',
+            index=models.Index(fields=['libro', 'fecha', 'id'], name='reclamacion_libro_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reclamacion',
+            index=models.Index(fields=['fecha', 'id'], name='reclamacion_fecha_idx'),
+        ),
+    ]
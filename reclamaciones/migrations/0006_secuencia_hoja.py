@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-17 21:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reclamaciones', '0005_indices_compuestos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaHoja',
+            fields=[
+                ('libro', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='secuencia', serialize=False, to='reclamaciones.libroreclamacion')),
+                ('siguiente', models.BigIntegerField(default=1)),
+            ],
+        ),
+    ]
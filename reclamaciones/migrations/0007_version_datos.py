@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-17 22:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reclamaciones', '0006_secuencia_hoja'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionDatos',
+            fields=[
+                ('proveedor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='version_datos', serialize=False, to='reclamaciones.proveedor')),
+                ('version', models.BigIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-17 22:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def llenar_proveedor(apps, schema_editor):
+    ArchivoAdjunto = apps.get_model('reclamaciones', 'ArchivoAdjunto')
+    Reclamacion = apps.get_model('reclamaciones', 'Reclamacion')
+
+    ArchivoAdjunto.objects.update(proveedor_id=Subquery(
+        Reclamacion.objects.filter(pk=OuterRef('reclamacion_id')).values('proveedor_id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reclamaciones', '0007_version_datos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivoadjunto',
+            name='content_type',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='archivoadjunto',
+            name='proveedor',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archivos', to='reclamaciones.proveedor'),
+        ),
+        migrations.AddField(
+            model_name='archivoadjunto',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='archivoadjunto',
+            name='tamano',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(llenar_proveedor, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+
+# Índice de texto completo de las reclamaciones (ver reclamaciones/busqueda.py).
+# No es un modelo: FTS5 en SQLite y FULLTEXT en MySQL no se pueden declarar con el ORM.
+CREAR = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE reclamaciones_busqueda USING fts5("
+        "detalle, descripcion_bien, solicitud_cliente, cliente, "
+        "tokenize = 'unicode61 remove_diacritics 2')",
+        "INSERT INTO reclamaciones_busqueda (rowid, detalle, descripcion_bien, solicitud_cliente, cliente) "
+        "SELECT r.id, r.detalle, r.descripcion_bien, COALESCE(r.solicitud_cliente, ''), "
+        "c.nombre_cliente || ' ' || c.doc_id_cliente "
+        "FROM reclamaciones_reclamacion r JOIN reclamaciones_cliente c ON c.id = r.cliente_id",
+    ],
+    'mysql': [
+        # La tabla se llena antes de crear el índice FULLTEXT: construirlo una vez es más rápido
+        "CREATE TABLE reclamaciones_busqueda ("
+        "reclamacion_id BIGINT NOT NULL PRIMARY KEY, detalle LONGTEXT, descripcion_bien LONGTEXT, "
+        "solicitud_cliente LONGTEXT, cliente VARCHAR(150)"
+        ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4",
+        "INSERT INTO reclamaciones_busqueda (reclamacion_id, detalle, descripcion_bien, solicitud_cliente, cliente) "
+        "SELECT r.id, r.detalle, r.descripcion_bien, COALESCE(r.solicitud_cliente, ''), "
+        "CONCAT(c.nombre_cliente, ' ', c.doc_id_cliente) "
+        "FROM reclamaciones_reclamacion r JOIN reclamaciones_cliente c ON c.id = r.cliente_id",
+        "ALTER TABLE reclamaciones_busqueda ADD FULLTEXT INDEX reclamaciones_busqueda_ft "
+        "(detalle, descripcion_bien, solicitud_cliente, cliente)",
+    ],
+}
+
+
+def crear_indice(apps, schema_editor):
+    for sql in CREAR.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor in CREAR:
+        schema_editor.execute("DROP TABLE IF EXISTS reclamaciones_busqueda")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reclamaciones', '0008_archivo_adjunto_contenido'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-17 22:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+# Carga inicial desde las reclamaciones existentes (lo mismo que manage.py rebuild_stats)
+def llenar_estadisticas(apps, schema_editor):
+    Reclamacion = apps.get_model('reclamaciones', 'Reclamacion')
+    ReclamacionStatsDiario = apps.get_model('reclamaciones', 'ReclamacionStatsDiario')
+
+    grupos = (
+        Reclamacion.objects
+        .annotate(dia=TruncDate('fecha', tzinfo=timezone.get_current_timezone()))
+        .values_list('proveedor_id', 'libro__establecimiento_id', 'dia', 'tipo', 'tipo_bien', 'estado_id')
+        .annotate(total=Count('id'), monto=Sum('monto_reclamado'))
+        .order_by()
+    )
+    ReclamacionStatsDiario.objects.bulk_create([
+        ReclamacionStatsDiario(
+            proveedor_id=proveedor_id, establecimiento_id=establecimiento_id, fecha=dia, tipo=tipo,
+            tipo_bien=tipo_bien, estado_id=estado_id, cantidad=total, monto_reclamado=monto or 0,
+        )
+        for proveedor_id, establecimiento_id, dia, tipo, tipo_bien, estado_id, total, monto in grupos.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reclamaciones', '0009_busqueda_texto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReclamacionStatsDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo', models.CharField(choices=[('queja', 'Queja'), ('reclamo', 'Reclamo')], max_length=20)),
+                ('tipo_bien', models.CharField(choices=[('producto', 'Producto'), ('servicio', 'Servicio')], max_length=20)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('monto_reclamado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('establecimiento', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='estadisticas', to='reclamaciones.establecimiento')),
+                ('estado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estadisticas', to='reclamaciones.estadoreclamacion')),
+                ('proveedor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='estadisticas', to='reclamaciones.proveedor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('proveedor', 'fecha', 'establecimiento', 'tipo', 'tipo_bien', 'estado'), name='stats_diario_unico')],
+            },
+        ),
+        migrations.RunPython(llenar_estadisticas, migrations.RunPython.noop),
+    ]
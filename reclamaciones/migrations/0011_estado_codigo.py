@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-17 22:28
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Mismo criterio que models.normalizar_codigo, copiado para que la migración no cambie con el modelo
+def llenar_codigo(apps, schema_editor):
+    EstadoReclamacion = apps.get_model('reclamaciones', 'EstadoReclamacion')
+    for estado in EstadoReclamacion.objects.filter(codigo=''):
+        sin_tildes = unicodedata.normalize('NFKD', estado.nombre_estado_reclamo).encode('ascii', 'ignore').decode()
+        estado.codigo = re.sub(r'[^A-Z0-9]+', '_', sin_tildes.upper()).strip('_')
+        estado.save(update_fields=['codigo'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reclamaciones', '0010_estadisticas_diarias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estadoreclamacion',
+            name='codigo',
+            field=models.CharField(blank=True, db_index=True, max_length=50),
+        ),
+        migrations.RunPython(llenar_codigo, migrations.RunPython.noop),
+    ]
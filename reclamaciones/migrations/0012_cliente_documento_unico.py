@@ -0,0 +1,81 @@
+# Generated by Django 5.2.3 on 2026-10-17 22:39
+
+import re
+
+from django.db import migrations, models
+from django.db.models import Case, Count, Value, When
+
+
+CONTACTO = ['nombre_cliente', 'fecha_nacimiento', 'email', 'telefono']
+LOTE = 500
+
+
+# Mismo criterio que models.normalizar_documento y deduplicacion.py (manage.py dedupe_clientes),
+# copiado para que la migración no cambie con el modelo. Aquí no se reindexa la búsqueda:
+# para eso conviene correr el comando antes de migrar.
+def normalizar(tipo, numero):
+    return (tipo or '').strip().upper(), re.sub(r'\s+', '', numero or '').upper()
+
+
+def fusionar_duplicados(apps, schema_editor):
+    Cliente = apps.get_model('reclamaciones', 'Cliente')
+    Reclamacion = apps.get_model('reclamaciones', 'Reclamacion')
+    RepresentanteLegal = apps.get_model('reclamaciones', 'RepresentanteLegal')
+
+    ultimo = 0
+    while True:
+        tramo = list(Cliente.objects.filter(pk__gt=ultimo).order_by('pk')[:LOTE])
+        if not tramo:
+            break
+        ultimo = tramo[-1].pk
+        pendientes = []
+        for cliente in tramo:
+            normalizado = normalizar(cliente.tipo_doc_cliente, cliente.doc_id_cliente)
+            if normalizado != (cliente.tipo_doc_cliente, cliente.doc_id_cliente):
+                cliente.tipo_doc_cliente, cliente.doc_id_cliente = normalizado
+                pendientes.append(cliente)
+        Cliente.objects.bulk_update(pendientes, ['tipo_doc_cliente', 'doc_id_cliente'])
+
+    grupos = Cliente.objects.values('tipo_doc_cliente', 'doc_id_cliente').annotate(n=Count('id')).filter(n__gt=1).order_by()
+    documentos = [(grupo['tipo_doc_cliente'], grupo['doc_id_cliente']) for grupo in grupos]
+    for inicio in range(0, len(documentos), LOTE):
+        tramo = set(documentos[inicio:inicio + LOTE])
+        por_documento = {}
+        for cliente in Cliente.objects.filter(doc_id_cliente__in={numero for _, numero in tramo}).order_by('pk'):
+            clave = (cliente.tipo_doc_cliente, cliente.doc_id_cliente)
+            if clave in tramo:
+                por_documento.setdefault(clave, []).append(cliente)
+
+        reemplazos, conservados = {}, []
+        for clientes in por_documento.values():
+            # Queda el más antiguo con sus datos; los duplicados solo completan los vacíos
+            conservado = clientes[0]
+            for duplicado in clientes[1:]:
+                for campo in CONTACTO:
+                    valor = getattr(duplicado, campo)
+                    if getattr(conservado, campo) in (None, '') and valor not in (None, ''):
+                        setattr(conservado, campo, valor)
+            conservados.append(conservado)
+            reemplazos.update({cliente.pk: conservado.pk for cliente in clientes[1:]})
+
+        casos = Case(*[When(cliente_id=viejo, then=Value(nuevo)) for viejo, nuevo in reemplazos.items()],
+                     output_field=models.BigIntegerField())
+        Reclamacion.objects.filter(cliente_id__in=reemplazos).update(cliente_id=casos)
+        RepresentanteLegal.objects.filter(cliente_id__in=reemplazos).update(cliente_id=casos)
+        Cliente.objects.bulk_update(conservados, CONTACTO)
+        Cliente.objects.filter(pk__in=reemplazos).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reclamaciones', '0011_estado_codigo'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cliente',
+            constraint=models.UniqueConstraint(fields=('tipo_doc_cliente', 'doc_id_cliente'), name='cliente_documento_unico'),
+        ),
+    ]
@@ -0,0 +1,96 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+# Recorre los campos de un serializer y arma los select_related / prefetch_related
+# que necesita para no hacer una consulta por fila:
+#   - serializers anidados (FK / OneToOne) -> select_related
+#   - serializers anidados con many=True   -> prefetch_related
+#   - source con puntos ('libro.establecimiento.nombre_establecimiento') -> select_related del camino
+# Los SerializerMethodField no se pueden inspeccionar; para esos el serializer
+# declara en su Meta `eager_select` / `eager_prefetch` con los caminos que usa.
+def rutas_eager(serializer_class, model):
+    select, prefetch = set(), set()
+    _recorrer(serializer_class(), model, '', False, select, prefetch)
+    return sorted(select), sorted(prefetch)
+
+
+def _unir(prefijo, ruta):
+    return f"{prefijo}__{ruta}" if prefijo else ruta
+
+
+def _recorrer(serializer, model, prefijo, en_prefetch, select, prefetch):
+    meta = getattr(serializer, 'Meta', None)
+    for ruta in getattr(meta, 'eager_select', ()):
+        (prefetch if en_prefetch else select).add(_unir(prefijo, ruta))
+    for ruta in getattr(meta, 'eager_prefetch', ()):
+        prefetch.add(_unir(prefijo, ruta))
+
+    for campo in serializer.fields.values():
+        if campo.write_only:
+            continue
+
+        if campo.source == '*':
+            if isinstance(campo, serializers.BaseSerializer):
+                _recorrer(campo, model, prefijo, en_prefetch, select, prefetch)
+            continue
+
+        hijo = campo.child if isinstance(campo, serializers.ListSerializer) else campo
+        relacion, modelo_final, es_lista = _camino(model, campo.source.split('.'))
+        es_lista = es_lista or isinstance(campo, (serializers.ListSerializer, serializers.ManyRelatedField))
+
+        if relacion is None:
+            continue
+        # Un PrimaryKeyRelatedField simple solo lee la columna *_id, no necesita join
+        if isinstance(campo, serializers.RelatedField) and '.' not in campo.source and not es_lista:
+            continue
+
+        ruta = _unir(prefijo, relacion)
+        if es_lista or en_prefetch:
+            prefetch.add(ruta)
+        else:
+            select.add(ruta)
+
+        if isinstance(hijo, serializers.BaseSerializer) and modelo_final is not None:
+            _recorrer(hijo, modelo_final, ruta, en_prefetch or es_lista, select, prefetch)
+
+
+def _camino(model, atributos):
+    """
+    Sigue los atributos mientras sean relaciones del modelo.
+    Devuelve (camino 'a__b', modelo al final del camino, si pasa por una relación a muchos).
+    """
+    partes, es_lista = [], False
+    for atributo in atributos:
+        try:
+            campo = model._meta.get_field(atributo)
+        except FieldDoesNotExist:
+            break
+        if not campo.is_relation:
+            break
+        partes.append(atributo)
+        es_lista = es_lista or campo.one_to_many or campo.many_to_many
+        model = campo.related_model
+    if not partes:
+        return None, None, False
+    return '__'.join(partes), model, es_lista
+
+
+# Aplica las rutas calculadas al queryset de la vista. Se engancha en filter_queryset
+# porque varias vistas redefinen get_queryset (filtro por tenant) y así el mixin
+# funciona igual para list, retrieve, update y las acciones con get_object().
+class EagerLoadingMixin:
+    _rutas_eager_cache = {}
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        clave = (serializer_class, queryset.model)
+        if clave not in self._rutas_eager_cache:
+            self._rutas_eager_cache[clave] = rutas_eager(serializer_class, queryset.model)
+        select, prefetch = self._rutas_eager_cache[clave]
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
@@ -1,8 +1,35 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
 from django.utils.text import slugify
 from django.core.exceptions import ValidationError
+import re
+import unicodedata
 import uuid
 
+def normalizar_codigo(texto):
+    """Mayúsculas, sin tildes y con _ entre palabras: " Respondido " y "respondido" -> RESPONDIDO."""
+    sin_tildes = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode()
+    return re.sub(r'[^A-Z0-9]+', '_', sin_tildes.upper()).strip('_')
+
+def normalizar_documento(tipo, numero):
+    """('dni', ' 4567 8912 ') -> ('DNI', '45678912'): un mismo documento es un solo Cliente."""
+    return (tipo or '').strip().upper(), re.sub(r'\s+', '', numero or '').upper()
+
+# Queryset para modelos que guardan el proveedor dueño (columna desnormalizada e indexada),
+# así filtrar por tenant no necesita recorrer libro -> establecimiento -> marca -> proveedor
+class TenantQuerySet(models.QuerySet):
+    def for_user(self, user):
+        # El superusuario ve todo
+        if user.is_superuser:
+            return self.all()
+        # El proveedor solo ve lo suyo; sin proveedor asociado no ve nada
+        proveedor_id = getattr(user, 'proveedor_id', None)
+        if proveedor_id:
+            return self.filter(proveedor_id=proveedor_id)
+        return self.none()
+
 # Create your models here.
 class Proveedor(models.Model):
     razon_social = models.CharField(max_length=100)
@@ -63,15 +90,54 @@ class LibroReclamacion(models.Model):
     codigo_libro = models.CharField(max_length=50)
     estado = models.CharField(max_length=20)  # activo, inactivo, cerrado
     created_at = models.DateTimeField(auto_now_add=True)
+    # Copia de establecimiento.marca.proveedor, se mantiene sola al guardar
+    proveedor = models.ForeignKey(
+        Proveedor, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='libros'
+    )
+
+    objects = TenantQuerySet.as_manager()
 
     class Meta:
         unique_together = ('libro_slug', 'establecimiento_slug')  # URL única
+        indexes = [
+            # validate_libro: libro activo por código
+            models.Index(fields=['codigo_libro', 'estado'], name='libro_codigo_estado_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.libro_slug:
             self.libro_slug = slugify(self.codigo_libro)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'establecimiento' not in update_fields:
+            super().save(*args, **kwargs)
+            return
+
+        anterior = None
+        if self.pk:
+            anterior = LibroReclamacion.objects.filter(pk=self.pk).values_list('proveedor_id', 'establecimiento_id').first()
+        proveedor_anterior, establecimiento_anterior = anterior or (None, None)
+        self.proveedor_id = self.obtener_proveedor_id()
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'proveedor'}
         super().save(*args, **kwargs)
 
+        # Si el libro cambió de dueño (se movió a otro establecimiento), sus reclamaciones lo siguen
+        if proveedor_anterior != self.proveedor_id:
+            self.reclamaciones.exclude(proveedor_id=self.proveedor_id).update(proveedor_id=self.proveedor_id)
+            ArchivoAdjunto.objects.filter(reclamacion__libro=self).exclude(proveedor_id=self.proveedor_id).update(proveedor_id=self.proveedor_id)
+            VersionDatos.incrementar_al_confirmar(proveedor_anterior)
+        # Las estadísticas se agrupan por establecimiento: se recalculan las de ambos dueños
+        if anterior and establecimiento_anterior != self.establecimiento_id and self.reclamaciones.exists():
+            ReclamacionStatsDiario.reconstruir({proveedor_anterior, self.proveedor_id} - {None})
+
+    def obtener_proveedor_id(self):
+        if self.establecimiento_id is None:
+            return None
+        if LibroReclamacion.establecimiento.is_cached(self) and Establecimiento.marca.is_cached(self.establecimiento):
+            return self.establecimiento.marca.proveedor_id
+        return Establecimiento.objects.filter(pk=self.establecimiento_id).values_list('marca__proveedor_id', flat=True).first()
+
     def get_url(self, base_url="http://localhost:5173"):  # reemplazar por la url de produccion
         return f"{base_url.rstrip('/')}/libros/libro-reclamacion/{self.libro_slug}/{self.establecimiento_slug}/"
 
@@ -81,6 +147,58 @@ class LibroReclamacion(models.Model):
     def __str__(self):
         return f"{self.codigo_libro} ({self.libro_slug}/{self.establecimiento_slug})"
 
+# Contador de hojas por libro. Los workers reservan bloques de números (hi/lo),
+# así no se bloquea esta fila en cada reclamación (ver codigos.py)
+class SecuenciaHoja(models.Model):
+    libro = models.OneToOneField(LibroReclamacion, on_delete=models.CASCADE, primary_key=True, related_name='secuencia')
+    siguiente = models.BigIntegerField(default=1)  # primer número aún no reservado
+
+    def __str__(self):
+        return f"{self.libro_id}: {self.siguiente}"
+
+# Versión de los datos de cada proveedor: sube con cualquier cambio en sus marcas,
+# establecimientos, libros o reclamaciones (ver signals.py). Los tableros arman su
+# ETag con ella y responden 304 sin volver a consultar los datos (ver condicional.py)
+class VersionDatos(models.Model):
+    proveedor = models.OneToOneField(Proveedor, on_delete=models.CASCADE, primary_key=True, related_name='version_datos')
+    version = models.BigIntegerField(default=0)
+    actualizado = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.proveedor_id}: v{self.version}"
+
+    @classmethod
+    def incrementar(cls, proveedor_ids):
+        ahora = timezone.now()
+        for proveedor_id in proveedor_ids:
+            if cls.objects.filter(pk=proveedor_id).update(version=F('version') + 1, actualizado=ahora):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(proveedor_id=proveedor_id, version=1, actualizado=ahora)
+            except IntegrityError:
+                # Otro worker creó la fila al mismo tiempo (o el proveedor ya no existe)
+                cls.objects.filter(pk=proveedor_id).update(version=F('version') + 1, actualizado=ahora)
+
+    @classmethod
+    def incrementar_al_confirmar(cls, *proveedor_ids):
+        """
+        Sube la versión cuando confirma la transacción actual: así no se bloquea la fila
+        del proveedor mientras dura la escritura y una transacción revertida no la mueve.
+        """
+        proveedor_ids = {proveedor_id for proveedor_id in proveedor_ids if proveedor_id}
+        if proveedor_ids:
+            transaction.on_commit(lambda: cls.incrementar(sorted(proveedor_ids)))
+
+    @classmethod
+    def incrementar_todas(cls):
+        transaction.on_commit(lambda: cls.objects.update(version=F('version') + 1, actualizado=timezone.now()))
+
+    @classmethod
+    def de_proveedor(cls, proveedor_id):
+        """(versión, fecha del último cambio); (0, None) si el proveedor nunca cambió."""
+        return cls.objects.filter(pk=proveedor_id).values_list('version', 'actualizado').first() or (0, None)
+
 class Cliente(models.Model):
     nombre_cliente = models.CharField(max_length=100)
     tipo_doc_cliente = models.CharField(max_length=15)
@@ -90,9 +208,83 @@ class Cliente(models.Model):
     telefono = models.CharField(max_length=20)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Datos de contacto: el formulario es anónimo, así que un envío con un documento ya
+    # registrado solo completa los que estén vacíos, nunca reescribe los guardados
+    CAMPOS_CONTACTO = ('nombre_cliente', 'fecha_nacimiento', 'email', 'telefono')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tipo_doc_cliente', 'doc_id_cliente'], name='cliente_documento_unico'),
+        ]
+
     def __str__(self):
         return self.nombre_cliente
 
+    def save(self, *args, **kwargs):
+        self.tipo_doc_cliente, self.doc_id_cliente = normalizar_documento(self.tipo_doc_cliente, self.doc_id_cliente)
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def completar_vacios(cliente, datos):
+        """Copia de `datos` los campos de contacto que `cliente` tiene vacíos; devuelve cuáles."""
+        vacios = [
+            campo for campo in Cliente.CAMPOS_CONTACTO
+            if datos.get(campo) not in (None, '') and getattr(cliente, campo) in (None, '')
+        ]
+        for campo in vacios:
+            setattr(cliente, campo, datos[campo])
+        return vacios
+
+    @classmethod
+    def resolver(cls, datos):
+        """
+        El Cliente con el documento de `datos`, creado si no existe. Si ya existía, sus
+        datos de contacto no cambian (solo se completan los vacíos): cualquiera que conozca
+        un número de documento puede enviar el formulario, y esos datos son los que figuran
+        en todas las reclamaciones anteriores de esa persona. get_or_create es seguro con
+        envíos simultáneos: si otro request crea el mismo documento entre la búsqueda y el
+        INSERT, el índice único lo frena y se vuelve a buscar.
+        """
+        tipo, numero = normalizar_documento(datos['tipo_doc_cliente'], datos['doc_id_cliente'])
+        contacto = {campo: datos[campo] for campo in cls.CAMPOS_CONTACTO if campo in datos}
+        cliente, creado = cls.objects.get_or_create(tipo_doc_cliente=tipo, doc_id_cliente=numero, defaults=contacto)
+        if not creado:
+            vacios = cls.completar_vacios(cliente, contacto)
+            if vacios:
+                cliente.save(update_fields=vacios)
+        return cliente
+
+    @classmethod
+    def resolver_lote(cls, lista, batch_size=500):
+        """
+        resolver() para la carga masiva: un Cliente por cada dict de `lista`, en el mismo
+        orden. Los documentos nuevos se insertan juntos (INSERT ... ON CONFLICT DO NOTHING /
+        INSERT IGNORE) y luego se leen todos; a los que ya existían solo se les completan
+        los campos vacíos. Si el mismo documento viene varias veces vale el primero.
+        """
+        por_documento = {}
+        for datos in lista:
+            tipo, numero = normalizar_documento(datos['tipo_doc_cliente'], datos['doc_id_cliente'])
+            if (tipo, numero) in por_documento:
+                cls.completar_vacios(por_documento[(tipo, numero)], datos)
+            else:
+                por_documento[(tipo, numero)] = cls(**{**datos, 'tipo_doc_cliente': tipo, 'doc_id_cliente': numero})
+        enviados = list(por_documento.values())
+        # ignore_conflicts no devuelve ids en ningún motor: se leen por documento
+        cls.objects.bulk_create(enviados, batch_size=batch_size, ignore_conflicts=True)
+
+        guardados, pendientes = {}, []
+        for inicio in range(0, len(enviados), batch_size):
+            tramo = enviados[inicio:inicio + batch_size]
+            for cliente in cls.objects.filter(doc_id_cliente__in={enviado.doc_id_cliente for enviado in tramo}):
+                guardados[(cliente.tipo_doc_cliente, cliente.doc_id_cliente)] = cliente
+        for clave, enviado in por_documento.items():
+            cliente = guardados[clave]
+            if cls.completar_vacios(cliente, {campo: getattr(enviado, campo) for campo in cls.CAMPOS_CONTACTO}):
+                pendientes.append(cliente)
+        cls.objects.bulk_update(pendientes, list(cls.CAMPOS_CONTACTO), batch_size=batch_size)
+        return [guardados[normalizar_documento(datos['tipo_doc_cliente'], datos['doc_id_cliente'])] for datos in lista]
+
 class RepresentanteLegal(models.Model):
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='representantes')
     nombre_representante = models.CharField(max_length=100)
@@ -105,8 +297,22 @@ class RepresentanteLegal(models.Model):
         return f"{self.nombre_representante} ({self.parentesco})"
 
 class EstadoReclamacion(models.Model):
+    # Códigos que usa el código (no dependen de cómo se escriba el nombre)
+    RECIBIDO = 'RECIBIDO'
+    RESPONDIDO = 'RESPONDIDO'
+
     nombre_estado_reclamo = models.CharField(max_length=50)
     descripcion = models.TextField(null=True, blank=True)
+    # Si se deja vacío se arma del nombre: "En proceso" -> EN_PROCESO
+    codigo = models.CharField(max_length=50, blank=True, db_index=True)
+
+    def save(self, *args, **kwargs):
+        if not self.codigo:
+            self.codigo = normalizar_codigo(self.nombre_estado_reclamo)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'codigo'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.nombre_estado_reclamo
@@ -135,6 +341,33 @@ class Reclamacion(models.Model):
     solicitud_cliente = models.TextField(null=True, blank=True)
     respuesta = models.TextField(null=True, blank=True)
     estado = models.ForeignKey(EstadoReclamacion, on_delete=models.PROTECT, related_name='reclamaciones')
+    # Copia de libro.proveedor para filtrar por tenant sin joins
+    proveedor = models.ForeignKey(
+        Proveedor, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='reclamaciones'
+    )
+
+    objects = TenantQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Listados por proveedor ordenados por (fecha, id): tabla, reclamos, exportación
+            models.Index(fields=['proveedor', 'fecha', 'id'], name='reclamacion_prov_fecha_idx'),
+            # Filtros por estado dentro de un proveedor
+            models.Index(fields=['proveedor', 'estado', 'fecha'], name='reclamacion_prov_estado_idx'),
+            # Reclamaciones de un libro (/api/libros/<id>/reclamaciones/)
+            models.Index(fields=['libro', 'fecha', 'id'], name='reclamacion_libro_fecha_idx'),
+            # Listado completo del superusuario
+            models.Index(fields=['fecha', 'id'], name='reclamacion_fecha_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'libro' in update_fields:
+            # Siempre de la base: el libro puede venir de CacheLibros con un dueño ya cambiado
+            self.proveedor_id = LibroReclamacion.objects.filter(pk=self.libro_id).values_list('proveedor_id', flat=True).first()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'proveedor'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.codigo_hoja
@@ -143,7 +376,141 @@ class ArchivoAdjunto(models.Model):
     reclamacion = models.ForeignKey(Reclamacion, on_delete=models.CASCADE, related_name='archivos')
     nombre_archivo = models.CharField(max_length=255)
     ruta = models.CharField(max_length=255)
+    # Contenido guardado por su hash (ver adjuntos.py): dos subidas iguales comparten el archivo
+    sha256 = models.CharField(max_length=64, blank=True, default='', editable=False, db_index=True)
+    tamano = models.BigIntegerField(default=0, editable=False)  # bytes, para la cuota del proveedor
+    content_type = models.CharField(max_length=100, blank=True, default='', editable=False)
+    # Copia de reclamacion.proveedor para la cuota y el filtro por tenant
+    proveedor = models.ForeignKey(
+        Proveedor, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='archivos'
+    )
+
+    objects = TenantQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'reclamacion' in update_fields:
+            if ArchivoAdjunto.reclamacion.is_cached(self):
+                self.proveedor_id = self.reclamacion.proveedor_id
+            else:
+                self.proveedor_id = Reclamacion.objects.filter(pk=self.reclamacion_id).values_list('proveedor_id', flat=True).first()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'proveedor'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.nombre_archivo
     
+
+# Conteos diarios por proveedor, establecimiento, tipo, tipo de bien y estado, con el monto
+# reclamado. Se mantienen al crear, editar o borrar reclamaciones (ver signals.py y
+# crear_reclamaciones_en_lote) y se reconstruyen con manage.py rebuild_stats. Las
+# estadísticas del tablero suman estas filas en vez de agrupar toda la tabla de reclamaciones.
+class ReclamacionStatsDiario(models.Model):
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE, null=True, related_name='estadisticas')
+    establecimiento = models.ForeignKey(Establecimiento, on_delete=models.SET_NULL, null=True, related_name='estadisticas')
+    fecha = models.DateField()  # día en TIME_ZONE
+    tipo = models.CharField(max_length=20, choices=Reclamacion.TIPO_CHOICES)
+    tipo_bien = models.CharField(max_length=20, choices=Reclamacion.TIPO_BIEN_CHOICES)
+    estado = models.ForeignKey(EstadoReclamacion, on_delete=models.CASCADE, related_name='estadisticas')
+    cantidad = models.IntegerField(default=0)
+    monto_reclamado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = TenantQuerySet.as_manager()
+
+    # Campos de Reclamacion que cambian la fila a la que cuenta
+    CAMPOS_RECLAMACION = frozenset({'libro', 'proveedor', 'fecha', 'tipo', 'tipo_bien', 'estado', 'monto_reclamado'})
+
+    class Meta:
+        constraints = [
+            # Con establecimiento o proveedor NULL la BD no detecta duplicados; no importa
+            # porque las consultas siempre suman las filas
+            models.UniqueConstraint(
+                fields=['proveedor', 'fecha', 'establecimiento', 'tipo', 'tipo_bien', 'estado'],
+                name='stats_diario_unico',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.proveedor_id} {self.fecha} {self.tipo}/{self.tipo_bien}/{self.estado_id}: {self.cantidad}"
+
+    @staticmethod
+    def clave(proveedor_id, establecimiento_id, fecha, tipo, tipo_bien, estado_id):
+        return {
+            'proveedor_id': proveedor_id, 'establecimiento_id': establecimiento_id,
+            'fecha': timezone.localdate(fecha), 'tipo': tipo, 'tipo_bien': tipo_bien, 'estado_id': estado_id,
+        }
+
+    @classmethod
+    def clave_de(cls, reclamacion, establecimiento_id):
+        return cls.clave(
+            reclamacion.proveedor_id, establecimiento_id, reclamacion.fecha,
+            reclamacion.tipo, reclamacion.tipo_bien, reclamacion.estado_id,
+        )
+
+    @classmethod
+    def clave_guardada(cls, reclamacion_id):
+        """(clave, monto) de la reclamación tal como está en la BD, o None si no existe."""
+        fila = Reclamacion.objects.filter(pk=reclamacion_id).values_list(
+            'proveedor_id', 'libro__establecimiento_id', 'fecha', 'tipo', 'tipo_bien', 'estado_id', 'monto_reclamado',
+        ).first()
+        if fila is None:
+            return None
+        return cls.clave(*fila[:6]), fila[6] or 0
+
+    @classmethod
+    def sumar(cls, clave, cantidad, monto=0):
+        """Suma (o resta) a la fila de esa clave con F(), creándola si todavía no existe."""
+        cambios = {'cantidad': F('cantidad') + cantidad, 'monto_reclamado': F('monto_reclamado') + (monto or 0)}
+        if cls.objects.filter(**clave).update(**cambios):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(**clave, cantidad=cantidad, monto_reclamado=monto or 0)
+        except IntegrityError:
+            # Otro worker creó la misma fila al mismo tiempo
+            cls.objects.filter(**clave).update(**cambios)
+
+    @classmethod
+    def sumar_lote(cls, reclamaciones):
+        """Una actualización por clave para reclamaciones recién creadas (con su libro cargado)."""
+        totales = {}
+        for reclamacion in reclamaciones:
+            clave = tuple(cls.clave_de(reclamacion, reclamacion.libro.establecimiento_id).items())
+            cantidad, monto = totales.get(clave, (0, 0))
+            totales[clave] = (cantidad + 1, monto + (reclamacion.monto_reclamado or 0))
+        for clave, (cantidad, monto) in totales.items():
+            cls.sumar(dict(clave), cantidad, monto)
+
+    @classmethod
+    def reconstruir(cls, proveedor_ids=None, lote=1000):
+        """
+        Recalcula desde Reclamacion (todas o solo las de esos proveedores) con un GROUP BY.
+        Para la carga inicial y para cambios masivos que no pasan por save().
+        """
+        reclamaciones = Reclamacion.objects.all()
+        existentes = cls.objects.all()
+        if proveedor_ids is not None:
+            reclamaciones = reclamaciones.filter(proveedor_id__in=proveedor_ids)
+            existentes = existentes.filter(proveedor_id__in=proveedor_ids)
+        grupos = (
+            reclamaciones
+            .annotate(dia=TruncDate('fecha', tzinfo=timezone.get_current_timezone()))
+            .values_list('proveedor_id', 'libro__establecimiento_id', 'dia', 'tipo', 'tipo_bien', 'estado_id')
+            .annotate(total=Count('id'), monto=Sum('monto_reclamado'))
+            .order_by()
+        )
+        creadas = 0
+        with transaction.atomic():
+            existentes.delete()
+            filas = []
+            for proveedor_id, establecimiento_id, dia, tipo, tipo_bien, estado_id, total, monto in grupos.iterator():
+                filas.append(cls(
+                    proveedor_id=proveedor_id, establecimiento_id=establecimiento_id, fecha=dia, tipo=tipo,
+                    tipo_bien=tipo_bien, estado_id=estado_id, cantidad=total, monto_reclamado=monto or 0,
+                ))
+                if len(filas) == lote:
+                    creadas += len(cls.objects.bulk_create(filas))
+                    filas = []
+            creadas += len(cls.objects.bulk_create(filas))
+        return creadas
@@ -0,0 +1,192 @@
+import base64
+import binascii
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.utils.urls import replace_query_param
+
+from .renderers import RapidJSONRenderer
+
+
+# Paginación por llave (keyset) sobre (fecha, id), del más reciente al más antiguo.
+# A diferencia de OFFSET, cada página cuesta lo mismo sin importar qué tan lejos esté.
+class KeysetPagination:
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = ('-fecha', '-id')
+
+    def __init__(self):
+        self.page_size = getattr(settings, 'RECLAMACIONES_PAGE_SIZE', 100)
+        self.max_page_size = getattr(settings, 'RECLAMACIONES_MAX_PAGE_SIZE', 1000)
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        valor = request.query_params.get(self.page_size_query_param)
+        if valor is None:
+            return self.page_size
+        try:
+            tamano = int(valor)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'Debe ser un número entero.'})
+        if tamano < 1:
+            raise ValidationError({self.page_size_query_param: 'Debe ser mayor a cero.'})
+        return min(tamano, self.max_page_size)
+
+    def encode_cursor(self, obj):
+        return self.encode_clave(obj.fecha, obj.pk)
+
+    def encode_clave(self, fecha, pk):
+        crudo = f"{fecha.isoformat()}|{pk}"
+        return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            relleno = '=' * (-len(cursor) % 4)
+            crudo = base64.urlsafe_b64decode(cursor + relleno).decode()
+            fecha, pk = crudo.rsplit('|', 1)
+            return datetime.fromisoformat(fecha), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound('Cursor inválido.')
+
+    def filter_queryset(self, queryset, request):
+        """Ordena el queryset y descarta todo lo anterior al cursor recibido."""
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            fecha, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(fecha__lt=fecha) | Q(fecha=fecha, id__lt=pk))
+        return queryset
+
+    def paginate_queryset(self, queryset, request, clave=None):
+        """
+        `clave(fila) -> (fecha, pk)` permite paginar querysets de .values_list();
+        por defecto se leen los atributos del modelo.
+        """
+        page_size = self.get_page_size(request)
+        # Se pide una fila extra solo para saber si existe una página siguiente
+        filas = list(self.filter_queryset(queryset, request)[:page_size + 1])
+        self.request = request
+        self.next_cursor = None
+        if len(filas) > page_size:
+            ultima = filas[page_size - 1]
+            self.next_cursor = self.encode_clave(*clave(ultima)) if clave else self.encode_cursor(ultima)
+        return filas[:page_size]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'results': data,
+        }
+
+
+# Resultados ordenados por relevancia (búsqueda de texto): no hay una llave estable
+# para paginar por cursor, así que se usa ?page= sobre los ids ya ordenados por el índice.
+class RelevanciaPagination(KeysetPagination):
+    page_query_param = 'page'
+    hay_siguiente = False
+
+    def get_page_number(self, request):
+        valor = request.query_params.get(self.page_query_param, '1')
+        try:
+            numero = int(valor)
+        except ValueError:
+            raise ValidationError({self.page_query_param: 'Debe ser un número entero.'})
+        if numero < 1:
+            raise ValidationError({self.page_query_param: 'Debe ser mayor a cero.'})
+        return numero
+
+    def paginate_ids(self, buscar, request):
+        """`buscar(limite, desplazamiento) -> [ids]` en orden de relevancia."""
+        page_size = self.get_page_size(request)
+        self.page_number = self.get_page_number(request)
+        ids = buscar(page_size + 1, (self.page_number - 1) * page_size)
+        self.request = request
+        self.hay_siguiente = len(ids) > page_size
+        return ids[:page_size]
+
+    def get_next_link(self):
+        if not self.hay_siguiente:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page_number + 1)
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'results': data,
+        }
+
+
+# Respuesta en streaming: las filas se leen con un cursor del servidor (.iterator)
+# y se serializan por bloques, así la memoria no crece con el número de reclamaciones.
+STREAM_FORMATOS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+def _bloques(iterable, tamano):
+    iterador = iter(iterable)
+    while bloque := list(islice(iterador, tamano)):
+        yield bloque
+
+
+def _validar_formato(formato):
+    if formato not in STREAM_FORMATOS:
+        raise ValidationError({'stream': f"Formato no soportado. Opciones: {', '.join(STREAM_FORMATOS)}."})
+
+
+def _chunk_size(chunk_size):
+    return chunk_size or getattr(settings, 'RECLAMACIONES_STREAM_CHUNK_SIZE', 2000)
+
+
+def stream_filas(filas, formato, renderer=None):
+    """Envía un iterable de dicts ya serializados como NDJSON o como un arreglo JSON."""
+    _validar_formato(formato)
+    renderer = renderer or RapidJSONRenderer()
+
+    def generar():
+        if formato == 'json':
+            yield b'['
+        primero = True
+        for fila in filas:
+            contenido = renderer.render(fila)
+            if formato == 'ndjson':
+                yield contenido + b'\n'
+            else:
+                yield contenido if primero else b',' + contenido
+            primero = False
+        if formato == 'json':
+            yield b']'
+
+    return StreamingHttpResponse(generar(), content_type=STREAM_FORMATOS[formato])
+
+
+def stream_queryset(queryset, serializer_class, formato, chunk_size=None, renderer=None):
+    _validar_formato(formato)
+    chunk_size = _chunk_size(chunk_size)
+
+    def filas():
+        for bloque in _bloques(queryset.iterator(chunk_size=chunk_size), chunk_size):
+            yield from serializer_class(bloque, many=True).data
+
+    return stream_filas(filas(), formato, renderer)
+
+
+def stream_proyeccion(queryset, proyeccion, formato, chunk_size=None, renderer=None):
+    """Igual que stream_queryset pero con una proyecciones.ProyeccionPlana (sin instanciar modelos)."""
+    _validar_formato(formato)
+    return stream_filas(proyeccion.filas(queryset, chunk_size=_chunk_size(chunk_size)), formato, renderer)
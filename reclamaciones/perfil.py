@@ -0,0 +1,160 @@
+from django.db.models import Count, Prefetch
+from .models import Marca, Establecimiento, LibroReclamacion, Reclamacion
+
+
+# Niveles del árbol que se pueden pedir con ?depth=
+# 0: marcas, 1: + establecimientos, 2: + libros (solo conteos), 3: + reclamaciones
+PROFUNDIDAD_MARCAS = 0
+PROFUNDIDAD_ESTABLECIMIENTOS = 1
+PROFUNDIDAD_LIBROS = 2
+PROFUNDIDAD_COMPLETA = 3
+
+
+# Arma el árbol proveedor -> marcas -> establecimientos -> libros -> reclamaciones
+# con un número fijo de consultas (una por nivel), sin importar cuántos datos haya.
+# Si solo se piden algunos libros (expand), las reclamaciones se cargan solo para esos.
+def marcas_con_arbol(proveedor, con_reclamaciones=True, libros_expandidos=()):
+    libros = (
+        LibroReclamacion.objects
+        .annotate(reclamaciones_count=Count('reclamaciones'))
+        .order_by('id')
+    )
+    if con_reclamaciones or libros_expandidos:
+        reclamaciones = Reclamacion.objects.select_related('cliente').order_by('id')
+        if not con_reclamaciones:
+            reclamaciones = reclamaciones.filter(libro_id__in=libros_expandidos)
+        libros = libros.prefetch_related(Prefetch('reclamaciones', queryset=reclamaciones))
+    establecimientos = Establecimiento.objects.order_by('id').prefetch_related(
+        Prefetch('libros', queryset=libros)
+    )
+    return Marca.objects.filter(proveedor=proveedor).order_by('id').prefetch_related(
+        Prefetch('establecimientos', queryset=establecimientos)
+    )
+
+
+def _cliente(cliente):
+    return {
+        'id': cliente.id,
+        'nombre': cliente.nombre_cliente,
+        'tipo_doc': cliente.tipo_doc_cliente,
+        'documento_identidad': cliente.doc_id_cliente,
+        'email': cliente.email,
+        'telefono': cliente.telefono,
+        'fecha_nacimiento': cliente.fecha_nacimiento,
+    }
+
+
+def datos_reclamacion(reclamo):
+    return {
+        'id': reclamo.id,
+        'codigo_hoja': reclamo.codigo_hoja,
+        'fecha': reclamo.fecha,
+        'tipo': reclamo.tipo,
+        'tipo_bien': reclamo.tipo_bien,
+        'detalle': reclamo.detalle,
+        'cliente': _cliente(reclamo.cliente),
+    }
+
+
+def _libro(libro):
+    return {
+        'id': libro.id,
+        'codigo': libro.codigo_libro,
+        'estado': libro.estado,
+        'reclamaciones_count': libro.reclamaciones_count,
+        'reclamaciones': [datos_reclamacion(reclamo) for reclamo in libro.reclamaciones.all()],
+    }
+
+
+def _establecimiento(est):
+    return {
+        'id': est.id,
+        'nombre': est.nombre_establecimiento,
+        'direccion': est.direccion_establecimiento,
+        'telefono': est.telefono,
+        'email_contacto': est.email_contacto,
+        'es_online': est.es_online,
+        'libros': [_libro(libro) for libro in est.libros.all()],
+    }
+
+
+def _marca(marca):
+    return {
+        'id': marca.id,
+        'nombre': marca.nombre_marca,
+        'descripcion': marca.descripcion,
+        'establecimientos': [_establecimiento(est) for est in marca.establecimientos.all()],
+    }
+
+
+def _datos_proveedor(proveedor):
+    return {
+        'id': proveedor.id,
+        'razon_social': proveedor.razon_social,
+        'ruc': proveedor.ruc,
+        'direccion': proveedor.domicilio_fiscal,
+        'telefono': proveedor.telefono,
+        'email_contacto': proveedor.email_contacto,
+    }
+
+
+def construir_arbol_proveedor(proveedor):
+    datos = _datos_proveedor(proveedor)
+    datos['marcas'] = [_marca(marca) for marca in marcas_con_arbol(proveedor)]
+    return datos
+
+
+# Versión resumida para el primer pintado del dashboard: solo conteos hasta el
+# nivel pedido. Las reclamaciones se incluyen solo para los libros en `expand`
+# (o todas con depth=3); el resto se piden a /api/libros/<id>/reclamaciones/.
+def construir_resumen_proveedor(proveedor, depth, expand=()):
+    expand = set(expand)
+    marcas = marcas_con_arbol(
+        proveedor, con_reclamaciones=depth >= PROFUNDIDAD_COMPLETA, libros_expandidos=expand
+    )
+
+    def libro(obj):
+        datos = {
+            'id': obj.id,
+            'codigo': obj.codigo_libro,
+            'estado': obj.estado,
+            'reclamaciones_count': obj.reclamaciones_count,
+        }
+        if depth >= PROFUNDIDAD_COMPLETA or obj.id in expand:
+            datos['reclamaciones'] = [datos_reclamacion(r) for r in obj.reclamaciones.all()]
+        return datos
+
+    def establecimiento(obj):
+        libros = [libro(l) for l in obj.libros.all()]
+        datos = {
+            'id': obj.id,
+            'nombre': obj.nombre_establecimiento,
+            'direccion': obj.direccion_establecimiento,
+            'telefono': obj.telefono,
+            'email_contacto': obj.email_contacto,
+            'es_online': obj.es_online,
+            'libros_count': len(libros),
+            'reclamaciones_count': sum(l['reclamaciones_count'] for l in libros),
+        }
+        if depth >= PROFUNDIDAD_LIBROS:
+            datos['libros'] = libros
+        return datos
+
+    def marca(obj):
+        establecimientos = [establecimiento(e) for e in obj.establecimientos.all()]
+        datos = {
+            'id': obj.id,
+            'nombre': obj.nombre_marca,
+            'descripcion': obj.descripcion,
+            'establecimientos_count': len(establecimientos),
+            'libros_count': sum(e['libros_count'] for e in establecimientos),
+            'reclamaciones_count': sum(e['reclamaciones_count'] for e in establecimientos),
+        }
+        if depth >= PROFUNDIDAD_ESTABLECIMIENTOS:
+            datos['establecimientos'] = establecimientos
+        return datos
+
+    datos = _datos_proveedor(proveedor)
+    datos['marcas'] = [marca(m) for m in marcas]
+    datos['reclamaciones_count'] = sum(m['reclamaciones_count'] for m in datos['marcas'])
+    return datos
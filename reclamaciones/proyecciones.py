@@ -0,0 +1,103 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+
+
+# Motor de solo lectura para serializers "planos" (tabla, exportación).
+#
+# Compila los campos declarados del serializer en una sola proyección
+# .values_list() y arma cada dict de salida desde la tupla con un mapeo
+# precalculado, sin instanciar modelos ni pasar por get_attribute de DRF.
+# El resultado es el mismo que serializer(many=True).data, campo por campo:
+#   - campos con source (con o sin puntos): se usa el to_representation del
+#     propio campo, salvo texto/enteros que la BD ya devuelve listos
+#   - si una relación intermedia nullable es None, el campo se omite, igual que DRF
+#   - SerializerMethodField: el serializer declara en Meta.proyeccion
+#     {campo: ((columnas...), funcion)} con una función pura sobre esas columnas
+class ProyeccionPlana:
+    def __init__(self, serializer_class):
+        serializer = serializer_class()
+        model = serializer.Meta.model
+        metodos = getattr(serializer.Meta, 'proyeccion', {})
+
+        self.columnas = []
+        self._indices = {}
+        self.campos = []  # (nombre, índices, convertir, índice de la relación que puede ser None, es método)
+
+        for nombre, campo in serializer.fields.items():
+            if campo.write_only:
+                continue
+            if isinstance(campo, serializers.SerializerMethodField):
+                if nombre not in metodos:
+                    raise ValueError(f"{serializer_class.__name__}.Meta.proyeccion no define '{nombre}'")
+                columnas, funcion = metodos[nombre]
+                self.campos.append((nombre, tuple(self._columna(c) for c in columnas), funcion, None, True))
+                continue
+
+            partes = campo.source.split('.')
+            ruta = '__'.join(partes)
+            campo_modelo, intermedia = self._resolver(model, partes)
+            convertir = None if self._sin_conversion(campo, campo_modelo) else campo.to_representation
+            self.campos.append((
+                nombre, (self._columna(ruta),), convertir,
+                self._columna(intermedia) if intermedia else None, False,
+            ))
+
+    def _columna(self, ruta):
+        if ruta not in self._indices:
+            self._indices[ruta] = len(self.columnas)
+            self.columnas.append(ruta)
+        return self._indices[ruta]
+
+    def indice(self, ruta):
+        return self._indices[ruta]
+
+    @staticmethod
+    def _resolver(model, partes):
+        """Devuelve el campo de modelo final y la última relación nullable del camino."""
+        intermedia = None
+        campo = None
+        for i, parte in enumerate(partes):
+            try:
+                campo = model._meta.get_field(parte)
+            except FieldDoesNotExist:
+                raise ValueError(f"'{'.'.join(partes)}' no es un camino de campos de {model.__name__}")
+            if campo.is_relation:
+                if i == len(partes) - 1:
+                    raise ValueError(f"'{'.'.join(partes)}' termina en una relación; no se puede proyectar")
+                if campo.null:
+                    intermedia = '__'.join(partes[:i + 1])
+                model = campo.related_model
+        return campo, intermedia
+
+    @staticmethod
+    def _sin_conversion(campo, campo_modelo):
+        if isinstance(campo, serializers.CharField):
+            return isinstance(campo_modelo, (models.CharField, models.TextField))
+        if isinstance(campo, serializers.IntegerField):
+            return isinstance(campo_modelo, (models.IntegerField, models.AutoField))
+        return False
+
+    def queryset(self, queryset):
+        return queryset.values_list(*self.columnas)
+
+    def a_dict(self, fila):
+        salida = {}
+        for nombre, indices, convertir, intermedia, es_metodo in self.campos:
+            if es_metodo:
+                salida[nombre] = convertir(*(fila[i] for i in indices))
+                continue
+            if intermedia is not None and fila[intermedia] is None:
+                continue
+            valor = fila[indices[0]]
+            if valor is None or convertir is None:
+                salida[nombre] = valor
+            else:
+                salida[nombre] = convertir(valor)
+        return salida
+
+    def filas(self, queryset, chunk_size=None):
+        filas = self.queryset(queryset)
+        if chunk_size:
+            filas = filas.iterator(chunk_size=chunk_size)
+        return (self.a_dict(fila) for fila in filas)
@@ -0,0 +1,62 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa el json de DRF
+    orjson = None
+
+
+# Mismo JSON que rest_framework.renderers.JSONRenderer (compacto, UTF-8, \u2028 escapado),
+# pero con orjson cuando está instalado. Las fechas y demás tipos que orjson sabría
+# serializar a su manera pasan por el encoder de DRF (OPT_PASSTHROUGH_*), así la salida
+# no cambia: '2025-01-01T10:00:00Z' y no '+00:00'. Con indent (API navegable,
+# ?format=json; indent=4) o si orjson no puede con el dato se usa el renderer de DRF.
+# Única diferencia conocida: floats con exponente grande (orjson escribe 1e16, json 1e+16).
+class RapidJSONRenderer(JSONRenderer):
+    if orjson is not None:
+        opciones = (
+            orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_PASSTHROUGH_DATACLASS
+            | orjson.OPT_NON_STR_KEYS
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.opciones)
+        except orjson.JSONEncodeError:
+            # Enteros de más de 64 bits, claves raras, etc.
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class RapidJSONParser(JSONParser):
+    renderer_class = RapidJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None or not self.strict:
+            # orjson siempre rechaza NaN/Infinity; sin STRICT_JSON se deja a DRF
+            return super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        try:
+            contenido = stream.read()
+            if encoding.lower().replace('-', '') != 'utf8':
+                contenido = contenido.decode(encoding)
+            return orjson.loads(contenido)
+        except (orjson.JSONDecodeError, UnicodeDecodeError) as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,277 @@
+"""
+Datos sintéticos con volumen de producción para medir la API (manage.py seed_canal).
+
+A diferencia de benchmarks.crear_datos, las filas quedan guardadas: usar una base de
+pruebas. Todo se inserta con bulk_create por lotes, que no pasa por save() ni por los
+signals, así que lo que ellos mantendrían se completa aquí: el proveedor copiado en
+libros y reclamaciones, el índice de búsqueda, las estadísticas diarias, la versión de
+datos de cada proveedor y el cache de libros.
+
+Los proveedores sembrados tienen RUC 29xxxxxxxxx (ningún RUC real empieza así) y un
+usuario admin@<ruc>.canal.invalid. Los clientes son DNI correlativos: una segunda
+corrida vuelve a usar los mismos (con Cliente.resolver_lote), como el cliente que
+reclama en más de una empresa. Las reclamaciones se reparten con una cola larga: unos
+pocos proveedores concentran la mayoría, como pasa con las cadenas grandes.
+"""
+import random
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import busqueda
+from .cache import invalidar_libros, registro_estados
+from .codigos import generador_codigo_hoja
+from .models import (
+    Cliente, Establecimiento, EstadoReclamacion, LibroReclamacion, Marca, Proveedor, Reclamacion,
+    ReclamacionStatsDiario, VersionDatos,
+)
+from usuarios.models import Usuario
+
+
+ESCALAS = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+PREFIJO_RUC = '29'
+MARCAS_POR_PROVEEDOR = 2
+ESTABLECIMIENTOS_POR_MARCA = 3
+# Si no se indica, un proveedor cada tantas reclamaciones y un cliente cada tantas
+RECLAMACIONES_POR_PROVEEDOR = 1000
+RECLAMACIONES_POR_CLIENTE = 3
+DIAS = 365
+PASSWORD = 'CanalSembrado123'
+
+ESTADOS = [
+    (EstadoReclamacion.RECIBIDO, 'Recibido'),
+    ('EN_PROCESO', 'En proceso'),
+    (EstadoReclamacion.RESPONDIDO, 'Respondido'),
+]
+
+RUBROS = ['Inversiones', 'Corporación', 'Distribuidora', 'Comercial', 'Servicios', 'Grupo', 'Importaciones']
+NOMBRES_EMPRESA = ['Andina', 'Pacífico', 'Inca', 'Sureña', 'Norteña', 'Limeña', 'Amazónica', 'Santa Rosa', 'Costa Verde', 'Chalaca']
+SOCIEDADES = ['S.A.C.', 'S.A.', 'E.I.R.L.', 'S.R.L.']
+MARCAS = ['Express', 'Market', 'Store', 'Plus', 'Fresh', 'Tech', 'Home', 'Moda', 'Farma', 'Food']
+DISTRITOS = [
+    'Miraflores', 'San Isidro', 'Surco', 'La Molina', 'San Borja', 'Jesús María', 'Lince', 'Los Olivos',
+    'San Miguel', 'Ate', 'Chorrillos', 'Barranco', 'Comas', 'San Juan de Lurigancho', 'Callao',
+]
+NOMBRES = ['María', 'José', 'Rosa', 'Juan', 'Carmen', 'Luis', 'Ana', 'Carlos', 'Lucía', 'Jorge', 'Elena', 'Miguel', 'Patricia', 'Pedro']
+APELLIDOS = ['Quispe', 'Flores', 'García', 'Rodríguez', 'Huamán', 'Mamani', 'Sánchez', 'Chávez', 'Torres', 'Ramírez', 'Vargas', 'Castillo', 'Rojas', 'Mendoza']
+BIENES = {
+    'producto': ['Televisor LED 50"', 'Zapatillas deportivas', 'Refrigeradora', 'Celular', 'Lavadora', 'Juego de sábanas', 'Licuadora'],
+    'servicio': ['Delivery de comida', 'Instalación de internet', 'Mantenimiento de equipo', 'Reserva de hotel', 'Atención en tienda'],
+}
+DETALLES = [
+    'El {bien} llegó con fallas y no quisieron cambiarlo.',
+    'Pagué el {bien} y hasta la fecha no me lo entregan.',
+    'Me cobraron dos veces el {bien} con la misma tarjeta.',
+    'El personal no quiso atenderme el reclamo por el {bien}.',
+    'El {bien} no corresponde con lo ofrecido en la publicidad.',
+    'Solicité la garantía del {bien} y me la negaron sin explicación.',
+]
+SOLICITUDES = ['Cambio del producto', 'Devolución del dinero', 'Atención inmediata', None]
+RESPUESTA = 'Se atendió el reclamo y se comunicó la solución al cliente.'
+
+
+def proveedores_por_defecto(reclamaciones):
+    return max(1, reclamaciones // RECLAMACIONES_POR_PROVEEDOR)
+
+
+def clientes_por_defecto(reclamaciones):
+    return max(1, reclamaciones // RECLAMACIONES_POR_CLIENTE)
+
+
+def primer_numero_ruc():
+    """Después del último RUC sembrado, así se puede correr varias veces sobre la misma base."""
+    ultimo = Proveedor.objects.filter(ruc__startswith=PREFIJO_RUC).aggregate(ultimo=Max('ruc'))['ultimo']
+    return int(ultimo[len(PREFIJO_RUC):]) + 1 if ultimo else 1
+
+
+def crear_con_ids(modelo, objetos, recien_creados, batch_size):
+    """bulk_create; en MySQL, que no devuelve los ids, se vuelven a leer (en el mismo orden de inserción)."""
+    modelo.objects.bulk_create(objetos, batch_size=batch_size)
+    if objetos and objetos[0].pk is None:
+        return list(recien_creados.order_by('id'))
+    return objetos
+
+
+def crear_arbol(rng, cantidad, password, batch_size):
+    """Proveedores con sus marcas, establecimientos, libros y un usuario admin cada uno."""
+    inicio = primer_numero_ruc()
+    rucs = [f'{PREFIJO_RUC}{numero:09d}' for numero in range(inicio, inicio + cantidad)]
+    proveedores = crear_con_ids(Proveedor, [
+        Proveedor(
+            razon_social=f'{rng.choice(RUBROS)} {rng.choice(NOMBRES_EMPRESA)} {rng.choice(SOCIEDADES)}', ruc=ruc,
+            domicilio_fiscal=f'Av. {rng.choice(APELLIDOS)} {rng.randint(100, 3000)}, {rng.choice(DISTRITOS)}',
+            telefono=f'01{rng.randint(1000000, 9999999)}', email_contacto=f'contacto@{ruc}.canal.invalid',
+        )
+        for ruc in rucs
+    ], Proveedor.objects.filter(ruc__gte=rucs[0], ruc__lte=rucs[-1]), batch_size)
+
+    marcas = crear_con_ids(Marca, [
+        Marca(proveedor=proveedor, nombre_marca=f'{rng.choice(NOMBRES_EMPRESA)} {marca}', descripcion=f'Marca {marca} de {proveedor.razon_social}')
+        for proveedor in proveedores
+        for marca in rng.sample(MARCAS, MARCAS_POR_PROVEEDOR)
+    ], Marca.objects.filter(proveedor__in=proveedores), batch_size)
+    proveedor_de_marca = {marca.pk: marca.proveedor_id for marca in marcas}
+    ruc_de_proveedor = {proveedor.pk: proveedor.ruc for proveedor in proveedores}
+
+    establecimientos = []
+    for marca in marcas:
+        for n in range(ESTABLECIMIENTOS_POR_MARCA):
+            # El último de cada marca es la tienda online
+            online = n == ESTABLECIMIENTOS_POR_MARCA - 1
+            distrito = None if online else rng.choice(DISTRITOS)
+            establecimientos.append(Establecimiento(
+                marca=marca, nombre_establecimiento=f'{marca.nombre_marca} {"Online" if online else distrito}',
+                direccion_establecimiento=None if online else f'Jr. {rng.choice(APELLIDOS)} {rng.randint(100, 1500)}',
+                distrito=distrito, provincia=None if online else 'Lima', departamento=None if online else 'Lima',
+                enlace_acceso=f'https://{ruc_de_proveedor[proveedor_de_marca[marca.pk]]}.canal.invalid' if online else None,
+                es_online=online, telefono=f'9{rng.randint(10000000, 99999999)}',
+                email_contacto=f'tienda{n}@{ruc_de_proveedor[proveedor_de_marca[marca.pk]]}.canal.invalid',
+            ))
+    establecimientos = crear_con_ids(
+        Establecimiento, establecimientos, Establecimiento.objects.filter(marca__in=marcas), batch_size
+    )
+
+    libros = []
+    for n, establecimiento in enumerate(establecimientos):
+        proveedor_id = proveedor_de_marca[establecimiento.marca_id]
+        codigo = f'LR-{ruc_de_proveedor[proveedor_id]}-{n % (MARCAS_POR_PROVEEDOR * ESTABLECIMIENTOS_POR_MARCA) + 1}'
+        libros.append(LibroReclamacion(
+            establecimiento=establecimiento, codigo_libro=codigo, libro_slug=slugify(codigo),
+            establecimiento_slug=slugify(establecimiento.nombre_establecimiento), estado='activo',
+            proveedor_id=proveedor_id,  # bulk_create no pasa por save()
+        ))
+    libros = crear_con_ids(LibroReclamacion, libros, LibroReclamacion.objects.filter(establecimiento__in=establecimientos), batch_size)
+
+    # Un solo hash para todos: con cientos de miles de iteraciones cada uno cuesta medio segundo
+    hash_password = make_password(password)
+    Usuario.objects.bulk_create([
+        Usuario(
+            email=f'admin@{proveedor.ruc}.canal.invalid', username=f'admin@{proveedor.ruc}.canal.invalid',
+            password=hash_password, proveedor=proveedor, role='admin',
+        )
+        for proveedor in proveedores
+    ], batch_size=batch_size)
+    return {'proveedores': proveedores, 'marcas': marcas, 'establecimientos': establecimientos, 'libros': libros}
+
+
+def estados_iniciales():
+    """Recibido, En proceso y Respondido; se crean los que falten."""
+    estados = {}
+    for codigo, nombre in ESTADOS:
+        estados[codigo] = registro_estados().por_codigo(codigo) or EstadoReclamacion.objects.create(
+            codigo=codigo, nombre_estado_reclamo=nombre
+        )
+    return estados
+
+
+def datos_cliente(numero):
+    """Siempre los mismos datos para el mismo número, como la misma persona que vuelve a reclamar."""
+    nombre = NOMBRES[numero % len(NOMBRES)]
+    paterno = APELLIDOS[numero // len(NOMBRES) % len(APELLIDOS)]
+    materno = APELLIDOS[numero // (len(NOMBRES) * len(APELLIDOS)) % len(APELLIDOS)]
+    return {
+        'nombre_cliente': f'{nombre} {paterno} {materno}', 'tipo_doc_cliente': 'DNI', 'doc_id_cliente': f'{numero:08d}',
+        'fecha_nacimiento': date(1950 + numero % 55, 1 + numero % 12, 1 + numero % 28),
+        'email': f'cliente{numero}@correo.invalid', 'telefono': f'9{numero % 100_000_000:08d}',
+    }
+
+
+def nueva_reclamacion(rng, libro, cliente, estados, ahora, codigo_hoja):
+    fecha = ahora - timedelta(seconds=rng.randrange(DIAS * 86400))
+    # Las antiguas casi todas respondidas; las del último mes, la mayoría pendientes
+    antigua = ahora - fecha > timedelta(days=30)
+    azar = rng.random()
+    if azar < (0.85 if antigua else 0.15):
+        estado = estados[EstadoReclamacion.RESPONDIDO]
+    elif azar < (0.95 if antigua else 0.5):
+        estado = estados['EN_PROCESO']
+    else:
+        estado = estados[EstadoReclamacion.RECIBIDO]
+
+    tipo_bien = 'producto' if rng.random() < 0.65 else 'servicio'
+    bien = rng.choice(BIENES[tipo_bien])
+    return Reclamacion(
+        libro=libro, cliente=cliente, proveedor_id=libro.proveedor_id, estado=estado, fecha=fecha,
+        codigo_hoja=codigo_hoja, tipo='reclamo' if rng.random() < 0.7 else 'queja', tipo_bien=tipo_bien,
+        descripcion_bien=bien, detalle=rng.choice(DETALLES).format(bien=bien.lower()),
+        monto_reclamado=Decimal(rng.randrange(1000, 500000)) / 100 if rng.random() < 0.6 else None,
+        solicitud_cliente=rng.choice(SOLICITUDES),
+        respuesta=RESPUESTA if estado.codigo == EstadoReclamacion.RESPONDIDO else None,
+    )
+
+
+def crear_reclamaciones(rng, libros, cantidad, clientes, lote, progreso=None):
+    """
+    `cantidad` reclamaciones en transacciones de `lote`, repartidas entre los libros con
+    peso 1/n según el puesto de su proveedor. Devuelve los números de cliente usados.
+    """
+    estados = estados_iniciales()
+    puesto = {proveedor_id: n for n, proveedor_id in enumerate(dict.fromkeys(libro.proveedor_id for libro in libros))}
+    acumulados = list(accumulate(1 / (puesto[libro.proveedor_id] + 1) for libro in libros))
+    usados = set()
+    creadas = 0
+    while creadas < cantidad:
+        tamano = min(lote, cantidad - creadas)
+        elegidos = rng.choices(libros, cum_weights=acumulados, k=tamano)
+        numeros = [rng.randrange(clientes) for _ in range(tamano)]
+        usados.update(numeros)
+        ahora = timezone.now()
+        with transaction.atomic():
+            por_reclamacion = Cliente.resolver_lote([datos_cliente(numero) for numero in numeros])
+            # Un bloque de códigos por libro, como crear_reclamaciones_en_lote
+            por_libro = {libro.pk: libro for libro in elegidos}
+            codigos = {
+                libro_id: iter(generador_codigo_hoja().generar_lote(por_libro[libro_id], n))
+                for libro_id, n in Counter(libro.pk for libro in elegidos).items()
+            }
+            reclamaciones = [
+                nueva_reclamacion(rng, libro, cliente, estados, ahora, next(codigos[libro.pk]))
+                for libro, cliente in zip(elegidos, por_reclamacion)
+            ]
+            Reclamacion.objects.bulk_create(reclamaciones, batch_size=1000)
+            if connection.features.can_return_rows_from_bulk_insert:
+                ids = [reclamacion.pk for reclamacion in reclamaciones]
+            else:
+                ids = Reclamacion.objects.filter(
+                    codigo_hoja__in=[reclamacion.codigo_hoja for reclamacion in reclamaciones]
+                ).values_list('id', flat=True)
+            busqueda.indexar(ids)
+        creadas += tamano
+        if progreso:
+            progreso(creadas)
+    return usados
+
+
+def sembrar(reclamaciones, proveedores=None, clientes=None, lote=5000, semilla=None, password=PASSWORD, progreso=None):
+    """
+    Crea el árbol de `proveedores` y les reparte `reclamaciones` de `clientes` distintos
+    (por defecto según RECLAMACIONES_POR_PROVEEDOR y RECLAMACIONES_POR_CLIENTE). Con la
+    misma `semilla` sale lo mismo. Devuelve cuántas filas creó de cada cosa;
+    `progreso(n)` se llama después de cada lote de reclamaciones.
+    """
+    rng = random.Random(semilla)
+    proveedores = proveedores or proveedores_por_defecto(reclamaciones)
+    clientes = clientes or clientes_por_defecto(reclamaciones)
+    batch_size = min(lote, 1000)
+
+    with transaction.atomic():
+        arbol = crear_arbol(rng, proveedores, password, batch_size)
+    usados = crear_reclamaciones(rng, arbol['libros'], reclamaciones, clientes, lote, progreso)
+
+    # Lo que harían los signals, una vez al final
+    proveedor_ids = [proveedor.pk for proveedor in arbol['proveedores']]
+    ReclamacionStatsDiario.reconstruir(proveedor_ids)
+    VersionDatos.incrementar(proveedor_ids)
+    invalidar_libros()
+
+    resumen = {nombre: len(filas) for nombre, filas in arbol.items()}
+    resumen.update(usuarios=len(proveedor_ids), clientes=len(usados), reclamaciones=reclamaciones)
+    return resumen
@@ -1,8 +1,19 @@
 from rest_framework import serializers
 from .models import *
 from usuarios.models import Usuario
+from . import busqueda
+from .adjuntos import token_adjuntos
+from .cache import cache_libros, registro_estados
+from .codigos import generador_codigo_hoja
+from .perfil import construir_arbol_proveedor, construir_resumen_proveedor
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
 from django.utils import timezone
-import traceback
+import logging
+from collections import Counter
+
+logger = logging.getLogger('reclamaciones.intake')
+logger_libros = logging.getLogger('reclamaciones.libros')
 
 
 # Proveedor
@@ -60,21 +71,109 @@ class ClienteSerializer(serializers.ModelSerializer):
         model = Cliente
         fields = '__all__'
 
+    def to_internal_value(self, data):
+        # Se normaliza antes de que corran los validadores: el del índice único compara
+        # los valores tal cual y "dni"/"12 345" pasaría para chocar luego en la BD
+        valores = super().to_internal_value(data)
+        if 'tipo_doc_cliente' in valores or 'doc_id_cliente' in valores:
+            instancia = self.instance if isinstance(self.instance, Cliente) else None
+            tipo = valores.get('tipo_doc_cliente', getattr(instancia, 'tipo_doc_cliente', ''))
+            numero = valores.get('doc_id_cliente', getattr(instancia, 'doc_id_cliente', ''))
+            valores['tipo_doc_cliente'], valores['doc_id_cliente'] = normalizar_documento(tipo, numero)
+        return valores
+
+# En el formulario un documento ya registrado no es un error: es el mismo cliente
+# (Cliente.resolver), así que no se valida el índice único
+class ClienteIntakeSerializer(ClienteSerializer):
+    class Meta(ClienteSerializer.Meta):
+        validators = []
+
 class EstadoReclamacionSerializer(serializers.ModelSerializer):
     class Meta:
         model = EstadoReclamacion
-        fields = ['id', 'nombre_estado_reclamo', 'descripcion']
+        fields = ['id', 'nombre_estado_reclamo', 'descripcion', 'codigo']
+
+
+# estado_id del formulario: se valida contra el registro en memoria, sin consultar la BD
+class EstadoRegistroField(serializers.PrimaryKeyRelatedField):
+    def get_queryset(self):
+        return EstadoReclamacion.objects.all()  # solo para las opciones del API navegable
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            estado_id = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        estado = registro_estados().por_id(estado_id)
+        if estado is None:
+            self.fail('does_not_exist', pk_value=data)
+        return estado
         
+def generar_codigo_hoja(libro):
+    return generador_codigo_hoja().generar(libro)
+
+
+# Carga masiva: recibe los validated_data de varios ReclamacionConClienteSerializer
+# e inserta clientes y reclamaciones con bulk_create dentro de una sola transacción
+def crear_reclamaciones_en_lote(validados, batch_size=500):
+    ahora = timezone.now()
+
+    with transaction.atomic():
+        # Upsert por documento: quien ya reclamó antes conserva su Cliente
+        clientes = Cliente.resolver_lote([datos['cliente'] for datos in validados], batch_size=batch_size)
+
+        # Un bloque de códigos por libro, no una reserva por reclamación
+        libros = {datos['libro'].pk: datos['libro'] for datos in validados}
+        # El dueño se lee de la base en una consulta, no del libro (puede venir de CacheLibros)
+        proveedores = dict(LibroReclamacion.objects.filter(pk__in=libros).values_list('pk', 'proveedor_id'))
+        cantidades = Counter(datos['libro'].pk for datos in validados)
+        codigos = {
+            libro_id: iter(generador_codigo_hoja().generar_lote(libros[libro_id], cantidad))
+            for libro_id, cantidad in cantidades.items()
+        }
+
+        reclamaciones = []
+        for datos, cliente in zip(validados, clientes):
+            datos = {k: v for k, v in datos.items() if k not in ('cliente', 'fecha', 'codigo_hoja')}
+            libro = datos.pop('libro')
+            reclamaciones.append(Reclamacion(
+                cliente=cliente,
+                libro=libro,
+                proveedor_id=proveedores.get(libro.pk),  # bulk_create no pasa por save()
+                fecha=ahora,
+                codigo_hoja=next(codigos[libro.pk]),
+                **datos
+            ))
+        Reclamacion.objects.bulk_create(reclamaciones, batch_size=batch_size)
+
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # Sin ids devueltos, se recuperan por el código de hoja (único)
+            ids = dict(Reclamacion.objects.filter(
+                codigo_hoja__in=[r.codigo_hoja for r in reclamaciones]
+            ).values_list('codigo_hoja', 'id'))
+            for reclamacion in reclamaciones:
+                reclamacion.id = ids[reclamacion.codigo_hoja]
+
+        # bulk_create no dispara post_save: versión de datos, índice de búsqueda y estadísticas se actualizan aquí
+        VersionDatos.incrementar_al_confirmar(*{reclamacion.proveedor_id for reclamacion in reclamaciones})
+        busqueda.indexar(reclamacion.id for reclamacion in reclamaciones)
+        ReclamacionStatsDiario.sumar_lote(reclamaciones)
+    return reclamaciones
+
+
 class ReclamacionConClienteSerializer(serializers.ModelSerializer):
-    cliente = ClienteSerializer()
+    # Solo de entrada: ver to_representation
+    cliente = ClienteIntakeSerializer(write_only=True)
 
     estado = EstadoReclamacionSerializer(read_only=True)
-    estado_id = serializers.PrimaryKeyRelatedField(
-        queryset=EstadoReclamacion.objects.all(), source='estado', write_only=True
-    )
+    estado_id = EstadoRegistroField(source='estado', write_only=True)
 
     libro = serializers.CharField(write_only=True)  # Código del libro
     libro_obj = LibroReclamacionSerializer(read_only=True, source='libro')  # opcional para respuesta
+    # Con este token el cliente sube sus evidencias sin cuenta (ver adjuntos.py)
+    token_adjuntos = serializers.SerializerMethodField()
 
     class Meta:
         model = Reclamacion
@@ -85,24 +184,51 @@ class ReclamacionConClienteSerializer(serializers.ModelSerializer):
             'codigo_hoja': {'required': False},  # no requerido
         }
 
+    def get_token_adjuntos(self, obj):
+        return token_adjuntos(obj.pk)
+
+    def to_representation(self, instance):
+        datos = super().to_representation(instance)
+        # El formulario es anónimo y el cliente se reconoce por su documento (Cliente.resolver):
+        # se responde lo que se envió, nunca los datos guardados de esa persona ni su id
+        enviado = (getattr(self, '_validated_data', None) or {}).get('cliente')
+        if enviado is not None:
+            campos = ClienteIntakeSerializer().fields
+            datos['cliente'] = {
+                nombre: campos[nombre].to_representation(valor)
+                for nombre, valor in enviado.items() if nombre in campos and not campos[nombre].write_only
+            }
+        return datos
+
     def validate_libro(self, value):
-        try:
-            # Busca el libro activo por su código
-            libro = LibroReclamacion.objects.get(codigo_libro=value, estado="activo")
-            return libro
-        except LibroReclamacion.DoesNotExist:
+        # En la carga masiva los libros ya vienen resueltos en una sola consulta
+        libros = self.context.get('libros')
+        if libros is not None:
+            if value not in libros:
+                raise serializers.ValidationError("No existe un libro activo con ese código.")
+            return libros[value]
+        # Busca el libro activo por su código (desde el cache, ver cache.py)
+        libro = cache_libros().libro_activo(value)
+        if libro is None:
             raise serializers.ValidationError("No existe un libro activo con ese código.")
+        return libro
+
+    def _separar(self, validated_data):
+        logger.debug("Datos antes de crear la reclamación", extra={'datos': validated_data})
+        cliente_data = validated_data.pop('cliente')
+        libro_obj = validated_data.pop('libro')
+        # La fecha y el código de hoja siempre los asigna el servidor
+        validated_data.pop('fecha', None)
+        validated_data.pop('codigo_hoja', None)
+        return cliente_data, libro_obj, validated_data
 
     def create(self, validated_data):
         try:
-            print("Datos antes de crear la reclamación:", validated_data)
-
-            cliente_data = validated_data.pop('cliente')
-            libro_obj = validated_data.pop('libro')
+            cliente_data, libro_obj, validated_data = self._separar(validated_data)
 
-            cliente = Cliente.objects.create(**cliente_data)
+            cliente = Cliente.resolver(cliente_data)
 
-            codigo_hoja = f"H-{uuid.uuid4().hex[:8].upper()}"
+            codigo_hoja = generar_codigo_hoja(libro_obj)
 
             reclamacion = Reclamacion.objects.create(
                 cliente=cliente,
@@ -111,12 +237,34 @@ class ReclamacionConClienteSerializer(serializers.ModelSerializer):
                 codigo_hoja=codigo_hoja,
                 **validated_data
             )
-            print("✅ Reclamación creada:", reclamacion)
+            logger.info("Reclamación creada: %s", reclamacion.codigo_hoja)
             return reclamacion
 
-        except Exception as e:
-            print("💥 Error al crear la reclamación:", e)
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error al crear la reclamación")
+            raise
+
+    # Lo mismo que save() + create() con el ORM async, para CrearReclamacionAsyncView
+    async def asave(self):
+        try:
+            cliente_data, libro_obj, validated_data = self._separar(dict(self.validated_data))
+
+            cliente = await sync_to_async(Cliente.resolver)(cliente_data)
+
+            codigo_hoja = await sync_to_async(generar_codigo_hoja)(libro_obj)
+
+            self.instance = await Reclamacion.objects.acreate(
+                cliente=cliente,
+                libro=libro_obj,
+                fecha=timezone.now(),
+                codigo_hoja=codigo_hoja,
+                **validated_data
+            )
+            logger.info("Reclamación creada: %s", self.instance.codigo_hoja)
+            return self.instance
+
+        except Exception:
+            logger.exception("Error al crear la reclamación")
             raise
     
 class ReclamacionDetalleProveedorSerializer(serializers.ModelSerializer):
@@ -147,6 +295,8 @@ class ReclamacionDetalleProveedorSerializer(serializers.ModelSerializer):
             'establecimiento',    # <-- Agregado
             'proveedor'           # <-- Agregado
         ]
+        # Relaciones que usan los SerializerMethodField (ver mixins.EagerLoadingMixin)
+        eager_select = ['cliente', 'libro__establecimiento__marca__proveedor']
 
     def get_reclamante(self, obj):
         if obj.cliente:
@@ -189,6 +339,12 @@ class ArchivoAdjuntoSerializer(serializers.ModelSerializer):
     class Meta:
         model = ArchivoAdjunto
         fields = '__all__'
+
+# Respuesta de la subida de un adjunto (también la ve el cliente anónimo)
+class AdjuntoSubidoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivoAdjunto
+        fields = ['id', 'nombre_archivo', 'sha256', 'tamano', 'content_type']
         
 # Info anidada usuario
 class UsuarioPerfilSerializer(serializers.ModelSerializer):
@@ -203,65 +359,17 @@ class UsuarioPerfilSerializer(serializers.ModelSerializer):
         if not proveedor:
             return None
 
-        marcas = proveedor.marcas.all()
+        # ?depth= pide solo conteos hasta cierto nivel (ver perfil.py)
+        depth = self.context.get('depth')
+        if depth is not None:
+            return construir_resumen_proveedor(proveedor, depth, self.context.get('expand', ()))
 
-        return {
-            'id': proveedor.id,
-            'razon_social': proveedor.razon_social,
-            'ruc': proveedor.ruc,
-            'direccion': proveedor.domicilio_fiscal,
-            'telefono': proveedor.telefono,
-            'email_contacto': proveedor.email_contacto,
-            'marcas': [
-                {
-                    'id': marca.id,
-                    'nombre': marca.nombre_marca,
-                    'descripcion': marca.descripcion,
-                    'establecimientos': [
-                        {
-                            'id': est.id,
-                            'nombre': est.nombre_establecimiento,
-                            'direccion': est.direccion_establecimiento,
-                            'telefono': est.telefono,
-                            'email_contacto': est.email_contacto,
-                            'es_online': est.es_online,
-                            'libros': [
-                                {
-                                    'id': libro.id,
-                                    'codigo': libro.codigo_libro,
-                                    'estado': libro.estado,
-                                    'reclamaciones_count': libro.reclamaciones.count(),
-                                    'reclamaciones': [
-                                        {
-                                            'id': reclamo.id,
-                                            'codigo_hoja': reclamo.codigo_hoja,
-                                            'fecha': reclamo.fecha,
-                                            'tipo': reclamo.tipo,
-                                            'tipo_bien': reclamo.tipo_bien,
-                                            'detalle': reclamo.detalle,
-                                            'cliente': {
-                                                'id': reclamo.cliente.id,
-                                                'nombre': reclamo.cliente.nombre_cliente,
-                                                'tipo_doc': reclamo.cliente.tipo_doc_cliente,
-                                                'documento_identidad': reclamo.cliente.doc_id_cliente,
-                                                'email': reclamo.cliente.email,
-                                                'telefono': reclamo.cliente.telefono,
-                                                'fecha_nacimiento': reclamo.cliente.fecha_nacimiento
-                                            }
-                                        }
-                                        for reclamo in libro.reclamaciones.all()
-                                    ]
-                                }
-                                for libro in est.libros.all()
-                            ]
-                        }
-                        for est in marca.establecimientos.all()
-                    ]
-                }
-                for marca in marcas
-            ]
-        }
+        # Árbol completo armado con una consulta por nivel (ver perfil.py)
+        return construir_arbol_proveedor(proveedor)
         
+TIPOS_RECLAMACION = dict(Reclamacion.TIPO_CHOICES)
+TIPOS_BIEN = dict(Reclamacion.TIPO_BIEN_CHOICES)
+
 #lista completa de reclamos por proveedor
 class ReclamacionPlanoSerializer(serializers.ModelSerializer):
     estado = serializers.CharField(source='estado.nombre_estado_reclamo', read_only=True)
@@ -283,6 +391,19 @@ class ReclamacionPlanoSerializer(serializers.ModelSerializer):
             'establecimiento',
             'reclamante'
         ]
+        eager_select = ['cliente']  # get_reclamante
+        # Equivalentes de los SerializerMethodField para proyecciones.ProyeccionPlana
+        proyeccion = {
+            'reclamante': (
+                ('cliente__nombre_cliente', 'cliente__doc_id_cliente', 'cliente__email'),
+                lambda nombre, documento, email: {
+                    "nombre": nombre,
+                    "documento_identidad": documento,
+                    "email": email
+                },
+            ),
+            'tipo': (('tipo',), lambda tipo: TIPOS_RECLAMACION.get(tipo, tipo)),
+        }
 
     def get_reclamante(self, obj):
         if obj.cliente:
@@ -296,6 +417,78 @@ class ReclamacionPlanoSerializer(serializers.ModelSerializer):
     def get_tipo(self, obj):
         return obj.get_tipo_display()
     
+# Columnas del libro completo que se entrega a INDECOPI (exportacion.py). Todo plano,
+# una columna por valor, para que la misma fila sirva al CSV y a la hoja XLSX
+class ReclamacionExportacionSerializer(serializers.ModelSerializer):
+    fecha = serializers.DateTimeField(format='%Y-%m-%d %H:%M:%S', read_only=True)
+    tipo = serializers.SerializerMethodField()
+    tipo_bien = serializers.SerializerMethodField()
+    estado = serializers.CharField(source='estado.nombre_estado_reclamo', read_only=True)
+    codigo_libro = serializers.CharField(source='libro.codigo_libro', read_only=True)
+    establecimiento = serializers.CharField(source='libro.establecimiento.nombre_establecimiento', read_only=True)
+    nombre_cliente = serializers.CharField(source='cliente.nombre_cliente', read_only=True)
+    tipo_documento = serializers.CharField(source='cliente.tipo_doc_cliente', read_only=True)
+    documento = serializers.CharField(source='cliente.doc_id_cliente', read_only=True)
+    email = serializers.CharField(source='cliente.email', read_only=True)
+    telefono = serializers.CharField(source='cliente.telefono', read_only=True)
+
+    class Meta:
+        model = Reclamacion
+        fields = [
+            'codigo_hoja', 'fecha', 'tipo', 'tipo_bien', 'estado', 'codigo_libro', 'establecimiento',
+            'nombre_cliente', 'tipo_documento', 'documento', 'email', 'telefono',
+            'descripcion_bien', 'monto_reclamado', 'detalle', 'solicitud_cliente', 'respuesta',
+        ]
+        eager_select = ['estado', 'cliente', 'libro__establecimiento']
+        proyeccion = {
+            'tipo': (('tipo',), lambda tipo: TIPOS_RECLAMACION.get(tipo, tipo)),
+            'tipo_bien': (('tipo_bien',), lambda tipo_bien: TIPOS_BIEN.get(tipo_bien, tipo_bien)),
+        }
+
+    def get_tipo(self, obj):
+        return obj.get_tipo_display()
+
+    def get_tipo_bien(self, obj):
+        return obj.get_tipo_bien_display()
+
+
+# Parámetros de /api/reclamaciones/exportar/ y de manage.py exportar_reclamaciones
+class FiltrosExportacionSerializer(serializers.Serializer):
+    formato = serializers.ChoiceField(choices=['csv', 'xlsx'], default='csv')
+    desde = serializers.DateField(required=False)
+    hasta = serializers.DateField(required=False)
+    estado = serializers.IntegerField(required=False, min_value=1)
+    establecimiento = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        if attrs.get('desde') and attrs.get('hasta') and attrs['desde'] > attrs['hasta']:
+            raise serializers.ValidationError({'hasta': 'Debe ser igual o posterior a desde.'})
+        return attrs
+
+# Parámetros de /api/reclamaciones/estadisticas/ (ver estadisticas.py)
+class FiltrosEstadisticasSerializer(serializers.Serializer):
+    AGRUPACIONES = ['dia', 'establecimiento', 'tipo', 'tipo_bien', 'estado']
+
+    desde = serializers.DateField(required=False)
+    hasta = serializers.DateField(required=False)
+    agrupar = serializers.CharField(required=False)  # separadas por coma: dia,estado
+    establecimiento = serializers.IntegerField(required=False, min_value=1)
+    estado = serializers.IntegerField(required=False, min_value=1)
+    tipo = serializers.ChoiceField(choices=Reclamacion.TIPO_CHOICES, required=False)
+    tipo_bien = serializers.ChoiceField(choices=Reclamacion.TIPO_BIEN_CHOICES, required=False)
+
+    def validate_agrupar(self, value):
+        agrupar = [grupo.strip() for grupo in value.split(',') if grupo.strip()]
+        invalidas = [grupo for grupo in agrupar if grupo not in self.AGRUPACIONES]
+        if invalidas:
+            raise serializers.ValidationError(f"Opciones: {', '.join(self.AGRUPACIONES)}.")
+        return list(dict.fromkeys(agrupar))
+
+    def validate(self, attrs):
+        if attrs.get('desde') and attrs.get('hasta') and attrs['desde'] > attrs['hasta']:
+            raise serializers.ValidationError({'hasta': 'Debe ser igual o posterior a desde.'})
+        return attrs
+
 class ReclamacionRespuestaSerializer(serializers.ModelSerializer):
     class Meta:
         model = Reclamacion
@@ -305,7 +498,7 @@ class ReclamacionRespuestaSerializer(serializers.ModelSerializer):
         instance.respuesta = validated_data.get('respuesta', instance.respuesta)
 
         # Cambiar el estado automáticamente a "Respondido" si existe
-        estado_respondido = EstadoReclamacion.objects.filter(nombre__iexact='Respondido').first()
+        estado_respondido = registro_estados().por_codigo(EstadoReclamacion.RESPONDIDO)
         if estado_respondido:
             instance.estado = estado_respondido
 
@@ -366,39 +559,30 @@ class LibroCompletoUpdateSerializer(serializers.ModelSerializer):
         return data
 
     def update(self, instance, validated_data):
-        print("Datos validados recibidos:", validated_data)
+        logger_libros.debug("Actualizando libro %s", instance.pk, extra={'datos': validated_data})
 
         establecimiento_data = validated_data.pop('establecimiento', None)
 
         # Actualiza los campos del libro
         for attr, value in validated_data.items():
-            print(f"Actualizando {attr} de LibroReclamacion a {value}")
             setattr(instance, attr, value)
         instance.save()
 
         # Actualiza el establecimiento si se recibió
         if establecimiento_data:
-            print("Datos del establecimiento:", establecimiento_data)
             establecimiento = instance.establecimiento
 
             marca_data = establecimiento_data.pop('marca', None)
 
             for attr, value in establecimiento_data.items():
-                print(f"Actualizando {attr} de Establecimiento a {value}")
                 setattr(establecimiento, attr, value)
             establecimiento.save()
 
             # Actualiza la marca si viene
             if marca_data:
-                print("Datos de marca:", marca_data)
                 marca = establecimiento.marca
                 for attr, value in marca_data.items():
-                    print(f"Actualizando {attr} de Marca a {value}")
                     setattr(marca, attr, value)
                 marca.save()
-            else:
-                print("No se recibió datos de marca.")
-        else:
-            print("No se recibió datos de establecimiento.")
 
         return instance
\ No newline at end of file
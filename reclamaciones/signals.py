@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from . import busqueda
+from .cache import invalidar_estados, invalidar_libros
+from .models import (
+    ArchivoAdjunto, Cliente, Establecimiento, EstadoReclamacion, LibroReclamacion, Marca, Proveedor, Reclamacion,
+    ReclamacionStatsDiario, VersionDatos,
+)
+
+
+# Mantiene la columna proveedor de libros y reclamaciones cuando cambia el dueño
+# de un establecimiento (otra marca) o de una marca (otro proveedor)
+def _sincronizar_proveedor(proveedor_id, **filtro_libro):
+    libros = LibroReclamacion.objects.filter(**filtro_libro).exclude(proveedor_id=proveedor_id)
+    # El dueño anterior también pierde datos: su versión tiene que cambiar
+    VersionDatos.incrementar_al_confirmar(*libros.values_list('proveedor_id', flat=True).distinct())
+    libros.update(proveedor_id=proveedor_id)
+    filtro_reclamacion = {f'libro__{campo}': valor for campo, valor in filtro_libro.items()}
+    Reclamacion.objects.filter(**filtro_reclamacion).exclude(proveedor_id=proveedor_id).update(proveedor_id=proveedor_id)
+    filtro_archivo = {f'reclamacion__{campo}': valor for campo, valor in filtro_reclamacion.items()}
+    ArchivoAdjunto.objects.filter(**filtro_archivo).exclude(proveedor_id=proveedor_id).update(proveedor_id=proveedor_id)
+    # Las estadísticas van por establecimiento, que sigue siendo el mismo: solo cambia el dueño
+    ReclamacionStatsDiario.objects.filter(**filtro_libro).exclude(proveedor_id=proveedor_id).update(proveedor_id=proveedor_id)
+
+
+@receiver(post_save, sender=Establecimiento)
+def establecimiento_guardado(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    proveedor_id = Marca.objects.filter(pk=instance.marca_id).values_list('proveedor_id', flat=True).first()
+    _sincronizar_proveedor(proveedor_id, establecimiento=instance)
+
+
+@receiver(post_save, sender=Marca)
+def marca_guardada(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    _sincronizar_proveedor(instance.proveedor_id, establecimiento__marca=instance)
+
+
+# Cualquier cambio en libros o en su dueño invalida el cache de resolución de libros
+@receiver(post_save, sender=LibroReclamacion)
+@receiver(post_delete, sender=LibroReclamacion)
+@receiver(post_save, sender=Establecimiento)
+@receiver(post_delete, sender=Establecimiento)
+@receiver(post_save, sender=Marca)
+@receiver(post_delete, sender=Marca)
+def libros_modificados(sender, **kwargs):
+    invalidar_libros()
+
+
+# Versión de datos por proveedor (ETag de los tableros): cualquier escritura que cambie
+# lo que ve un proveedor en /api/perfil/, /api/reclamaciones/tabla/ o /api/libros/
+@receiver(post_save, sender=Reclamacion)
+@receiver(post_delete, sender=Reclamacion)
+@receiver(post_save, sender=LibroReclamacion)
+@receiver(post_delete, sender=LibroReclamacion)
+@receiver(post_save, sender=Marca)
+@receiver(post_delete, sender=Marca)
+def version_por_proveedor(sender, instance, raw=False, **kwargs):
+    if not raw:
+        VersionDatos.incrementar_al_confirmar(instance.proveedor_id)
+
+
+@receiver(post_save, sender=Establecimiento)
+@receiver(post_delete, sender=Establecimiento)
+def version_por_establecimiento(sender, instance, raw=False, **kwargs):
+    if not raw:
+        VersionDatos.incrementar_al_confirmar(
+            Marca.objects.filter(pk=instance.marca_id).values_list('proveedor_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Proveedor)
+def version_por_proveedor_editado(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        VersionDatos.incrementar_al_confirmar(instance.pk)
+
+
+@receiver(post_save, sender=Cliente)
+def version_por_cliente(sender, instance, created, raw=False, **kwargs):
+    # Un cliente recién creado todavía no aparece en ninguna reclamación
+    if created or raw:
+        return
+    VersionDatos.incrementar_al_confirmar(
+        *Reclamacion.objects.filter(cliente=instance).values_list('proveedor_id', flat=True).distinct()
+    )
+
+
+# El nombre del estado sale en la tabla de todos los proveedores
+@receiver(post_save, sender=EstadoReclamacion)
+@receiver(post_delete, sender=EstadoReclamacion)
+def version_por_estado(sender, raw=False, **kwargs):
+    if not raw:
+        VersionDatos.incrementar_todas()
+
+
+@receiver(post_save, sender=EstadoReclamacion)
+@receiver(post_delete, sender=EstadoReclamacion)
+def estados_modificados(sender, **kwargs):
+    invalidar_estados()
+
+
+# /api/perfil/ también incluye los datos del usuario; el login solo toca last_login
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def version_por_usuario(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    VersionDatos.incrementar_al_confirmar(instance.proveedor_id)
+
+
+# Índice de búsqueda de texto (busqueda.py), en la misma transacción que la reclamación
+@receiver(post_save, sender=Reclamacion)
+def indexar_reclamacion(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not busqueda.CAMPOS_INDEXADOS & set(update_fields)):
+        return
+    busqueda.indexar([instance.pk])
+
+
+@receiver(post_delete, sender=Reclamacion)
+def desindexar_reclamacion(sender, instance, **kwargs):
+    busqueda.quitar([instance.pk])
+
+
+# El nombre y documento del cliente también se buscan
+@receiver(post_save, sender=Cliente)
+def indexar_cliente(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if created or raw:
+        return
+    # Cliente.resolver solo guarda los datos de contacto que estaban vacíos
+    if update_fields is not None and not {'nombre_cliente', 'doc_id_cliente'} & set(update_fields):
+        return
+    busqueda.indexar(Reclamacion.objects.filter(cliente=instance).values_list('pk', flat=True))
+
+
+# Estadísticas diarias (ReclamacionStatsDiario): se resta de la fila anterior y se suma a la nueva
+def _cambia_estadisticas(update_fields):
+    return update_fields is None or bool(ReclamacionStatsDiario.CAMPOS_RECLAMACION & set(update_fields))
+
+
+def _establecimiento_id(reclamacion):
+    if Reclamacion.libro.is_cached(reclamacion):
+        return reclamacion.libro.establecimiento_id
+    return LibroReclamacion.objects.filter(pk=reclamacion.libro_id).values_list('establecimiento_id', flat=True).first()
+
+
+@receiver(pre_save, sender=Reclamacion)
+def estadisticas_antes(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._stats_anterior = None
+    if not raw and not instance._state.adding and _cambia_estadisticas(update_fields):
+        instance._stats_anterior = ReclamacionStatsDiario.clave_guardada(instance.pk)
+
+
+@receiver(post_save, sender=Reclamacion)
+def estadisticas_despues(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not _cambia_estadisticas(update_fields):
+        return
+    anterior = instance._stats_anterior
+    nueva = ReclamacionStatsDiario.clave_de(instance, _establecimiento_id(instance)), instance.monto_reclamado or 0
+    if anterior == nueva:
+        return
+    if anterior is not None:
+        ReclamacionStatsDiario.sumar(anterior[0], -1, -anterior[1])
+    ReclamacionStatsDiario.sumar(nueva[0], 1, nueva[1])
+
+
+@receiver(post_delete, sender=Reclamacion)
+def estadisticas_borrada(sender, instance, **kwargs):
+    clave = ReclamacionStatsDiario.clave_de(instance, _establecimiento_id(instance))
+    ReclamacionStatsDiario.sumar(clave, -1, -(instance.monto_reclamado or 0))
@@ -1,3 +1,1336 @@
-from django.test import TestCase
+import csv
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import zipfile
+from xml.etree import ElementTree
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections, transaction
+from django.db.models import F, Sum
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.apps import apps
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from usuarios.models import Usuario
+from .adjuntos import ruta_absoluta, token_adjuntos
+from . import cache as modulo_cache
+from .cache import CacheLibros, RegistroEstados, cache_libros, exigir_caches_compartidos, registro_estados
+from .codigos import GeneradorSecuencial
+from .limites import backend as cubetas_intake
+from .logging import REDACTADO, JSONFormatter, NonBlockingHandler, RedactarFilter
+from .management.commands.reclamaciones_explain import Command as ComandoExplain
+from .middleware import latencias_bd
+from .models import *
+from .proyecciones import ProyeccionPlana
+from .renderers import RapidJSONRenderer
+from .serializers import ReclamacionConClienteSerializer, ReclamacionPlanoSerializer
+from .serializers import crear_reclamaciones_en_lote
+from .views import CrearReclamacionAsyncView, ObtenerUrlLibroAsyncView
+
+
+# Crea un proveedor con su árbol completo para las pruebas
+def crear_proveedor(ruc='20123456789', establecimientos=1, reclamaciones=1):
+    proveedor = Proveedor.objects.create(
+        razon_social=f'Proveedor {ruc}', ruc=ruc, domicilio_fiscal='Av. Lima 123',
+        telefono='014445555', email_contacto='contacto@proveedor.pe'
+    )
+    estado, _ = EstadoReclamacion.objects.get_or_create(nombre_estado_reclamo='Recibido')
+    marca = Marca.objects.create(proveedor=proveedor, nombre_marca='Marca', descripcion='Marca de prueba')
+    for i in range(establecimientos):
+        est = Establecimiento.objects.create(
+            marca=marca, nombre_establecimiento=f'Tienda {i}',
+            telefono='014445555', email_contacto='tienda@proveedor.pe'
+        )
+        libro = LibroReclamacion.objects.create(
+            establecimiento=est, codigo_libro=f'LIB-{ruc}-{i}',
+            establecimiento_slug=f'tienda-{ruc}-{i}', estado='activo'
+        )
+        agregar_reclamaciones(libro, estado, reclamaciones)
+    return proveedor
+
+
+def agregar_reclamaciones(libro, estado, cantidad):
+    for _ in range(cantidad):
+        n = Reclamacion.objects.count()
+        cliente = Cliente.objects.create(
+            nombre_cliente=f'Cliente {n}', tipo_doc_cliente='DNI', doc_id_cliente=f'{n:08d}',
+            fecha_nacimiento='1990-01-01', email=f'cliente{n}@correo.pe', telefono='999888777'
+        )
+        Reclamacion.objects.create(
+            libro=libro, cliente=cliente, fecha=timezone.now(), codigo_hoja=f'H-TEST-{n}',
+            tipo='reclamo', tipo_bien='producto', descripcion_bien='Producto', detalle='Detalle',
+            estado=estado
+        )
+
+
+def crear_usuario(proveedor, email='usuario@proveedor.pe'):
+    return Usuario.objects.create_user(email=email, password='ClaveSegura123', proveedor=proveedor)
+
+
+class UsuarioPerfilConsultasTests(TestCase):
+    def consultas_perfil(self, usuario):
+        client = APIClient()
+        client.force_authenticate(usuario)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get('/api/perfil/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+
+    def test_numero_de_consultas_no_crece_con_los_datos(self):
+        pequeno = crear_usuario(crear_proveedor('20000000001', establecimientos=1, reclamaciones=1))
+        grande = crear_usuario(
+            crear_proveedor('20000000002', establecimientos=6, reclamaciones=5), email='grande@proveedor.pe'
+        )
+
+        consultas_pequeno, _ = self.consultas_perfil(pequeno)
+        consultas_grande, data = self.consultas_perfil(grande)
+
+        self.assertEqual(consultas_pequeno, consultas_grande)
+        establecimientos = data['proveedor']['marcas'][0]['establecimientos']
+        self.assertEqual(len(establecimientos), 6)
+        libro = establecimientos[0]['libros'][0]
+        self.assertEqual(libro['reclamaciones_count'], 5)
+        self.assertEqual(len(libro['reclamaciones']), 5)
+        self.assertIn('documento_identidad', libro['reclamaciones'][0]['cliente'])
+
+
+class PerfilResumidoTests(TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.proveedor = crear_proveedor('20000000003', establecimientos=2, reclamaciones=3)
+        cls.usuario = crear_usuario(cls.proveedor)
+        cls.libros = list(LibroReclamacion.objects.filter(proveedor=cls.proveedor).order_by('id'))
+
+    def setUp(self):
+        self.client.force_authenticate(self.usuario)
+
+    def perfil(self, **params):
+        response = self.client.get('/api/perfil/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['proveedor']
+
+    def test_niveles(self):
+        [marca] = self.perfil(depth=0)['marcas']
+        self.assertEqual(
+            (marca['establecimientos_count'], marca['libros_count'], marca['reclamaciones_count']), (2, 2, 6)
+        )
+        self.assertNotIn('establecimientos', marca)
+
+        establecimiento = self.perfil(depth=1)['marcas'][0]['establecimientos'][0]
+        self.assertEqual((establecimiento['libros_count'], establecimiento['reclamaciones_count']), (1, 3))
+        self.assertNotIn('libros', establecimiento)
+
+        datos = self.perfil(depth=2)
+        self.assertEqual(datos['reclamaciones_count'], 6)
+        libro = datos['marcas'][0]['establecimientos'][0]['libros'][0]
+        self.assertEqual(libro['reclamaciones_count'], 3)
+        self.assertNotIn('reclamaciones', libro)
+
+        libro = self.perfil(depth=3)['marcas'][0]['establecimientos'][1]['libros'][0]
+        self.assertEqual(len(libro['reclamaciones']), 3)
+        self.assertIn('documento_identidad', libro['reclamaciones'][0]['cliente'])
+
+    def test_expand(self):
+        # Sin depth, expand usa el nivel de libros y solo trae las reclamaciones pedidas
+        ajeno = LibroReclamacion.objects.get(proveedor=crear_proveedor('20000000004'))
+        establecimientos = self.perfil(expand=f'{self.libros[1].pk},{ajeno.pk}')['marcas'][0]['establecimientos']
+        libros = {libro['id']: libro for est in establecimientos for libro in est['libros']}
+        self.assertNotIn('reclamaciones', libros[self.libros[0].pk])
+        self.assertEqual(len(libros[self.libros[1].pk]['reclamaciones']), 3)
+        self.assertNotIn(ajeno.pk, libros)
+
+        for params in ({'depth': 4}, {'depth': 'x'}, {'expand': '1,a'}):
+            self.assertEqual(self.client.get('/api/perfil/', params).status_code, 400)
+
+    def test_consultas_constantes_y_reclamaciones_por_libro(self):
+        with CaptureQueriesContext(connection) as contexto:
+            self.perfil(depth=2)
+        grande = crear_usuario(crear_proveedor('20000000005', establecimientos=5, reclamaciones=4), email='g@proveedor.pe')
+        self.client.force_authenticate(grande)
+        with self.assertNumQueries(len(contexto.captured_queries)):
+            self.perfil(depth=2)
+
+        # Las reclamaciones de un libro se piden aparte, paginadas y solo del dueño
+        self.client.force_authenticate(self.usuario)
+        url = f'/api/libros/{self.libros[0].pk}/reclamaciones/'
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        primera = response.json()
+        self.assertEqual(len(primera['results']), 2)
+        siguiente = self.client.get(url, {'page_size': 2, 'cursor': primera['next_cursor']}).json()
+        ids = [r['id'] for r in primera['results'] + siguiente['results']]
+        self.assertEqual(ids, list(self.libros[0].reclamaciones.order_by('-fecha', '-id').values_list('id', flat=True)))
+
+        self.client.force_authenticate(grande)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class IndicesYExplainTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        crear_proveedor('20000000006', establecimientos=2, reclamaciones=2)
+
+    def explain(self, *args):
+        salida = io.StringIO()
+        call_command('reclamaciones_explain', *args, stdout=salida)
+        return salida.getvalue()
+
+    def test_consultas_de_las_vistas_usan_los_indices(self):
+        salida = self.explain('--fail-on-scan')
+        self.assertIn('Ninguna consulta recorre una tabla completa.', salida)
+        for indice in ('reclamacion_prov_fecha_idx', 'reclamacion_prov_estado_idx', 'reclamacion_libro_fecha_idx',
+                       'reclamacion_fecha_idx', 'libro_codigo_estado_idx'):
+            self.assertIn(indice, salida)
+
+    def test_recorrido_completo(self):
+        sin_indice = [('clientes por email', Cliente.objects.filter(email='x@correo.pe'))]
+        with mock.patch.object(ComandoExplain, 'consultas', return_value=sin_indice):
+            self.assertIn('! recorrido completo de reclamaciones_cliente', self.explain())
+            with self.assertRaisesMessage(CommandError, 'clientes por email'):
+                self.explain('--fail-on-scan')
+
+
+class ListadosConsultasConstantesTests(TestCase):
+    endpoints = [
+        '/api/proveedores/', '/api/marcas/', '/api/establecimientos/', '/api/libros/',
+        '/api/clientes/', '/api/estados/', '/api/reclamos/', '/api/archivos/',
+    ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(Usuario.objects.create_superuser(email='admin@canal.pe', password='ClaveSegura123'))
+
+    def agregar_datos(self, ruc, establecimientos):
+        proveedor = crear_proveedor(ruc, establecimientos=establecimientos, reclamaciones=2)
+        for reclamacion in Reclamacion.objects.filter(proveedor=proveedor):
+            RepresentanteLegal.objects.create(
+                cliente=reclamacion.cliente, nombre_representante='Rep', tipo_doc_representante='DNI',
+                doc_id_representante='11111111', parentesco='Padre', telefono='999'
+            )
+            ArchivoAdjunto.objects.create(reclamacion=reclamacion, nombre_archivo='foto.jpg', ruta='adjuntos/foto.jpg')
+
+    def consultas(self):
+        resultado = {}
+        registro_estados().invalidar()  # que las dos pasadas midan lo mismo (registro frío)
+        for endpoint in self.endpoints:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(endpoint)
+            self.assertEqual(response.status_code, 200, endpoint)
+            resultado[endpoint] = len(ctx.captured_queries)
+        return resultado
+
+    def test_listados_no_crecen_con_las_filas(self):
+        self.agregar_datos('20000000004', establecimientos=1)
+        antes = self.consultas()
+        self.agregar_datos('20000000005', establecimientos=5)
+        self.assertEqual(self.consultas(), antes)
+
+
+class ProyeccionPlanaTests(TestCase):
+    def test_misma_salida_que_el_serializer(self):
+        proveedor = crear_proveedor('20000000006', establecimientos=2, reclamaciones=2)
+        libro = LibroReclamacion.objects.filter(proveedor=proveedor).first()
+        # Libro sin establecimiento: DRF omite 'establecimiento' y la proyección también
+        huerfano = LibroReclamacion.objects.create(establecimiento=None, codigo_libro='LIB-SIN-EST', estado='activo')
+        agregar_reclamaciones(huerfano, EstadoReclamacion.objects.first(), 1)
+        Reclamacion.objects.filter(libro=libro).update(tipo='queja', detalle='Ñandú "entre comillas"')
+
+        queryset = Reclamacion.objects.order_by('-fecha', '-id')
+        esperado = JSONRenderer().render(ReclamacionPlanoSerializer(queryset, many=True).data)
+        obtenido = JSONRenderer().render(list(ProyeccionPlana(ReclamacionPlanoSerializer).filas(queryset)))
+        self.assertEqual(obtenido, esperado)
+
+    def test_tabla_paginada_con_cursor(self):
+        usuario = crear_usuario(crear_proveedor('20000000007', establecimientos=1, reclamaciones=5))
+        client = APIClient()
+        client.force_authenticate(usuario)
+
+        completa = client.get('/api/reclamaciones/tabla/').json()
+        primera = client.get('/api/reclamaciones/tabla/', {'page_size': 3}).json()
+        segunda = client.get('/api/reclamaciones/tabla/', {'page_size': 3, 'cursor': primera['next_cursor']}).json()
+        paginas = primera['results'] + segunda['results']
+        self.assertEqual(sorted(paginas, key=lambda fila: fila['id']), sorted(completa, key=lambda fila: fila['id']))
+        self.assertEqual([fila['id'] for fila in paginas], sorted((fila['id'] for fila in completa), reverse=True))
+        self.assertIsNone(segunda['next_cursor'])
+
+
+class RespuestasJSONTests(TestCase):
+    def test_rapid_renderer_igual_a_drf(self):
+        datos = {
+            'fecha': timezone.now(), 'dia': timezone.now().date(), 'monto': Decimal('10.50'),
+            'texto': 'Ñandú \u2028 "fin"', 'lista': (1, 2.5, None, True), 1: 'clave entera',
+        }
+        self.assertEqual(RapidJSONRenderer().render(datos), JSONRenderer().render(datos))
+
+    def test_compresion_solo_sobre_el_umbral(self):
+        usuario = crear_usuario(crear_proveedor('20000000008', establecimientos=3, reclamaciones=5))
+        client = APIClient()
+        client.force_authenticate(usuario)
+
+        comprimida = client.get('/api/reclamaciones/tabla/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(comprimida['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', comprimida['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(comprimida.content)), client.get('/api/reclamaciones/tabla/').json())
+
+        pequena = client.get('/api/reclamaciones/tabla/', {'page_size': 1}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(pequena.has_header('Content-Encoding'))
+        stream = client.get('/api/reclamaciones/tabla/', {'stream': 'ndjson'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(stream.has_header('Content-Encoding'))
+
+
+class GetCondicionalTests(TestCase):
+    endpoints = ['/api/perfil/', '/api/reclamaciones/tabla/', '/api/libros/']
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.proveedor = crear_proveedor('20000000009', establecimientos=2, reclamaciones=3)
+        self.client = APIClient()
+        self.client.force_authenticate(crear_usuario(self.proveedor))
+
+    def test_304_sin_consultar_los_datos(self):
+        for endpoint in self.endpoints:
+            primera = self.client.get(endpoint, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(primera.status_code, 200, endpoint)
+            self.assertTrue(primera.has_header('Last-Modified'), endpoint)
+
+            with CaptureQueriesContext(connection) as ctx:
+                segunda = self.client.get(endpoint, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=primera['ETag'])
+            self.assertEqual(segunda.status_code, 304, endpoint)
+            self.assertEqual(segunda['ETag'], primera['ETag'], endpoint)
+            self.assertEqual(len(ctx.captured_queries), 1, endpoint)
+
+    def test_cambios_del_proveedor_invalidan_el_etag(self):
+        etags = {endpoint: self.client.get(endpoint)['ETag'] for endpoint in self.endpoints}
+        libro = LibroReclamacion.objects.filter(proveedor=self.proveedor).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            agregar_reclamaciones(libro, EstadoReclamacion.objects.first(), 1)
+        for endpoint, etag in etags.items():
+            self.assertEqual(self.client.get(endpoint, HTTP_IF_NONE_MATCH=etag).status_code, 200, endpoint)
+
+        # Los cambios de otro proveedor no mueven la versión de este
+        etag = self.client.get('/api/reclamaciones/tabla/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_proveedor('20000000010')
+        self.assertEqual(self.client.get('/api/reclamaciones/tabla/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+def datos_intake(codigo_libro, estado):
+    return {
+        'cliente': {
+            'nombre_cliente': 'Cliente async', 'tipo_doc_cliente': 'DNI', 'doc_id_cliente': '45678912',
+            'fecha_nacimiento': '1990-01-01', 'email': 'async@correo.pe', 'telefono': '999888777',
+        },
+        'estado_id': estado.pk, 'libro': codigo_libro, 'tipo': 'reclamo', 'tipo_bien': 'producto',
+        'descripcion_bien': 'Producto', 'detalle': 'Detalle',
+    }
+
+
+class VistasAsyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.proveedor = crear_proveedor('20000000011', reclamaciones=0)
+        cls.libro = LibroReclamacion.objects.get(proveedor=cls.proveedor)
+        cls.estado = EstadoReclamacion.objects.first()
+        cls.usuario = crear_usuario(cls.proveedor)
+
+    def setUp(self):
+        # Las cubetas del intake son del proceso y todas las pruebas llegan desde la misma IP
+        cubetas_intake().reiniciar()
+
+    async def test_intake_async(self):
+        vista = CrearReclamacionAsyncView.as_view()
+        factory = AsyncRequestFactory()
+
+        request = factory.post('/', json.dumps(datos_intake(self.libro.codigo_libro, self.estado)), content_type='application/json')
+        response = await vista(request)
+        self.assertEqual(response.status_code, 201)
+        creada = json.loads(response.content)
+        reclamacion = await Reclamacion.objects.select_related('cliente').aget(pk=creada['id'])
+        self.assertEqual(reclamacion.proveedor_id, self.proveedor.pk)
+        self.assertEqual(reclamacion.cliente.email, 'async@correo.pe')
+        self.assertEqual(creada['codigo_hoja'], reclamacion.codigo_hoja)
+        self.assertNotIn('id', creada['cliente'])  # lo enviado, no el Cliente guardado
+
+        request = factory.post('/', json.dumps(datos_intake('NO-EXISTE', self.estado)), content_type='application/json')
+        response = await vista(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('libro', json.loads(response.content))
+
+        response = await vista(factory.post('/', '{mal', content_type='application/json'))
+        self.assertEqual(response.status_code, 400)
+
+    async def test_obtener_url_async(self):
+        vista = ObtenerUrlLibroAsyncView.as_view()
+        factory = AsyncRequestFactory()
+        slugs = {'libro_slug': self.libro.libro_slug, 'establecimiento_slug': self.libro.establecimiento_slug}
+
+        response = await vista(factory.get('/'), **slugs)
+        self.assertEqual(response.status_code, 401)
+
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.usuario).access_token))()
+        response = await vista(factory.get('/', headers={'Authorization': f'Bearer {token}'}), **slugs)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'url': self.libro.get_url()})
+
+
+class CacheLibrosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.proveedor = crear_proveedor('20000000031', reclamaciones=0)
+        cls.otro = crear_proveedor('20000000032', reclamaciones=0)
+        cls.libro = LibroReclamacion.objects.get(proveedor=cls.proveedor)
+        cls.estado = EstadoReclamacion.objects.first()
+
+    def setUp(self):
+        cache_libros().invalidar()
+        caches['default'].clear()
+
+    def usar_cache_compartido(self):
+        # El singleton del proceso con segundo nivel en el cache 'default', como con CACHE_LIBROS_DJANGO
+        anterior = modulo_cache._cache_libros
+        modulo_cache._cache_libros = CacheLibros(alias='default')
+        self.addCleanup(setattr, modulo_cache, '_cache_libros', anterior)
+
+    def test_guardar_un_libro_invalida(self):
+        codigo = self.libro.codigo_libro
+        self.assertEqual(cache_libros().libro_activo(codigo).pk, self.libro.pk)
+        with self.assertNumQueries(0):
+            cache_libros().libro_activo(codigo)
+
+        LibroReclamacion.objects.filter(pk=self.libro.pk).update(estado='inactivo')
+        self.assertIsNotNone(cache_libros().libro_activo(codigo))  # update() no dispara señales
+        self.libro.refresh_from_db()
+        self.libro.save()
+        self.assertIsNone(cache_libros().libro_activo(codigo))
+
+    def test_traspaso_de_marca_invalida_el_cache_compartido(self):
+        self.usar_cache_compartido()
+        codigo = self.libro.codigo_libro
+        self.assertEqual(cache_libros().libro_activo(codigo).proveedor_id, self.proveedor.pk)
+        # Otro worker: LRU vacío, lo encuentra en el cache compartido sin ir a la base
+        with self.assertNumQueries(0):
+            self.assertEqual(CacheLibros(alias='default').libro_activo(codigo).pk, self.libro.pk)
+
+        marca = self.libro.establecimiento.marca
+        marca.proveedor = self.otro
+        marca.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(CacheLibros(alias='default').libro_activo(codigo).proveedor_id, self.otro.pk)
+
+    def test_claves_compartidas_hasheadas(self):
+        self.usar_cache_compartido()
+        codigo = 'LIB raro\n' + 'x' * 300
+        clave = CacheLibros._clave_compartida(('codigo', codigo), 0)
+        self.assertNotIn(codigo, clave)
+        self.assertRegex(clave, r'^reclamaciones:libros:0:codigo:[0-9a-f]{32}$')
+        self.assertIsNone(cache_libros().libro_activo(codigo))
+
+        self.libro.codigo_libro = codigo
+        self.libro.save()
+        self.assertEqual(cache_libros().libro_activo(codigo).pk, self.libro.pk)
+        self.assertIsNotNone(caches['default'].get(CacheLibros._clave_compartida(('codigo', codigo), 1)))
+
+    def test_el_proveedor_se_lee_de_la_base_al_escribir(self):
+        # Libro cacheado por otro worker antes del traspaso: su proveedor_id ya no vale
+        viejo = cache_libros().libro_activo(self.libro.codigo_libro)
+        LibroReclamacion.objects.filter(pk=self.libro.pk).update(proveedor=self.otro)
+
+        datos = datos_intake(self.libro.codigo_libro, self.estado)
+        serializer = ReclamacionConClienteSerializer(data=datos, context={'libros': {self.libro.codigo_libro: viejo}})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.save().proveedor_id, self.otro.pk)
+
+        datos['cliente']['doc_id_cliente'] = '45678913'
+        serializer = ReclamacionConClienteSerializer(data=datos, context={'libros': {self.libro.codigo_libro: viejo}})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        [creada] = crear_reclamaciones_en_lote([serializer.validated_data])
+        self.assertEqual(Reclamacion.objects.get(pk=creada.pk).proveedor_id, self.otro.pk)
+
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 200
+
+
+class AdjuntosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.proveedor = crear_proveedor('20000000012')
+        cls.reclamacion = Reclamacion.objects.get(proveedor=cls.proveedor)
+        cls.usuario = crear_usuario(cls.proveedor)
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.ajustes = {'DIRECTORIO': directorio.name, 'TAMANO_MAXIMO': 1024, 'CUOTA_PROVEEDOR': 1000}
+        self.enterContext(override_settings(RECLAMACIONES_ADJUNTOS=self.ajustes))
+        self.url = f'/api/reclamaciones/{self.reclamacion.id}/adjuntos/'
+        self.token = token_adjuntos(self.reclamacion.id)
+
+    def subir(self, contenido, nombre='foto.png', token=None):
+        archivo = SimpleUploadedFile(nombre, contenido, content_type='image/png')
+        return self.client.post(self.url, {'archivo': archivo}, headers={'X-Token-Adjuntos': token or self.token})
+
+    def test_subida_con_token_y_deduplicacion(self):
+        response = self.subir(PNG)
+        self.assertEqual(response.status_code, 201, response.content)
+        adjunto = ArchivoAdjunto.objects.get(pk=response.json()['id'])
+        self.assertEqual((adjunto.tamano, adjunto.content_type, adjunto.proveedor_id), (len(PNG), 'image/png', self.proveedor.id))
+        self.assertEqual(ruta_absoluta(adjunto.sha256).read_bytes(), PNG)
+
+        # Los mismos bytes otra vez: se devuelve el adjunto existente
+        response = self.subir(PNG, nombre='otra.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], adjunto.id)
+        self.assertEqual(ArchivoAdjunto.objects.count(), 1)
+
+        self.assertEqual(self.subir(PNG, token=token_adjuntos(self.reclamacion.id + 1)).status_code, 403)
+
+        # Borrar el adjunto no borra el contenido: lo hace limpiar_adjuntos pasada la gracia
+        with self.captureOnCommitCallbacks(execute=True):
+            adjunto.delete()
+        ruta = ruta_absoluta(adjunto.sha256)
+        self.assertTrue(ruta.exists())
+        call_command('limpiar_adjuntos', stdout=io.StringIO())
+        self.assertTrue(ruta.exists())
+        call_command('limpiar_adjuntos', gracia=0, stdout=io.StringIO())
+        self.assertFalse(ruta.exists())
+
+    def test_reutilizar_contenido_lo_protege_de_la_limpieza(self):
+        # Otra reclamación con los mismos bytes, que se borra: el contenido queda huérfano y viejo
+        otra = Reclamacion.objects.create(
+            libro=self.reclamacion.libro, cliente=self.reclamacion.cliente, fecha=timezone.now(), codigo_hoja='H-OTRA',
+            tipo='reclamo', tipo_bien='producto', descripcion_bien='Producto', detalle='Detalle', estado=self.reclamacion.estado,
+        )
+        self.url = f'/api/reclamaciones/{otra.id}/adjuntos/'
+        self.assertEqual(self.subir(PNG, token=token_adjuntos(otra.id)).status_code, 201)
+        otra.delete()
+        ruta = ruta_absoluta(hashlib.sha256(PNG).hexdigest())
+        os.utime(ruta, (0, 0))
+
+        # Una subida nueva reutiliza el archivo antes de que corra la limpieza
+        self.url = f'/api/reclamaciones/{self.reclamacion.id}/adjuntos/'
+        self.assertEqual(self.subir(PNG).status_code, 201)
+        call_command('limpiar_adjuntos', gracia=60, stdout=io.StringIO())
+        self.assertEqual(ruta.read_bytes(), PNG)
+
+        # Y los temporales de subidas cortadas también se limpian
+        temporal = ruta.parents[2] / 'tmp' / 'cortada'
+        temporal.write_bytes(b'x')
+        os.utime(temporal, (0, 0))
+        call_command('limpiar_adjuntos', gracia=60, stdout=io.StringIO())
+        self.assertFalse(temporal.exists())
+        self.assertTrue(ruta.exists())
+
+    def test_tope_por_reclamacion_sin_cuenta(self):
+        self.ajustes.update(MAXIMO_ANONIMOS=2, CUOTA_ANONIMA=500)
+        self.enterContext(override_settings(RECLAMACIONES_ADJUNTOS=self.ajustes))
+        self.assertEqual(self.subir(PNG).status_code, 201)
+        self.assertEqual(self.subir(PNG + b'\x01').status_code, 201)
+        self.assertEqual(self.subir(PNG + b'\x02').status_code, 413)
+
+        # Por bytes: quedan 208 usados, con tope 500
+        ArchivoAdjunto.objects.filter(reclamacion=self.reclamacion).order_by('id').last().delete()
+        self.assertEqual(self.subir(PNG * 2).status_code, 413)
+        self.assertEqual(self.subir(PNG[:50] + b'\x03').status_code, 201)
+
+        # El proveedor no tiene ese tope
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.assertEqual(self.subir(PNG + b'\x04').status_code, 201)
+
+    def test_rechazos(self):
+        self.assertEqual(self.subir(b'MZ no es una imagen').status_code, 415)
+        self.assertEqual(self.subir(PNG + b'\x00' * 1024).status_code, 413)
+        self.assertEqual(self.subir(b'').status_code, 400)
+        self.assertEqual(ArchivoAdjunto.objects.count(), 0)
+
+        # Cuota: 1000 bytes por proveedor
+        self.assertEqual(self.subir(PNG * 4).status_code, 201)
+        self.assertEqual(self.subir(PNG + b'\x01').status_code, 413)
+
+    def test_descarga(self):
+        self.subir(PNG)
+        adjunto = ArchivoAdjunto.objects.get()
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+
+        response = cliente.get(f'/api/archivos/{adjunto.id}/descargar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), PNG)
+        self.assertIn('attachment; filename="foto.png"', response['Content-Disposition'])
+
+        with override_settings(RECLAMACIONES_ADJUNTOS={**self.ajustes, 'DESCARGA': 'x-accel'}):
+            response = cliente.get(f'/api/archivos/{adjunto.id}/descargar/')
+        self.assertEqual(response['X-Accel-Redirect'], f'/_adjuntos/{adjunto.sha256[:2]}/{adjunto.sha256[2:4]}/{adjunto.sha256}')
+        self.assertEqual(response.content, b'')
+
+        # Otro proveedor no lo ve
+        otro = APIClient()
+        otro.force_authenticate(crear_usuario(crear_proveedor('20000000013', reclamaciones=0), email='otro@proveedor.pe'))
+        self.assertEqual(otro.get(f'/api/archivos/{adjunto.id}/descargar/').status_code, 404)
+
+
+class AislamientoPorProveedorTests(TestCase):
+    """Un proveedor no ve ni toca libros, reclamaciones ni adjuntos de otro: para él no existen (404)."""
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.propio = crear_proveedor('20000000041')
+        cls.ajeno = crear_proveedor('20000000042')
+        cls.usuario = crear_usuario(cls.propio)
+        cls.libro = LibroReclamacion.objects.get(proveedor=cls.ajeno)
+        cls.reclamacion = Reclamacion.objects.get(proveedor=cls.ajeno)
+        cls.adjunto = ArchivoAdjunto.objects.create(
+            reclamacion=cls.reclamacion, nombre_archivo='ajeno.png', ruta='ajeno.png', sha256='ab' * 32
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.usuario)
+
+    def ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        datos = response.json()
+        return {fila['id'] for fila in (datos['results'] if isinstance(datos, dict) else datos)}
+
+    def test_libros(self):
+        self.assertNotIn(self.libro.pk, self.ids('/api/libros/'))
+        self.assertEqual(self.client.get(f'/api/libros/{self.libro.pk}/').status_code, 404)
+        self.assertEqual(self.client.patch(f'/api/libros/{self.libro.pk}/editar-slugs/', {'libro_slug': 'mio'}).status_code, 404)
+        self.assertEqual(self.client.patch(f'/api/libros/{self.libro.pk}/editar-completo/', {'libro_slug': 'mio'}).status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/libros/{self.libro.pk}/').status_code, 404)
+        self.assertTrue(LibroReclamacion.objects.filter(pk=self.libro.pk, libro_slug=self.libro.libro_slug).exists())
+
+    def test_reclamaciones(self):
+        propias = set(Reclamacion.objects.filter(proveedor=self.propio).values_list('id', flat=True))
+        self.assertEqual(self.ids('/api/reclamos/'), propias)
+        self.assertEqual(self.ids('/api/reclamaciones/tabla/'), propias)
+        self.assertEqual(self.client.get(f'/api/reclamos/{self.reclamacion.pk}/').status_code, 404)
+
+        response = self.client.patch(f'/api/reclamaciones/{self.reclamacion.pk}/responder/', {'respuesta': 'Ajena'})
+        self.assertEqual(response.status_code, 404)
+        self.reclamacion.refresh_from_db()
+        self.assertNotEqual(self.reclamacion.respuesta, 'Ajena')
+
+    def test_adjuntos(self):
+        self.assertNotIn(self.adjunto.pk, self.ids('/api/archivos/'))
+        self.assertEqual(self.client.get(f'/api/archivos/{self.adjunto.pk}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/archivos/{self.adjunto.pk}/descargar/').status_code, 404)
+
+        archivo = SimpleUploadedFile('foto.png', PNG, content_type='image/png')
+        response = self.client.post(f'/api/reclamaciones/{self.reclamacion.pk}/adjuntos/', {'archivo': archivo})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(ArchivoAdjunto.objects.filter(reclamacion=self.reclamacion).count(), 1)
+
+
+class ExportacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.proveedor = crear_proveedor('20000000014', establecimientos=2, reclamaciones=3)
+        crear_proveedor('20000000015', reclamaciones=2)
+        cls.usuario = crear_usuario(cls.proveedor)
+        cls.primera = Reclamacion.objects.filter(proveedor=cls.proveedor).order_by('id').first()
+        cls.primera.detalle = '=HYPERLINK("x")'
+        cls.primera.save(update_fields=['detalle'])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def leer_xlsx(self, contenido):
+        with zipfile.ZipFile(io.BytesIO(contenido)) as libro:
+            hoja = ElementTree.fromstring(libro.read('xl/worksheets/sheet1.xml'))
+        ns = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        return [
+            [''.join(celda.itertext()) for celda in fila.findall('x:c', ns)]
+            for fila in hoja.findall('x:sheetData/x:row', ns)
+        ]
+
+    def test_csv_y_xlsx(self):
+        response = self.client.get('/api/reclamaciones/exportar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        filas = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(filas[0][:3], ['codigo_hoja', 'fecha', 'tipo'])
+        self.assertEqual(len(filas), 7)  # solo las 6 del proveedor
+        detalle = filas[0].index('detalle')
+        self.assertEqual(filas[1][detalle], "'=HYPERLINK(\"x\")")
+
+        response = self.client.get('/api/reclamaciones/exportar/', {'formato': 'xlsx'})
+        hoja = self.leer_xlsx(b''.join(response.streaming_content))
+        self.assertEqual(len(hoja), 7)
+        self.assertEqual(hoja[1][detalle], '=HYPERLINK("x")')
+        self.assertEqual(hoja[1][0], self.primera.codigo_hoja)
+
+    def test_filtros(self):
+        establecimiento = self.primera.libro.establecimiento_id
+        response = self.client.get('/api/reclamaciones/exportar/', {'establecimiento': establecimiento})
+        self.assertEqual(len(list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))), 4)
+
+        manana = (timezone.localdate() + timedelta(days=1)).isoformat()
+        response = self.client.get('/api/reclamaciones/exportar/', {'desde': manana})
+        self.assertEqual(len(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()), 1)
+
+        self.assertEqual(self.client.get('/api/reclamaciones/exportar/', {'formato': 'pdf'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/reclamaciones/exportar/', {'desde': manana, 'hasta': '2000-01-01'}).status_code, 400)
+
+    def test_comando(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, 'libro.xlsx')
+            call_command('exportar_reclamaciones', ruta, formato='xlsx', proveedor=self.proveedor.id, stdout=io.StringIO())
+            with open(ruta, 'rb') as archivo:
+                self.assertEqual(len(self.leer_xlsx(archivo.read())), 7)
+
+
+class BusquedaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.proveedor = crear_proveedor('20000000016', reclamaciones=3)
+        otro = crear_proveedor('20000000017', reclamaciones=1)
+        cls.usuario = crear_usuario(cls.proveedor)
+        cls.reclamaciones = list(Reclamacion.objects.filter(proveedor=cls.proveedor).order_by('id'))
+        textos = [
+            'La canción del televisor no suena',
+            'Pedí el reembolso del televisor y nunca llegó',
+            'Cobro doble en la tarjeta',
+        ]
+        for reclamacion, texto in zip(cls.reclamaciones, textos):
+            reclamacion.detalle = texto
+            reclamacion.save()
+        ajena = Reclamacion.objects.get(proveedor=otro)
+        ajena.detalle = 'Televisor malogrado'
+        ajena.save(update_fields=['detalle'])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def buscar(self, q, **params):
+        response = self.client.get('/api/reclamos/buscar/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def codigos(self, datos):
+        return [fila['codigo_hoja'] for fila in datos['results']]
+
+    def test_busqueda_por_proveedor(self):
+        # Sin tildes, por prefijo y solo en las reclamaciones propias
+        self.assertEqual(self.codigos(self.buscar('CANCION')), [self.reclamaciones[0].codigo_hoja])
+        self.assertEqual(self.codigos(self.buscar('reembols televisor')), [self.reclamaciones[1].codigo_hoja])
+        self.assertEqual(len(self.buscar('televisor')['results']), 2)
+        self.assertEqual(self.buscar('inexistente')['results'], [])
+        self.assertEqual(self.client.get('/api/reclamos/buscar/', {'q': '  ¿?'}).status_code, 400)
+
+        pagina = self.buscar('televisor', page_size=1)
+        self.assertEqual(len(pagina['results']), 1)
+        siguiente = self.client.get(pagina['next']).json()
+        self.assertEqual(len(siguiente['results']), 1)
+        self.assertIsNone(siguiente['next'])
+        self.assertNotEqual(pagina['results'], siguiente['results'])
+
+    def test_indice_sincronizado(self):
+        primera = self.reclamaciones[0]
+        cliente = primera.cliente
+        cliente.nombre_cliente = 'Rosa Quispe'
+        cliente.save()
+        self.assertEqual(self.codigos(self.buscar('quispe')), [primera.codigo_hoja])
+        self.assertEqual(self.codigos(self.buscar(cliente.doc_id_cliente)), [primera.codigo_hoja])
+
+        primera.delete()
+        self.assertEqual(self.buscar('quispe')['results'], [])
+
+        libro = LibroReclamacion.objects.filter(proveedor=self.proveedor).first()
+        crear_reclamaciones_en_lote([{
+            'cliente': {
+                'nombre_cliente': 'Lote', 'tipo_doc_cliente': 'DNI', 'doc_id_cliente': '77777777',
+                'fecha_nacimiento': '1990-01-01', 'email': 'lote@correo.pe', 'telefono': '999888777',
+            },
+            'libro': libro, 'estado': primera.estado, 'tipo': 'queja', 'tipo_bien': 'servicio',
+            'descripcion_bien': 'Internet', 'detalle': 'Corte de fibra óptica',
+        }])
+        self.assertEqual(len(self.buscar('fibra')['results']), 1)
+
+
+class EstadisticasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.proveedor = crear_proveedor('20000000018', establecimientos=2, reclamaciones=2)
+        crear_proveedor('20000000019', reclamaciones=3)
+        cls.usuario = crear_usuario(cls.proveedor)
+        cls.respondido = EstadoReclamacion.objects.create(nombre_estado_reclamo='Respondido')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def rollup(self):
+        return sorted(
+            (fila.proveedor_id, fila.establecimiento_id, fila.fecha, fila.tipo, fila.tipo_bien, fila.estado_id,
+             fila.cantidad, fila.monto_reclamado)
+            for fila in ReclamacionStatsDiario.objects.filter(cantidad__gt=0)
+        )
+
+    def test_incremental_igual_a_reconstruir(self):
+        reclamaciones = list(Reclamacion.objects.filter(proveedor=self.proveedor).order_by('id'))
+        reclamaciones[0].monto_reclamado = Decimal('150.50')
+        reclamaciones[0].save()
+        reclamaciones[1].estado = self.respondido
+        reclamaciones[1].save(update_fields=['estado'])
+        reclamaciones[2].delete()
+        crear_reclamaciones_en_lote([{
+            'cliente': {
+                'nombre_cliente': 'Lote', 'tipo_doc_cliente': 'DNI', 'doc_id_cliente': '66666666',
+                'fecha_nacimiento': '1990-01-01', 'email': 'lote@correo.pe', 'telefono': '999888777',
+            },
+            'libro': reclamaciones[3].libro, 'estado': self.respondido, 'tipo': 'queja', 'tipo_bien': 'servicio',
+            'descripcion_bien': 'Internet', 'detalle': 'Sin servicio', 'monto_reclamado': Decimal('20.00'),
+        }])
+
+        incremental = self.rollup()
+        ReclamacionStatsDiario.reconstruir()
+        self.assertEqual(incremental, self.rollup())
+
+    def test_endpoint(self):
+        reclamacion = Reclamacion.objects.filter(proveedor=self.proveedor).first()
+        reclamacion.estado = self.respondido
+        reclamacion.monto_reclamado = Decimal('10.25')
+        reclamacion.save()
+
+        with self.assertNumQueries(2):  # versión de datos (ETag) + la suma
+            response = self.client.get('/api/reclamaciones/estadisticas/', {'agrupar': 'estado'})
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()
+        self.assertEqual(datos['total'], {'cantidad': 4, 'monto_reclamado': '10.25'})
+        por_estado = {fila['estado']: fila['cantidad'] for fila in datos['resultados']}
+        self.assertEqual(por_estado, {'Recibido': 3, 'Respondido': 1})
+
+        ayer = timezone.localdate() - timedelta(days=1)
+        vacio = self.client.get('/api/reclamaciones/estadisticas/', {'hasta': ayer.isoformat()}).json()
+        self.assertEqual(vacio['total']['cantidad'], 0)
+        self.assertEqual(self.client.get('/api/reclamaciones/estadisticas/', {'agrupar': 'mes'}).status_code, 400)
+
+    def test_etag_cambia_con_el_dia(self):
+        url = '/api/reclamaciones/estadisticas/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        # Después de medianoche el rango por defecto es otro: no vale el ETag de ayer
+        manana = timezone.localdate() + timedelta(days=1)
+        with mock.patch('reclamaciones.estadisticas.timezone.localdate', return_value=manana):
+            response = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+        # Con el rango explícito el día no importa
+        hasta = {'hasta': timezone.localdate().isoformat()}
+        etag = self.client.get(url, hasta)['ETag']
+        with mock.patch('reclamaciones.estadisticas.timezone.localdate', return_value=manana):
+            self.assertEqual(self.client.get(url, hasta, headers={'If-None-Match': etag}).status_code, 304)
+
+
+class RegistroEstadosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.proveedor = crear_proveedor('20000000020')
+        cls.usuario = crear_usuario(cls.proveedor)
+        cls.libro = LibroReclamacion.objects.get(proveedor=cls.proveedor)
+        cls.recibido = EstadoReclamacion.objects.get(codigo=EstadoReclamacion.RECIBIDO)
+        cls.respondido = EstadoReclamacion.objects.create(nombre_estado_reclamo='Respondido')
+        EstadoReclamacion.objects.create(nombre_estado_reclamo='En Evaluación')
+
+    def setUp(self):
+        # El registro es del proceso: las pruebas anteriores pudieron cargar otros estados
+        registro_estados().invalidar()
+        cubetas_intake().reiniciar()
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def consultas_a_estados(self, contexto):
+        return [q['sql'] for q in contexto.captured_queries if 'reclamaciones_estadoreclamacion' in q['sql']]
+
+    def test_codigos_normalizados(self):
+        self.assertEqual(registro_estados().por_codigo('EN_EVALUACION').nombre_estado_reclamo, 'En Evaluación')
+        self.assertEqual(registro_estados().por_codigo(' respondido ').pk, self.respondido.pk)
+        self.assertIsNone(registro_estados().por_codigo('CERRADO'))
+
+        self.respondido.nombre_estado_reclamo = 'Atendido'
+        self.respondido.save()
+        self.assertEqual(registro_estados().por_id(self.respondido.pk).nombre_estado_reclamo, 'Atendido')
+        self.assertEqual(registro_estados().por_codigo(EstadoReclamacion.RESPONDIDO).pk, self.respondido.pk)
+
+    def test_intake_y_respuesta_sin_consultar_estados(self):
+        registro_estados().todos()
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.post(
+                '/api/reclamaciones/crear-reclamo/', datos_intake(self.libro.codigo_libro, self.recibido), format='json'
+            )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.consultas_a_estados(contexto), [])
+
+        reclamacion_id = response.json()['id']
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.patch(f'/api/reclamaciones/{reclamacion_id}/responder/', {'respuesta': 'Atendido'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.consultas_a_estados(contexto), [])
+        self.assertEqual(Reclamacion.objects.get(pk=reclamacion_id).estado_id, self.respondido.pk)
+
+        datos = datos_intake(self.libro.codigo_libro, self.recibido)
+        datos['estado_id'] = 999
+        self.assertEqual(self.client.post('/api/reclamaciones/crear-reclamo/', datos, format='json').status_code, 400)
+
+    def test_id_desconocido_recarga_a_lo_sumo_una_vez_por_intervalo(self):
+        registro = RegistroEstados(recarga_minima=60)
+        registro.todos()
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                self.assertIsNone(registro.por_id(999))
+
+        nuevo = EstadoReclamacion.objects.create(nombre_estado_reclamo='Cerrado')
+        self.assertIsNone(registro.por_id(nuevo.pk))  # todavía dentro del intervalo
+        registro._cargado -= 60
+        with self.assertNumQueries(1):
+            self.assertEqual(registro.por_id(nuevo.pk).codigo, 'CERRADO')
+            self.assertIsNone(registro.por_id(999))
+
+        # En el intake, un estado inventado es error de validación sin consultar la base
+        registro_estados().todos()
+        datos = datos_intake(self.libro.codigo_libro, self.recibido)
+        datos['estado_id'] = 999
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.post('/api/reclamaciones/crear-reclamo/', datos, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('estado_id', response.json())
+        self.assertEqual(self.consultas_a_estados(contexto), [])
+
+    def test_lista_cacheable(self):
+        registro_estados().todos()
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/estados/')
+        self.assertEqual([estado['codigo'] for estado in response.json()], ['RECIBIDO', 'RESPONDIDO', 'EN_EVALUACION'])
+        self.assertIn('max-age=3600', response['Cache-Control'])
+
+        response = self.client.get('/api/estados/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(f'/api/estados/{self.respondido.pk}/').json()['codigo'], 'RESPONDIDO')
+
+
+class GeneradorSecuencialTests(TransactionTestCase):
+    def setUp(self):
+        proveedor = crear_proveedor('20000000003', reclamaciones=0)
+        self.libro = LibroReclamacion.objects.get(proveedor=proveedor)
+
+    def test_codigos_correlativos_por_libro(self):
+        generador = GeneradorSecuencial(bloque=3)
+        codigos = [generador.generar(self.libro) for _ in range(5)]
+        self.assertEqual(codigos[0], f'{self.libro.pk:04d}-00000001')
+        self.assertEqual(codigos[-1], f'{self.libro.pk:04d}-00000005')
+        self.assertEqual(SecuenciaHoja.objects.get(libro=self.libro).siguiente, 7)
+
+    def test_reserva_revertida_con_la_transaccion(self):
+        generador = GeneradorSecuencial(bloque=10)
+        try:
+            with transaction.atomic():
+                generador.generar_lote(self.libro, 4)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(generador.generar(self.libro), f'{self.libro.pk:04d}-00000001')
+
+    def test_workers_concurrentes_no_repiten_codigos(self):
+        # Cada hilo simula un worker de gunicorn con su propio generador y conexión
+        codigos, errores = [], []
+        lock = threading.Lock()
+
+        def worker():
+            generador = GeneradorSecuencial(bloque=7)
+            try:
+                generados = [generador.generar(self.libro) for _ in range(40)]
+                with lock:
+                    codigos.extend(generados)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=worker) for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(len(codigos), 8 * 40)
+        self.assertEqual(len(set(codigos)), len(codigos))
+
+
+class LimitesIntakeTests(TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.proveedor = crear_proveedor('20000000061', reclamaciones=0)
+        cls.libro = LibroReclamacion.objects.get(proveedor=cls.proveedor)
+        cls.estado = EstadoReclamacion.objects.first()
+
+    def setUp(self):
+        cubetas_intake().reiniciar()
+        latencias_bd.reiniciar()
+        self.addCleanup(latencias_bd.reiniciar)
+
+    @override_settings(RECLAMACIONES_LIMITES={'CUBETAS': {'ip': {'CAPACIDAD': 2, 'POR_MINUTO': 1}}})
+    def test_429_al_vaciar_la_cubeta(self):
+        # Los envíos inválidos también gastan fichas
+        for _ in range(2):
+            self.assertEqual(self.client.post('/api/reclamaciones/crear-reclamo/', {}, format='json').status_code, 400)
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                '/api/reclamaciones/crear-reclamo/', datos_intake(self.libro.codigo_libro, self.estado), format='json'
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+
+    @override_settings(RECLAMACIONES_LIMITES={'CUBETAS': {'ip': {'CAPACIDAD': 2, 'POR_MINUTO': 1}}})
+    def test_x_forwarded_for_del_cliente_no_estrena_cubetas(self):
+        url = '/api/reclamaciones/crear-reclamo/'
+        estados = [
+            self.client.post(url, {}, format='json', HTTP_X_FORWARDED_FOR=f'10.0.0.{n}').status_code for n in range(3)
+        ]
+        self.assertEqual(estados, [400, 400, 429])
+
+        # Con un proxy propio delante cuenta la IP que agregó ese proxy (la última)
+        cubetas_intake().reiniciar()
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            estados = [
+                self.client.post(url, {}, format='json', HTTP_X_FORWARDED_FOR=f'1.2.3.4, 10.0.0.{n}').status_code
+                for n in range(3)
+            ]
+        self.assertEqual(estados, [400, 400, 400])
+
+    def test_503_con_la_base_lenta(self):
+        for _ in range(60):
+            latencias_bd.agregar(1.0)
+        antes = Reclamacion.objects.count()
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                '/api/reclamaciones/crear-reclamo/', datos_intake(self.libro.codigo_libro, self.estado), format='json'
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertEqual(Reclamacion.objects.count(), antes)
+
+        latencias_bd.reiniciar()
+        response = self.client.post(
+            '/api/reclamaciones/crear-reclamo/', datos_intake(self.libro.codigo_libro, self.estado), format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+
+class MetricasTests(TestCase):
+    def test_metricas_pide_token_o_staff(self):
+        # Desde 127.0.0.1 (como detrás de nginx) ya no alcanza
+        self.assertEqual(self.client.get('/api/_metrics', REMOTE_ADDR='127.0.0.1').status_code, 403)
+        with override_settings(METRICS_TOKEN='secreto'):
+            self.assertEqual(self.client.get('/api/_metrics', HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+            response = self.client.get('/api/_metrics', HTTP_AUTHORIZATION='Bearer secreto')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'canal_request_seconds', response.content)
+
+        self.client.force_login(Usuario.objects.create_user(email='staff@canal.pe', password='x', is_staff=True))
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 200)
+
+    def test_server_timing_solo_para_staff_o_debug(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/estados/'))
+        with override_settings(DEBUG=True):
+            self.assertIn('db;dur=', self.client.get('/api/estados/')['Server-Timing'])
+
+        client = APIClient()
+        client.force_authenticate(Usuario.objects.create_user(email='staff@canal.pe', password='x', is_staff=True))
+        self.assertIn('Server-Timing', client.get('/api/estados/'))
+        client.force_authenticate(Usuario.objects.create_user(email='comun@canal.pe', password='x', proveedor=crear_proveedor('20000000091', reclamaciones=0)))
+        self.assertNotIn('Server-Timing', client.get('/api/estados/'))
+
+class CachesCompartidosTests(SimpleTestCase):
+    # Cualquier backend que no sea LocMem pasa, como Redis o Memcached
+    COMPARTIDO = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+    def test_locmem_con_varios_workers_no_arranca(self):
+        exigir_caches_compartidos(USUARIOS_CACHE_TENANT='default')  # un worker: LocMem sirve
+        with override_settings(WORKERS=4):
+            with self.assertRaisesMessage(ImproperlyConfigured, "USUARIOS_CACHE_TENANT ('default')"):
+                exigir_caches_compartidos(USUARIOS_CACHE_TENANT='default')
+            with self.assertRaisesMessage(ImproperlyConfigured, 'USUARIOS_LOGIN'):
+                apps.get_app_config('usuarios').ready()
+            # Los límites por proceso ('local') no dependen del cache
+            apps.get_app_config('reclamaciones').ready()
+            with override_settings(RECLAMACIONES_LIMITES={**settings.RECLAMACIONES_LIMITES, 'BACKEND': 'cache'}):
+                with self.assertRaisesMessage(ImproperlyConfigured, 'RECLAMACIONES_LIMITES'):
+                    apps.get_app_config('reclamaciones').ready()
+
+    def test_cache_compartido_con_varios_workers(self):
+        with override_settings(WORKERS=4, CACHES=self.COMPARTIDO):
+            apps.get_app_config('usuarios').ready()
+            exigir_caches_compartidos(RECLAMACIONES_LIMITES='default')
+
+
+class LoggingTests(SimpleTestCase):
+    def registro(self, **extra):
+        registro = logging.LogRecord('usuarios.login', logging.WARNING, __file__, 1, 'Login bloqueado', None, None)
+        registro.__dict__.update(extra)
+        return registro
+
+    def test_redacta_datos_y_extras(self):
+        registro = self.registro(email='ana@correo.pe', datos={'cliente': {'telefono': '999', 'ciudad': 'Lima'}})
+        self.assertTrue(RedactarFilter().filter(registro))
+        self.assertEqual(registro.email, REDACTADO)
+        self.assertEqual(registro.datos, {'cliente': {'telefono': REDACTADO, 'ciudad': 'Lima'}})
+        self.assertEqual(registro.getMessage(), 'Login bloqueado')
+
+    def test_listener_arranca_con_el_primer_registro_de_cada_proceso(self):
+        salida = io.StringIO()
+        handler = NonBlockingHandler(stream=salida)
+        handler.setFormatter(JSONFormatter())
+        self.assertIsNone(handler.listener)
+
+        handler.handle(self.registro(msg='primero'))
+        del_master = handler.listener
+        self.assertEqual(handler.pid, os.getpid())
+        handler.handle(self.registro(msg='segundo'))
+        self.assertIs(handler.listener, del_master)
+
+        # Como un worker forkeado cuando el master ya había escrito: arma su propio listener
+        handler.pid = -1
+        handler.handle(self.registro(msg='tercero'))
+        self.assertIsNot(handler.listener, del_master)
+        del_master.stop()
+        handler.detener()
+        handler.detener()  # también lo llama atexit
+        self.assertIsNone(handler.listener)
+        mensajes = [json.loads(linea)['msg'] for linea in salida.getvalue().splitlines()]
+        self.assertEqual(sorted(mensajes), ['primero', 'segundo', 'tercero'])
+
+
+class ClientesPorDocumentoTests(TestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.proveedor = crear_proveedor('20000000071', reclamaciones=0)
+        cls.libro = LibroReclamacion.objects.get(proveedor=cls.proveedor)
+        cls.estado = EstadoReclamacion.objects.first()
+
+    def intake(self, **cliente):
+        datos = datos_intake(self.libro.codigo_libro, self.estado)
+        datos['cliente'].update(cliente)
+        return datos
+
+    def test_el_mismo_documento_es_un_solo_cliente(self):
+        otros_datos = self.intake(
+            tipo_doc_cliente='dni', doc_id_cliente=' 4567 8912', nombre_cliente='Inventado', email='nuevo@correo.pe',
+            telefono='900000000', fecha_nacimiento='2000-12-31',
+        )
+        for datos in (self.intake(), otros_datos):
+            response = self.client.post('/api/reclamaciones/crear-reclamo/', datos, format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+        cliente = Cliente.objects.get(doc_id_cliente='45678912')
+
+        # La respuesta solo repite lo enviado: conocer un DNI no revela los datos guardados
+        respuesta = response.json()
+        self.assertEqual(respuesta['cliente']['email'], 'nuevo@correo.pe')
+        self.assertNotIn('id', respuesta['cliente'])
+        contenido = response.content.decode()
+        for guardado in (cliente.nombre_cliente, cliente.email, cliente.telefono, str(cliente.fecha_nacimiento)):
+            self.assertNotIn(guardado, contenido)
+        # Un envío anónimo no reescribe los datos de contacto ya registrados
+        self.assertEqual(cliente.email, 'async@correo.pe')
+        self.assertEqual(Reclamacion.objects.filter(cliente=cliente).count(), 2)
+
+        # Solo completa los que estén vacíos
+        Cliente.objects.filter(pk=cliente.pk).update(telefono='')
+        Cliente.resolver(self.intake(nombre_cliente='Otro nombre', telefono='911222333')['cliente'])
+        cliente.refresh_from_db()
+        self.assertEqual((cliente.nombre_cliente, cliente.telefono), ('Cliente async', '911222333'))
+
+        # Carga masiva: lo mismo, y si un documento se repite en el envío vale el primero
+        self.client.force_authenticate(Usuario.objects.create_user(email='kiosco@proveedor.pe', password='x', proveedor=self.proveedor))
+        lote = [self.intake(nombre_cliente='Otro nombre'), self.intake(doc_id_cliente='11112222', nombre_cliente='Primero'),
+                self.intake(doc_id_cliente='11112222', nombre_cliente='Último')]
+        response = self.client.post('/api/reclamaciones/crear-reclamo/bulk/', lote, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Cliente.objects.filter(doc_id_cliente__in=['45678912', '11112222']).count(), 2)
+        cliente.refresh_from_db()
+        self.assertEqual(cliente.nombre_cliente, 'Cliente async')
+        self.assertEqual(Cliente.objects.get(doc_id_cliente='11112222').nombre_cliente, 'Primero')
+        self.assertEqual(Reclamacion.objects.filter(cliente=cliente).count(), 3)
+
+    def test_dedupe_clientes(self):
+        # Guardados sin pasar por save(), como los que había antes de normalizar el documento
+        viejo, _ = Cliente.objects.bulk_create([
+            Cliente(nombre_cliente='Viejo', tipo_doc_cliente='dni', doc_id_cliente='4567 8912',
+                    fecha_nacimiento='1990-01-01', email='viejo@correo.pe', telefono='999888777'),
+            Cliente(nombre_cliente='Otro', tipo_doc_cliente='DNI', doc_id_cliente='99990000',
+                    fecha_nacimiento='1990-01-01', email='otro@correo.pe', telefono='999888777'),
+        ])
+        nuevo = Cliente.resolver({**self.intake(nombre_cliente='Nuevo')['cliente'], 'fecha_nacimiento': '1991-02-03'})
+        representante = RepresentanteLegal.objects.create(
+            cliente=viejo, nombre_representante='Padre', tipo_doc_representante='DNI',
+            doc_id_representante='12345678', parentesco='Padre', telefono='999888777'
+        )
+        reclamaciones = [
+            Reclamacion.objects.create(
+                libro=self.libro, cliente=cliente, fecha=timezone.now(), codigo_hoja=f'H-DEDUPE-{cliente.pk}',
+                tipo='reclamo', tipo_bien='producto', descripcion_bien='Producto', detalle='Detalle', estado=self.estado
+            )
+            for cliente in (viejo, nuevo)
+        ]
+
+        call_command('dedupe_clientes', lote=1, stdout=io.StringIO())
+
+        self.assertFalse(Cliente.objects.filter(pk=nuevo.pk).exists())
+        viejo.refresh_from_db()
+        # Queda el más antiguo con sus propios datos de contacto
+        self.assertEqual((viejo.tipo_doc_cliente, viejo.doc_id_cliente, viejo.nombre_cliente), ('DNI', '45678912', 'Viejo'))
+        self.assertEqual(viejo.email, 'viejo@correo.pe')
+        self.assertEqual(set(Reclamacion.objects.filter(pk__in=[r.pk for r in reclamaciones]).values_list('cliente_id', flat=True)), {viejo.pk})
+        representante.refresh_from_db()
+        self.assertEqual(representante.cliente_id, viejo.pk)
+        self.assertEqual(Cliente.objects.filter(doc_id_cliente='99990000').count(), 1)
+
+
+    def test_api_de_clientes_valida_el_documento_normalizado(self):
+        usuario = Usuario.objects.create_user(email='clientes@proveedor.pe', password='x', proveedor=self.proveedor)
+        self.client.force_authenticate(usuario)
+        datos = self.intake()['cliente']
+        self.assertEqual(self.client.post('/api/clientes/', datos, format='json').status_code, 201)
+
+        # Mismo documento escrito distinto: 400 del validador, no IntegrityError
+        response = self.client.post('/api/clientes/', {**datos, 'tipo_doc_cliente': 'dni', 'doc_id_cliente': '4567 8912'}, format='json')
+        self.assertEqual(response.status_code, 400, response.content)
+        otro = self.client.post('/api/clientes/', {**datos, 'doc_id_cliente': '11112222'}, format='json').json()
+        response = self.client.patch(f"/api/clientes/{otro['id']}/", {'doc_id_cliente': ' 4567 8912 '}, format='json')
+        self.assertEqual(response.status_code, 400, response.content)
+        response = self.client.patch(f"/api/clientes/{otro['id']}/", {'tipo_doc_cliente': ' ce '}, format='json')
+        self.assertEqual(response.json()['tipo_doc_cliente'], 'CE')
+
+
+class CrearReclamacionesBulkTests(TestCase):
+    client_class = APIClient
+    url = '/api/reclamaciones/crear-reclamo/bulk/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.proveedor = crear_proveedor('20000000081', reclamaciones=0)
+        cls.libro = LibroReclamacion.objects.get(proveedor=cls.proveedor)
+        cls.ajeno = LibroReclamacion.objects.get(proveedor=crear_proveedor('20000000082', reclamaciones=0))
+        cls.estado = EstadoReclamacion.objects.first()
+        cls.usuario = Usuario.objects.create_user(email='kiosco@proveedor.pe', password='x', proveedor=cls.proveedor)
+
+    def setUp(self):
+        self.client.force_authenticate(self.usuario)
+
+    def item(self, numero, **datos):
+        item = datos_intake(self.libro.codigo_libro, self.estado)
+        item['cliente']['doc_id_cliente'] = f'{numero:08d}'
+        item.update(datos)
+        return item
+
+    def test_pide_cuenta_de_proveedor(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.post(self.url, [self.item(1)], format='json').status_code, 401)
+        self.assertFalse(Reclamacion.objects.exists())
+
+    def test_lote_mixto_reporta_cada_item(self):
+        lote = [
+            self.item(1),
+            self.item(2, libro=['lista']),                # antes: TypeError al armar el set de códigos
+            self.item(3, libro={'codigo': 'x'}),
+            self.item(4, libro=self.ajeno.codigo_libro),  # libro de otro proveedor
+            'no es un objeto',
+            self.item(5, tipo='otro'),
+            self.item(6),
+        ]
+        response = self.client.post(self.url, lote, format='json')
+        self.assertEqual(response.status_code, 207, response.content)
+        datos = response.json()
+        self.assertEqual(datos['creadas'], 2)
+        resultados = datos['resultados']
+        self.assertEqual([resultado['index'] for resultado in resultados], list(range(len(lote))))
+        self.assertTrue(all('codigo_hoja' in resultados[i] for i in (0, 6)))
+        for i in (1, 2, 3):
+            self.assertIn('libro', resultados[i]['errores'])
+        self.assertIn('non_field_errors', resultados[4]['errores'])
+        self.assertIn('tipo', resultados[5]['errores'])
+        self.assertEqual(Reclamacion.objects.filter(proveedor=self.proveedor).count(), 2)
+        self.assertFalse(Reclamacion.objects.filter(libro=self.ajeno).exists())
+
+    def test_todos_invalidos_y_tope(self):
+        response = self.client.post(self.url, [self.item(1, libro='NO-EXISTE'), self.item(2, estado_id=999999)], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['creadas'], 0)
+        for cuerpo in ([], {'libro': self.libro.codigo_libro}):
+            self.assertEqual(self.client.post(self.url, cuerpo, format='json').status_code, 400)
+
+        with override_settings(RECLAMACIONES_BULK_MAX=2):
+            response = self.client.post(self.url, [self.item(n) for n in range(3)], format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(self.client.post(self.url, [self.item(n) for n in range(2)], format='json').status_code, 201)
+        self.assertEqual(Reclamacion.objects.count(), 2)
+
+@override_settings(USUARIOS_PBKDF2_ITERACIONES=1000)
+class SembradoYBenchmarkApiTests(TestCase):
+    def test_seed_canal(self):
+        for _ in range(2):
+            call_command('seed_canal', reclamaciones=40, proveedores=2, clientes=10, lote=15, semilla=1, stdout=io.StringIO())
+
+        sembradas = Reclamacion.objects.filter(proveedor__ruc__startswith='29')
+        self.assertEqual(sembradas.count(), 80)
+        self.assertEqual(Proveedor.objects.filter(ruc__startswith='29').count(), 4)
+        # Lo que bulk_create no hace solo: proveedor copiado, estadísticas y versión de datos
+        self.assertFalse(sembradas.exclude(proveedor_id=F('libro__proveedor_id')).exists())
+        self.assertFalse(LibroReclamacion.objects.filter(proveedor__isnull=True).exists())
+        self.assertEqual(ReclamacionStatsDiario.objects.aggregate(total=Sum('cantidad'))['total'], 80)
+        self.assertEqual(VersionDatos.objects.filter(proveedor__ruc__startswith='29').count(), 4)
+        # La segunda corrida reclama con los mismos clientes
+        self.assertLessEqual(Cliente.objects.filter(tipo_doc_cliente='DNI').count(), 10)
+
+    def test_benchmark_api_escribe_json(self):
+        with tempfile.TemporaryDirectory() as carpeta:
+            salida = os.path.join(carpeta, 'corrida.json')
+            call_command('benchmark', 'api', 'api_listas', filas=20, repeticiones=2, salida=salida, stdout=io.StringIO())
+            with open(salida, encoding='utf-8') as archivo:
+                corrida = json.load(archivo)
+
+        self.assertEqual(corrida['filas'], 20)
+        api = corrida['resultados']['api']
+        self.assertEqual({nombre: resultado['status'] for nombre, resultado in api.items()}, {
+            'tabla': 200, 'tabla_pagina': 200, 'perfil': 200, 'login': 200, 'crear_reclamo': 201,
+        })
+        self.assertEqual(api['login']['consultas'], 1)
+        self.assertEqual(set(corrida['resultados']['api_listas']), {
+            'proveedores', 'marcas', 'establecimientos', 'libros', 'clientes', 'estados', 'reclamos', 'archivos',
+        })
+        for resultado in corrida['resultados']['api_listas'].values():
+            self.assertEqual(resultado['status'], 200)
+            self.assertLessEqual(resultado['p50_ms'], resultado['p95_ms'])
+        # La transacción del benchmark se revirtió
+        self.assertFalse(Proveedor.objects.filter(ruc='99999999999').exists())
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import *
@@ -12,15 +13,30 @@ router.register(r'estados', EstadoReclamacionViewSet)
 router.register(r'reclamos', ReclamacionViewSet)
 router.register(r'archivos', ArchivoAdjuntoViewSet)
 
+# Con RECLAMACIONES_INTAKE_ASYNC (despliegue ASGI con uvicorn) el formulario público y
+# obtener-url se atienden con las vistas async; en gunicorn síncrono, con las de DRF
+if getattr(settings, 'RECLAMACIONES_INTAKE_ASYNC', False):
+    CrearReclamacion = CrearReclamacionAsyncView
+    ObtenerUrlLibro = ObtenerUrlLibroAsyncView
+else:
+    CrearReclamacion = CrearReclamacionConClienteView
+    ObtenerUrlLibro = ObtenerUrlLibroAPIView
+
 urlpatterns = [
     path('', include(router.urls)),
-    path('reclamaciones/crear-reclamo/', CrearReclamacionConClienteView.as_view()),
+    path('reclamaciones/crear-reclamo/', CrearReclamacion.as_view()),
+    path('reclamaciones/crear-reclamo/bulk/', CrearReclamacionesBulkView.as_view(), name='crear-reclamo-bulk'),
+    path('reclamaciones/exportar/', ExportarReclamacionesView.as_view(), name='reclamaciones-exportar'),
+    path('reclamaciones/estadisticas/', EstadisticasReclamacionesView.as_view(), name='reclamaciones-estadisticas'),
     path('reclamaciones/tabla/', ReclamacionesPlanasView.as_view(), name='reclamaciones-tabla'),
+    path('reclamaciones/<int:id>/adjuntos/', SubirAdjuntoView.as_view(), name='reclamo-adjuntos'),
     path('reclamaciones/<int:id>/responder/', ProveedorResponderReclamacionView.as_view(), name='reclamo-responder'),
     path('proveedor/perfil/', ProveedorPerfilAPIView.as_view()),
     path('proveedor/cambiar-contrasena/', CambiarContrasenaAPIView.as_view()),
-    path('libro/obtener-url/', ObtenerUrlLibroAPIView.as_view()),
+    path('libro/obtener-url/', ObtenerUrlLibro.as_view()),
+    path('libro/obtener-url/<slug:libro_slug>/<slug:establecimiento_slug>/', ObtenerUrlLibro.as_view()),
     path('libros/<int:pk>/editar-slugs/', EditarSlugsLibroAPIView.as_view(), name='editar-slugs-libro'),
     path('libros/<int:pk>/editar-completo/', EditarLibroCompletoAPIView.as_view(), name='editar-libro-completo'),
     path('perfil/', UsuarioPerfilView.as_view()),
+    path('_metrics', metricas_view, name='metricas'),
 ]
\ No newline at end of file
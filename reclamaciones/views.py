@@ -1,17 +1,48 @@
 from rest_framework import viewsets, status, generics, permissions
+from rest_framework.decorators import action
 from .models import *
 from .serializers import *
+from .adjuntos import (
+    CAMPO as CAMPO_ADJUNTO, AdjuntoUploadHandler, config as config_adjuntos, descartar_temporal,
+    espacio_usado, guardar, respuesta_descarga, ruta_relativa, token_adjuntos, token_valido, uso_de_reclamacion,
+)
+from . import busqueda, estadisticas, exportacion
+from .cache import cache_libros, registro_estados
+from .limites import BaseSaturada, IntakeThrottle, SaturacionBDThrottle, consumir_intake, saturacion_bd
+from .condicional import get_condicional
+from .pagination import KeysetPagination, RelevanciaPagination, stream_proyeccion
+from .proyecciones import ProyeccionPlana
+from .middleware import registro_metricas
+from .mixins import EagerLoadingMixin
+from .perfil import datos_reclamacion, PROFUNDIDAD_MARCAS, PROFUNDIDAD_LIBROS, PROFUNDIDAD_COMPLETA
 from rest_framework.generics import UpdateAPIView
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.contrib.auth.password_validation import validate_password
 from django.shortcuts import get_object_or_404
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated, ParseError, Throttled
+from rest_framework.parsers import MultiPartParser
+from rest_framework.settings import api_settings
+from .renderers import RapidJSONParser, RapidJSONRenderer
+import hashlib
+import hmac
+import io
+import logging
+
+logger = logging.getLogger('reclamaciones.intake')
 
 
 #Crear las vistas
-class ProveedorViewSet(viewsets.ModelViewSet):
+class ProveedorViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Proveedor.objects.all()
     serializer_class = ProveedorSerializer
 
@@ -57,43 +88,67 @@ class CambiarContrasenaAPIView(APIView):
 
         return Response({"mensaje": "Contraseña actualizada correctamente."})
     
-class MarcaViewSet(viewsets.ModelViewSet):
+class MarcaViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Marca.objects.all()
     serializer_class = MarcaSerializer
 
-class EstablecimientoViewSet(viewsets.ModelViewSet):
+class EstablecimientoViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Establecimiento.objects.all()
     serializer_class = EstablecimientoSerializer
 
-class LibroReclamacionViewSet(viewsets.ModelViewSet):
+class LibroReclamacionViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = LibroReclamacion.objects.all()
     serializer_class = LibroReclamacionSerializer
     
     def get_queryset(self):
-        user = self.request.user
-
-        # Si es superusuario, puede ver todos los libros
-        if user.is_superuser:
-            return LibroReclamacion.objects.all()
-
-        # Si es proveedor, solo los libros de su marca
-        if hasattr(user, 'proveedor'):
-            return LibroReclamacion.objects.filter(
-                establecimiento__marca__proveedor=user.proveedor
-            )
-
-        # Si no tiene proveedor asociado, no ve nada
-        return LibroReclamacion.objects.none()
-
-class ClienteViewSet(viewsets.ModelViewSet):
+        # Superusuario ve todos los libros, el proveedor solo los suyos
+        return LibroReclamacion.objects.for_user(self.request.user)
+
+    @get_condicional
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    # GET /api/libros/<id>/reclamaciones/ -> reclamaciones de un libro, paginadas por llave.
+    # Lo usa el dashboard para expandir un libro cuando /api/perfil/ se pidió con ?depth=
+    @action(detail=True, methods=['get'])
+    @get_condicional
+    def reclamaciones(self, request, pk=None):
+        libro = self.get_object()
+        paginador = KeysetPagination()
+        pagina = paginador.paginate_queryset(libro.reclamaciones.select_related('cliente'), request)
+        return Response(paginador.get_paginated_data([datos_reclamacion(r) for r in pagina]))
+
+class ClienteViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Cliente.objects.all()
     serializer_class = ClienteSerializer
     
-class EstadoReclamacionViewSet(viewsets.ModelViewSet):
+class EstadoReclamacionViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = EstadoReclamacion.objects.all()
     serializer_class = EstadoReclamacionSerializer
 
-class ReclamacionViewSet(viewsets.ModelViewSet):
+    # Lectura desde el registro en memoria (cache.py): sin consultas y con Cache-Control
+    # largo, porque los estados casi nunca cambian. El ETag permite revalidar con un 304.
+    def list(self, request, *args, **kwargs):
+        return self.respuesta_cacheable(request, self.get_serializer(registro_estados().todos(), many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            estado = registro_estados().por_id(int(kwargs['pk']))
+        except ValueError:
+            estado = None
+        if estado is None:
+            return Response({'detail': 'No encontrado.'}, status=404)
+        return self.respuesta_cacheable(request, self.get_serializer(estado).data)
+
+    def respuesta_cacheable(self, request, datos):
+        etag = '"%s"' % hashlib.sha256(RapidJSONRenderer().render(datos)).hexdigest()[:20]
+        response = get_conditional_response(request, etag=etag) or Response(datos)
+        response['ETag'] = etag
+        max_age = getattr(settings, 'RECLAMACIONES_CACHE_ESTADOS', {}).get('MAX_AGE', 3600)
+        patch_cache_control(response, private=True, max_age=max_age)
+        return response
+
+class ReclamacionViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = Reclamacion.objects.all()
     
@@ -103,84 +158,415 @@ class ReclamacionViewSet(viewsets.ModelViewSet):
         return ReclamacionPlanoSerializer
     
     def get_queryset(self):
-        user = self.request.user
-        if user.is_superuser:
-            return Reclamacion.objects.all()
-        return Reclamacion.objects.filter(libro__establecimiento__marca__proveedor=user.proveedor)
+        return Reclamacion.objects.for_user(self.request.user)
+
+    # GET /api/reclamos/buscar/?q=palabras&page= -> búsqueda de texto completo (busqueda.py),
+    # de la más a la menos relevante, con las mismas filas que el listado
+    @action(detail=False, methods=['get'], url_path='buscar')
+    def buscar(self, request):
+        texto = request.query_params.get('q', '')
+        if not busqueda.terminos(texto):
+            return Response({'q': 'Indique al menos una palabra a buscar.'}, status=400)
 
-class ArchivoAdjuntoViewSet(viewsets.ModelViewSet):
+        user = request.user
+        proveedor_id = None if user.is_superuser else getattr(user, 'proveedor_id', None)
+        paginador = RelevanciaPagination()
+        ids = []
+        # Sin proveedor asociado no se ve nada, igual que en for_user
+        if user.is_superuser or proveedor_id:
+            ids = paginador.paginate_ids(
+                lambda limite, desplazamiento: busqueda.buscar(texto, proveedor_id, limite, desplazamiento), request
+            )
+
+        proyeccion = ReclamacionesPlanasView.proyeccion
+        filas = {fila['id']: fila for fila in proyeccion.filas(self.get_queryset().filter(pk__in=ids))}
+        return Response(paginador.get_paginated_data([filas[id] for id in ids if id in filas]))
+
+class ArchivoAdjuntoViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = ArchivoAdjunto.objects.all()
     serializer_class = ArchivoAdjuntoSerializer
+
+    def get_queryset(self):
+        return ArchivoAdjunto.objects.for_user(self.request.user)
+
+    # GET /api/archivos/<id>/descargar/ -> el contenido, servido por Django o por nginx (ver adjuntos.py)
+    @action(detail=True, methods=['get'])
+    def descargar(self, request, pk=None):
+        archivo = self.get_object()
+        if not archivo.sha256:
+            # Adjuntos antiguos: solo tienen la ruta que mandó el front
+            return Response({'error': 'El archivo no está en el almacén.'}, status=404)
+        try:
+            return respuesta_descarga(archivo)
+        except FileNotFoundError:
+            logger.error("Falta el contenido de un adjunto", extra={'adjunto_id': archivo.id, 'sha256': archivo.sha256})
+            return Response({'error': 'El archivo no está en el almacén.'}, status=404)
     
 class CrearReclamacionConClienteView(APIView):
     permission_classes = [AllowAny]
     authentication_classes = []
+    # Antes de validar nada: 503 si la base va lenta, 429 por IP/huella (limites.py)
+    throttle_classes = [SaturacionBDThrottle, IntakeThrottle]
     
     def post(self, request):
-        print(" Payload recibido del front:", request.data)
-        
+        logger.debug("Payload recibido del front", extra={'datos': request.data})
+
         serializer = ReclamacionConClienteSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
-            print("⚠️ Errores de validación:", serializer.errors)  # 👈 Aquí se ve el error
+            logger.info("Errores de validación", extra={'datos': serializer.errors})
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+def _json(datos, status=200, **headers):
+    return HttpResponse(RapidJSONRenderer().render(datos), status=status, content_type='application/json', headers=headers)
+
+
+# Versión nativa async de CrearReclamacionConClienteView (mismo contrato) para correr
+# bajo ASGI (uvicorn). Mientras espera la base de datos el worker sigue atendiendo
+# otros envíos. Es una vista de Django y no de DRF porque APIView no tiene handlers
+# async; el parseo y el render usan los mismos parser/renderer de la API.
+@method_decorator(csrf_exempt, name='dispatch')
+class CrearReclamacionAsyncView(View):
+    http_method_names = ['post', 'options']
+
+    async def post(self, request):
+        # Los mismos límites que SaturacionBDThrottle e IntakeThrottle en la vista de DRF
+        segundos = saturacion_bd()
+        if segundos:
+            return _json({'detail': BaseSaturada.default_detail}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                         **{'Retry-After': str(segundos)})
+        segundos = consumir_intake(request)
+        if segundos:
+            return _json({'detail': Throttled(segundos).detail}, status=status.HTTP_429_TOO_MANY_REQUESTS,
+                         **{'Retry-After': str(segundos)})
+        try:
+            data = RapidJSONParser().parse(io.BytesIO(request.body))
+        except ParseError as exc:
+            return _json({'detail': exc.detail}, status=status.HTTP_400_BAD_REQUEST)
+        logger.debug("Payload recibido del front", extra={'datos': data})
+
+        # El libro se resuelve con el cache/ORM async y se pasa ya resuelto al serializer
+        libros = {}
+        codigo = data.get('libro') if isinstance(data, dict) else None
+        if isinstance(codigo, str):
+            libro = await cache_libros().alibro_activo(codigo)
+            if libro is not None:
+                libros[codigo] = libro
+
+        serializer = ReclamacionConClienteSerializer(data=data, context={'libros': libros})
+        # La validación consulta el estado (PrimaryKeyRelatedField), que es ORM síncrono
+        if not await sync_to_async(serializer.is_valid)():
+            logger.info("Errores de validación", extra={'datos': serializer.errors})
+            return _json(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        await serializer.asave()
+        return _json(await sync_to_async(lambda: serializer.data)(), status=status.HTTP_201_CREATED)
+
+# POST /api/reclamaciones/crear-reclamo/bulk/
+# Recibe una lista de reclamaciones (kioscos y call centers que reenvían lo acumulado
+# sin conexión) y responde el resultado de cada una en el mismo orden. A diferencia del
+# formulario público pide la cuenta del proveedor: son cientos de reclamaciones por
+# request, fuera de los límites por IP y huella de limites.py, y solo se aceptan los
+# libros del proveedor del usuario.
+class CrearReclamacionesBulkView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [SaturacionBDThrottle]
+
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Se espera una lista de reclamaciones.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        maximo = getattr(settings, 'RECLAMACIONES_BULK_MAX', 500)
+        if len(items) > maximo:
+            return Response({'error': f'Máximo {maximo} reclamaciones por envío.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Todos los libros del envío se resuelven en una sola consulta
+        codigos = {item.get('libro') for item in items if isinstance(item, dict) and isinstance(item.get('libro'), str)}
+        libros = {
+            libro.codigo_libro: libro
+            for libro in LibroReclamacion.objects.for_user(request.user).filter(codigo_libro__in=codigos, estado='activo')
+        }
+
+        resultados = [None] * len(items)
+        validos = []
+        for indice, item in enumerate(items):
+            serializer = ReclamacionConClienteSerializer(data=item, context={'libros': libros})
+            if serializer.is_valid():
+                validos.append((indice, serializer.validated_data))
+            else:
+                resultados[indice] = {'index': indice, 'errores': serializer.errors}
+
+        if validos:
+            creadas = crear_reclamaciones_en_lote([datos for _, datos in validos])
+            for (indice, _), reclamacion in zip(validos, creadas):
+                resultados[indice] = {
+                    'index': indice, 'id': reclamacion.id, 'codigo_hoja': reclamacion.codigo_hoja,
+                    'token_adjuntos': token_adjuntos(reclamacion.id),
+                }
+
+        if len(validos) == len(items):
+            codigo = status.HTTP_201_CREATED
+        elif validos:
+            codigo = status.HTTP_207_MULTI_STATUS
+        else:
+            codigo = status.HTTP_400_BAD_REQUEST
+        return Response({'creadas': len(validos), 'resultados': resultados}, status=codigo)
+
 class UsuarioPerfilView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @get_condicional
     def get(self, request):
         user = request.user
-        serializer = UsuarioPerfilSerializer(user)  # Usamos el serializer anidado que definimos antes
+        context = {}
+
+        # ?depth=0..3 devuelve el árbol resumido (solo conteos) hasta ese nivel
+        # ?expand=<id_libro>,<id_libro> incluye las reclamaciones de esos libros
+        depth = request.query_params.get('depth')
+        expand = request.query_params.get('expand')
+        if depth is not None or expand:
+            try:
+                context['depth'] = int(depth) if depth is not None else PROFUNDIDAD_LIBROS
+                context['expand'] = [int(libro_id) for libro_id in expand.split(',') if libro_id] if expand else []
+            except ValueError:
+                return Response({'error': 'depth y expand deben ser números enteros.'}, status=400)
+            if not PROFUNDIDAD_MARCAS <= context['depth'] <= PROFUNDIDAD_COMPLETA:
+                return Response({'error': f'depth debe estar entre {PROFUNDIDAD_MARCAS} y {PROFUNDIDAD_COMPLETA}.'}, status=400)
+
+        serializer = UsuarioPerfilSerializer(user, context=context)  # Usamos el serializer anidado que definimos antes
         return Response(serializer.data)
     
 #Listar reclamaciones ,incluye clientes y establecimientos
 class ReclamacionesPlanasView(APIView):
     permission_classes = [IsAuthenticated]
+    # Solo lectura: las filas salen de un .values_list() con la misma salida que
+    # ReclamacionPlanoSerializer, sin instanciar Reclamacion/Cliente/Estado por fila
+    proyeccion = ProyeccionPlana(ReclamacionPlanoSerializer)
 
-    def get(self, request):
-        user = request.user
+    def get_queryset(self):
+        return Reclamacion.objects.for_user(self.request.user)
 
-        if user.is_superuser:
-            reclamaciones = Reclamacion.objects.select_related(
-                'estado', 'cliente', 'libro__establecimiento'
-            ).all()
-        else:
-            reclamaciones = Reclamacion.objects.select_related(
-                'estado', 'cliente', 'libro__establecimiento'
-            ).filter(libro__establecimiento__marca__proveedor=user.proveedor)
+    @get_condicional
+    def get(self, request):
+        reclamaciones = self.get_queryset()
+        proyeccion = self.proyeccion
+
+        paginador = KeysetPagination()
+
+        # ?stream=ndjson|json -> se envía todo el listado por bloques sin armarlo en memoria
+        formato = request.query_params.get('stream')
+        if formato:
+            reclamaciones = paginador.filter_queryset(reclamaciones, request)
+            return stream_proyeccion(reclamaciones, proyeccion, formato)
+
+        # ?page_size= / ?cursor= -> paginación por llave sobre (fecha, id)
+        if paginador.is_requested(request):
+            fecha, pk = proyeccion.indice('fecha'), proyeccion.indice('id')
+            pagina = paginador.paginate_queryset(
+                proyeccion.queryset(reclamaciones), request, clave=lambda fila: (fila[fecha], fila[pk])
+            )
+            return Response(paginador.get_paginated_data([proyeccion.a_dict(fila) for fila in pagina]))
 
-        serializer = ReclamacionPlanoSerializer(reclamaciones, many=True)
-        return Response(serializer.data)
+        return Response(list(proyeccion.filas(reclamaciones)))
     
+# GET /api/reclamaciones/exportar/?formato=csv|xlsx&desde=&hasta=&estado=&establecimiento=
+# Libro completo para INDECOPI, en streaming desde un cursor (ver exportacion.py)
+class ExportarReclamacionesView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        filtros = FiltrosExportacionSerializer(data=request.query_params)
+        filtros.is_valid(raise_exception=True)
+        formato = filtros.validated_data['formato']
+
+        reclamaciones = exportacion.filtrar(Reclamacion.objects.for_user(request.user), filtros.validated_data)
+        response = StreamingHttpResponse(
+            exportacion.exportar(reclamaciones, formato), content_type=exportacion.CONTENT_TYPES[formato]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{exportacion.nombre_archivo(formato)}"'
+        return response
+
+
+# GET /api/reclamaciones/estadisticas/?desde=&hasta=&agrupar=dia,estado&establecimiento=&estado=&tipo=&tipo_bien=
+# Conteos y monto reclamado desde la tabla de estadísticas diarias (ver estadisticas.py)
+class EstadisticasReclamacionesView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def variante_condicional(self, request):
+        # Sin ?hasta= (o ?desde=) el rango termina hoy: el ETag de ayer no vale después de medianoche
+        filtros = FiltrosEstadisticasSerializer(data=request.query_params)
+        if not filtros.is_valid():
+            return ''
+        desde, hasta = estadisticas.rango(filtros.validated_data)
+        return f'{desde}:{hasta}'
+
+    @get_condicional
+    def get(self, request):
+        filtros = FiltrosEstadisticasSerializer(data=request.query_params)
+        filtros.is_valid(raise_exception=True)
+        queryset = ReclamacionStatsDiario.objects.for_user(request.user)
+        return Response(estadisticas.consultar(queryset, filtros.validated_data))
+
+
 class ProveedorResponderReclamacionView(UpdateAPIView):
     queryset = Reclamacion.objects.all()
     serializer_class = ReclamacionRespuestaSerializer
     lookup_field = 'id'
+
+    def get_queryset(self):
+        # El proveedor solo puede responder sus propias reclamaciones
+        return Reclamacion.objects.for_user(self.request.user)
     
 
+# POST /api/reclamaciones/<id>/adjuntos/ (multipart, campo "archivo").
+# El proveedor sube a sus reclamaciones; el cliente sin cuenta, con el token_adjuntos que
+# recibió al crear la reclamación (cabecera X-Token-Adjuntos o ?token=).
+class SubirAdjuntoView(APIView):
+    permission_classes = [AllowAny]
+    parser_classes = [MultiPartParser]
+
+    ERRORES = {
+        'tipo': ('Solo se aceptan PDF, JPEG, PNG o WebP.', status.HTTP_415_UNSUPPORTED_MEDIA_TYPE),
+        'tamano': ('El archivo supera el tamaño máximo.', status.HTTP_413_REQUEST_ENTITY_TOO_LARGE),
+        'vacio': ('El archivo está vacío.', status.HTTP_400_BAD_REQUEST),
+    }
+    CUOTA_EXCEDIDA = ('Se alcanzó el espacio disponible para adjuntos.', status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    LIMITE_ANONIMO = ('Se alcanzó el máximo de adjuntos para esta reclamación.', status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def reclamacion(self, request, id):
+        if request.user.is_authenticated:
+            return get_object_or_404(Reclamacion.objects.for_user(request.user), pk=id)
+        token = request.headers.get('X-Token-Adjuntos') or request.query_params.get('token', '')
+        if not token_valido(token, id):
+            return None
+        return get_object_or_404(Reclamacion, pk=id)
+
+    def error(self, mensaje, codigo):
+        return Response({'error': mensaje}, status=codigo)
+
+    def post(self, request, id):
+        reclamacion = self.reclamacion(request, id)
+        if reclamacion is None:
+            return self.error('Token de adjuntos inválido o vencido.', status.HTTP_403_FORBIDDEN)
+
+        ajustes = config_adjuntos()
+        # Rechazo temprano, antes de leer el cuerpo: Content-Length incluye el multipart,
+        # así que se compara con holgura y el tamaño real se valida en el handler
+        try:
+            declarado = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            declarado = 0
+        if declarado > ajustes['TAMANO_MAXIMO'] + 64 * 1024:
+            return self.error(*self.ERRORES['tamano'])
+        proveedor_id = reclamacion.proveedor_id
+        if proveedor_id and espacio_usado(proveedor_id) >= ajustes['CUOTA_PROVEEDOR']:
+            return self.error(*self.CUOTA_EXCEDIDA)
+        # Con el token, el cliente sin cuenta tiene un tope de archivos y bytes por reclamación
+        anonimo = not request.user.is_authenticated
+        if anonimo:
+            cantidad, total = uso_de_reclamacion(reclamacion.id)
+            if cantidad >= ajustes['MAXIMO_ANONIMOS'] or total >= ajustes['CUOTA_ANONIMA']:
+                return self.error(*self.LIMITE_ANONIMO)
+
+        # Debe ir antes de tocar request.data / request.FILES
+        handler = AdjuntoUploadHandler(request._request, tamano_maximo=ajustes['TAMANO_MAXIMO'])
+        request._request.upload_handlers = [handler]
+        recibido = request.FILES.get(CAMPO_ADJUNTO)
+        if handler.error:
+            return self.error(*self.ERRORES[handler.error])
+        if recibido is None:
+            return self.error('Falta el archivo.', status.HTTP_400_BAD_REQUEST)
+
+        existente = reclamacion.archivos.filter(sha256=recibido.sha256).first()
+        if existente is not None:
+            descartar_temporal(recibido.file)
+            return Response(AdjuntoSubidoSerializer(existente).data, status=status.HTTP_200_OK)
+
+        with transaction.atomic():
+            if proveedor_id:
+                # Serializa las subidas del mismo proveedor para que la cuota no se pase en paralelo
+                Proveedor.objects.select_for_update().filter(pk=proveedor_id).first()
+                if espacio_usado(proveedor_id) + recibido.size > ajustes['CUOTA_PROVEEDOR']:
+                    descartar_temporal(recibido.file)
+                    return self.error(*self.CUOTA_EXCEDIDA)
+            if anonimo:
+                Reclamacion.objects.select_for_update().filter(pk=reclamacion.id).first()
+                cantidad, total = uso_de_reclamacion(reclamacion.id)
+                if cantidad + 1 > ajustes['MAXIMO_ANONIMOS'] or total + recibido.size > ajustes['CUOTA_ANONIMA']:
+                    descartar_temporal(recibido.file)
+                    return self.error(*self.LIMITE_ANONIMO)
+            guardar(recibido)
+            archivo = ArchivoAdjunto.objects.create(
+                reclamacion=reclamacion, nombre_archivo=recibido.name, ruta=ruta_relativa(recibido.sha256),
+                sha256=recibido.sha256, tamano=recibido.size, content_type=recibido.content_type,
+            )
+        logger.info("Adjunto guardado", extra={'reclamacion_id': reclamacion.id, 'sha256': archivo.sha256, 'tamano': archivo.tamano})
+        return Response(AdjuntoSubidoSerializer(archivo).data, status=status.HTTP_201_CREATED)
+
+
 class ObtenerUrlLibroAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
-    def get(self, request, libro_slug, establecimiento_slug):
+    def get(self, request, libro_slug=None, establecimiento_slug=None):
         user = request.user
+        # Los slugs pueden venir en la ruta o como parámetros (?libro_slug=&establecimiento_slug=)
+        libro_slug = libro_slug or request.query_params.get('libro_slug')
+        establecimiento_slug = establecimiento_slug or request.query_params.get('establecimiento_slug')
+        if not libro_slug or not establecimiento_slug:
+            return Response({'detail': 'Se requieren libro_slug y establecimiento_slug.'}, status=400)
+
+        libro = cache_libros().libro_por_slugs(libro_slug, establecimiento_slug)
+        if libro is None:
+            return Response({'detail': 'Libro no encontrado.'}, status=404)
 
-        try:    
-            libro = LibroReclamacion.objects.get(
-                libro_slug=libro_slug,
-                establecimiento_slug=establecimiento_slug
-            )
+        # Verifica que el proveedor sea dueño del libro, con el dueño actual de la base
+        # (el del cache puede ser de antes de un traspaso en otro worker)
+        if not LibroReclamacion.objects.filter(pk=libro.pk, proveedor_id=user.proveedor_id).exists():
+            return Response({'detail': 'No tienes permiso para acceder a este libro.'}, status=403)
+
+        return Response({'url': libro.get_url()})
+        
+# Versión async de ObtenerUrlLibroAPIView. La autenticación es la misma de la API
+# (DEFAULT_AUTHENTICATION_CLASSES), hecha a mano porque no pasa por APIView.
+class ObtenerUrlLibroAsyncView(View):
+    http_method_names = ['get', 'options']
+
+    async def autenticar(self, request):
+        """(usuario, None) o (None, valor de WWW-Authenticate)."""
+        clases = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        for clase in clases:
+            resultado = await sync_to_async(clase().authenticate)(request)
+            if resultado is not None:
+                return resultado[0], None
+        return None, clases[0]().authenticate_header(request) if clases else None
+
+    async def get(self, request, libro_slug=None, establecimiento_slug=None):
+        try:
+            user, desafio = await self.autenticar(request)
+        except AuthenticationFailed as exc:
+            detalle = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+            return _json(detalle, status=exc.status_code)
+        if user is None or not user.is_authenticated:
+            cabeceras = {'WWW-Authenticate': desafio} if desafio else {}
+            return _json({'detail': NotAuthenticated.default_detail}, status=401, **cabeceras)
 
-            # Verifica que el proveedor sea dueño del libro
-            if libro.establecimiento.marca.proveedor != user.proveedor:
-                return Response({'detail': 'No tienes permiso para acceder a este libro.'}, status=403)
+        libro_slug = libro_slug or request.GET.get('libro_slug')
+        establecimiento_slug = establecimiento_slug or request.GET.get('establecimiento_slug')
+        if not libro_slug or not establecimiento_slug:
+            return _json({'detail': 'Se requieren libro_slug y establecimiento_slug.'}, status=400)
 
-            return Response({'url': libro.get_url()})
+        libro = await cache_libros().alibro_por_slugs(libro_slug, establecimiento_slug)
+        if libro is None:
+            return _json({'detail': 'Libro no encontrado.'}, status=404)
+
+        if not await LibroReclamacion.objects.filter(pk=libro.pk, proveedor_id=user.proveedor_id).aexists():
+            return _json({'detail': 'No tienes permiso para acceder a este libro.'}, status=403)
+
+        return _json({'url': libro.get_url()})
 
-        except LibroReclamacion.DoesNotExist:
-            return Response({'detail': 'Libro no encontrado.'}, status=404)
-        
 class EditarSlugsLibroAPIView(UpdateAPIView):
     queryset = LibroReclamacion.objects.all()
     serializer_class = EditarSlugsLibroSerializer
@@ -190,10 +576,7 @@ class EditarSlugsLibroAPIView(UpdateAPIView):
         """
         Filtra los libros para que el proveedor solo pueda editar los suyos.
         """
-        user = self.request.user
-        if hasattr(user, 'proveedor'):
-            return LibroReclamacion.objects.filter(establecimiento__marca__proveedor=user.proveedor)
-        return LibroReclamacion.objects.none()
+        return LibroReclamacion.objects.for_user(self.request.user)
     
 
 class EditarLibroCompletoAPIView(UpdateAPIView):
@@ -202,9 +585,15 @@ class EditarLibroCompletoAPIView(UpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        if hasattr(user, 'proveedor'):
-            return LibroReclamacion.objects.filter(
-                establecimiento__marca__proveedor=user.proveedor
-            )
-        return LibroReclamacion.objects.none()
\ No newline at end of file
+        return LibroReclamacion.objects.for_user(self.request.user)
+
+
+# GET /api/_metrics -> métricas por vista en formato de texto de Prometheus.
+# Para el scraper con "Authorization: Bearer <METRICS_TOKEN>" o para un usuario staff con
+# sesión. No se filtra por IP: detrás de nginx todos los requests llegan desde 127.0.0.1.
+def metricas_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    autorizado = token and hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode())
+    if not autorizado and not getattr(request.user, 'is_staff', False):
+        return HttpResponse(status=403)
+    return HttpResponse(registro_metricas.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -50,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'reclamaciones.middleware.MetricasMiddleware',
+    'reclamaciones.middleware.CompresionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -79,11 +81,25 @@ TEMPLATES = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'usuarios.authentication.TenantJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    # orjson si está instalado; la salida es la misma que la del JSONRenderer de DRF
+    'DEFAULT_RENDERER_CLASSES': [
+        'reclamaciones.renderers.RapidJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'reclamaciones.renderers.RapidJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Proxys propios delante de Django (nginx = 1). La IP de los límites del formulario y
+    # del login sale de X-Forwarded-For solo si hay proxys; con 0 se usa REMOTE_ADDR. No
+    # dejarlo en None: DRF tomaría el X-Forwarded-For que manda el cliente tal cual
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
 }
 
 WSGI_APPLICATION = 'server_canal_virtual.wsgi.application'
@@ -110,9 +126,25 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # En archivo (no en memoria) para que las pruebas de concurrencia puedan
+            # abrir varias conexiones que esperan el bloqueo en vez de fallar
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 
+# Cache. LocMem es de cada proceso: con más de un worker, lo que debe verse entre
+# procesos (USUARIOS_CACHE_TENANT, USUARIOS_LOGIN, RECLAMACIONES_LIMITES con BACKEND
+# 'cache') necesita Redis o Memcached, p. ej. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# y CACHE_LOCATION=redis://127.0.0.1:6379/1. WORKERS es el mismo WEB_CONCURRENCY que lee
+# gunicorn; si pasa de 1 con LocMem en esos caches, el arranque falla (reclamaciones/cache.py).
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+WORKERS = config('WEB_CONCURRENCY', default=1, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -121,6 +153,25 @@ AUTH_USER_MODEL = 'usuarios.Usuario'
 
 
 
+# PBKDF2 con iteraciones configurables (usuarios/hashers.py); los hashes con otro número
+# se recalculan en el siguiente login. El resto son los de Django, para hashes antiguos
+PASSWORD_HASHERS = [
+    'usuarios.hashers.PBKDF2Hasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+USUARIOS_PBKDF2_ITERACIONES = config('PBKDF2_ITERACIONES', default=1_000_000, cast=int)
+
+# Intentos fallidos de login por IP y por cuenta dentro de VENTANA segundos (usuarios/login.py)
+USUARIOS_LOGIN = {
+    'INTENTOS_IP': config('LOGIN_INTENTOS_IP', default=20, cast=int),
+    'INTENTOS_CUENTA': config('LOGIN_INTENTOS_CUENTA', default=5, cast=int),
+    'VENTANA': config('LOGIN_VENTANA', default=900, cast=int),
+    'DJANGO_CACHE': config('CACHE_LOGIN_DJANGO', default='default'),
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -139,6 +190,7 @@ AUTH_PASSWORD_VALIDATORS = [
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    'TOKEN_OBTAIN_SERIALIZER': 'usuarios.authentication.TenantTokenObtainPairSerializer',
 }
 
 # Internationalization
@@ -164,4 +216,136 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-CORS_ALLOWED_ORIGINS = ["http://localhost:5173",'https://mi.canalvirtual.pe',"http://192.168.1.114:5173"]
\ No newline at end of file
+CORS_ALLOWED_ORIGINS = ["http://localhost:5173",'https://mi.canalvirtual.pe',"http://192.168.1.114:5173"]
+# Cache de resolución de libros del formulario público (ver reclamaciones/cache.py).
+# DJANGO_CACHE: alias de CACHES para compartir entre workers, o vacío para solo memoria local
+RECLAMACIONES_CACHE_LIBROS = {
+    'MAXSIZE': 1024,
+    'TTL': config('CACHE_LIBROS_TTL', default=60, cast=int),
+    'DJANGO_CACHE': config('CACHE_LIBROS_DJANGO', default='') or None,
+}
+
+# Registro en memoria de los estados de reclamación (ver reclamaciones/cache.py).
+# MAX_AGE: Cache-Control de /api/estados/ (los clientes lo guardan ese tiempo).
+# RECARGA_MINIMA: segundos entre recargas por un id de estado desconocido
+RECLAMACIONES_CACHE_ESTADOS = {
+    'TTL': config('CACHE_ESTADOS_TTL', default=300, cast=int),
+    'RECARGA_MINIMA': config('CACHE_ESTADOS_RECARGA_MINIMA', default=5, cast=int),
+    'MAX_AGE': config('CACHE_ESTADOS_MAX_AGE', default=3600, cast=int),
+}
+
+# Datos de usuario y proveedor de los requests autenticados (ver usuarios/authentication.py).
+# DJANGO_CACHE: alias de CACHES para los datos y las marcas de invalidación; con varios
+# workers tiene que ser compartido
+USUARIOS_CACHE_TENANT = {
+    'TTL': config('CACHE_TENANT_TTL', default=300, cast=int),
+    'DJANGO_CACHE': config('CACHE_TENANT_DJANGO', default='default'),
+}
+
+# Generador de codigo_hoja (ver reclamaciones/codigos.py). BLOQUE: números que reserva
+# cada worker por vez; más grande = menos bloqueos, más saltos si el worker se reinicia
+RECLAMACIONES_CODIGO_HOJA = {
+    'GENERADOR': 'reclamaciones.codigos.GeneradorSecuencial',
+    'OPCIONES': {'bloque': config('CODIGO_HOJA_BLOQUE', default=50, cast=int)},
+}
+
+# Logging estructurado (ver reclamaciones/logging.py). Cada logger se prende con su
+# nivel desde el entorno, p. ej. LOG_LEVEL_INTAKE=DEBUG; LOG_SAMPLE_RATE muestrea
+# los registros por debajo de WARNING (1.0 = todos)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'muestreo': {
+            '()': 'reclamaciones.logging.MuestreoFilter',
+            'tasa': config('LOG_SAMPLE_RATE', default=1.0, cast=float),
+        },
+        'redactar': {'()': 'reclamaciones.logging.RedactarFilter'},
+    },
+    'formatters': {
+        'json': {'()': 'reclamaciones.logging.JSONFormatter'},
+    },
+    'handlers': {
+        'cola': {
+            'class': 'reclamaciones.logging.NonBlockingHandler',
+            'formatter': 'json',
+            'filters': ['muestreo', 'redactar'],
+        },
+    },
+    'loggers': {
+        'reclamaciones.intake': {
+            'handlers': ['cola'], 'propagate': False,
+            'level': config('LOG_LEVEL_INTAKE', default='WARNING'),
+        },
+        'reclamaciones.libros': {
+            'handlers': ['cola'], 'propagate': False,
+            'level': config('LOG_LEVEL_LIBROS', default='WARNING'),
+        },
+        'reclamaciones.rendimiento': {
+            'handlers': ['cola'], 'propagate': False,
+            'level': config('LOG_LEVEL_RENDIMIENTO', default='WARNING'),
+        },
+        'usuarios.login': {
+            'handlers': ['cola'], 'propagate': False,
+            'level': config('LOG_LEVEL_LOGIN', default='WARNING'),
+        },
+    },
+}
+
+# Métricas por vista (ver reclamaciones/middleware.py). Se avisa en el log
+# 'reclamaciones.rendimiento' cuando una vista pasa su presupuesto de consultas
+RECLAMACIONES_PRESUPUESTO_CONSULTAS = {
+    'default': config('PRESUPUESTO_CONSULTAS', default=30, cast=int),
+}
+# /api/_metrics: el scraper manda "Authorization: Bearer <METRICS_TOKEN>" (vacío = solo
+# usuarios staff con sesión). Server-Timing solo se agrega con DEBUG o para staff
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Compresión de respuestas (reclamaciones.middleware.CompresionMiddleware).
+# brotli se usa si el paquete está instalado y el cliente lo acepta.
+RECLAMACIONES_COMPRESION = {
+    'MIN_BYTES': config('COMPRESION_MIN_BYTES', default=1024, cast=int),
+    'NIVEL_GZIP': config('COMPRESION_NIVEL_GZIP', default=6, cast=int),
+    'NIVEL_BROTLI': config('COMPRESION_NIVEL_BROTLI', default=4, cast=int),
+}
+
+# Vistas async para el formulario público y obtener-url (ver reclamaciones/urls.py).
+# Activar solo si se sirve con ASGI: uvicorn server_canal_virtual.asgi:application
+# (o gunicorn -k uvicorn.workers.UvicornWorker). Bajo WSGI cada request async
+# necesita su propio event loop y es más lento que la vista síncrona.
+RECLAMACIONES_INTAKE_ASYNC = config('INTAKE_ASYNC', default=False, cast=bool)
+
+# Límites del formulario público (reclamaciones/limites.py). CUBETAS: token bucket por IP
+# y por huella del cliente (la IP depende de REST_FRAMEWORK['NUM_PROXIES']). BACKEND: 'local' (por proceso) o 'cache'
+# (CACHES[DJANGO_CACHE], compartido). Con el p95 de las consultas sobre P95_BD_MAXIMO_MS
+# (0 = nunca) se responde 503 sin validar el envío
+RECLAMACIONES_LIMITES = {
+    'BACKEND': config('LIMITES_BACKEND', default='local'),
+    'DJANGO_CACHE': config('LIMITES_DJANGO_CACHE', default='default'),
+    'CUBETAS': {
+        'ip': {
+            'CAPACIDAD': config('LIMITE_IP_CAPACIDAD', default=30, cast=int),
+            'POR_MINUTO': config('LIMITE_IP_POR_MINUTO', default=30, cast=int),
+        },
+        'huella': {
+            'CAPACIDAD': config('LIMITE_HUELLA_CAPACIDAD', default=5, cast=int),
+            'POR_MINUTO': config('LIMITE_HUELLA_POR_MINUTO', default=5, cast=int),
+        },
+    },
+    'P95_BD_MAXIMO_MS': config('LIMITES_P95_BD_MS', default=500, cast=int),
+}
+
+# Almacén de adjuntos por hash (reclamaciones/adjuntos.py). DESCARGA: 'django' (FileResponse),
+# 'x-accel' (nginx, con una location internal en PREFIJO_INTERNO apuntando a DIRECTORIO)
+# o 'x-sendfile' (Apache mod_xsendfile)
+RECLAMACIONES_ADJUNTOS = {
+    'DIRECTORIO': config('ADJUNTOS_DIR', default=str(BASE_DIR / 'adjuntos')),
+    'TAMANO_MAXIMO': config('ADJUNTOS_TAMANO_MAXIMO', default=10 * 1024 * 1024, cast=int),
+    'CUOTA_PROVEEDOR': config('ADJUNTOS_CUOTA', default=1024 ** 3, cast=int),
+    'VENTANA_ANONIMA': config('ADJUNTOS_VENTANA_SEGUNDOS', default=3600, cast=int),
+    'MAXIMO_ANONIMOS': config('ADJUNTOS_MAXIMO_ANONIMOS', default=5, cast=int),
+    'CUOTA_ANONIMA': config('ADJUNTOS_CUOTA_ANONIMA', default=25 * 1024 * 1024, cast=int),
+    'GRACIA_HUERFANOS': config('ADJUNTOS_GRACIA_HUERFANOS', default=24 * 3600, cast=int),
+    'DESCARGA': config('ADJUNTOS_DESCARGA', default='django'),
+    'PREFIJO_INTERNO': config('ADJUNTOS_PREFIJO_INTERNO', default='/_adjuntos/'),
+}
@@ -16,10 +16,8 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
+from rest_framework_simplejwt.views import TokenRefreshView
+from usuarios.views import TokenView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -27,6 +25,6 @@ urlpatterns = [
     path('api/', include('reclamaciones.urls')),
     
     # Endpoints de autenticación JWT    
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/', TokenView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class UsuariosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'usuarios'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from reclamaciones.cache import exigir_caches_compartidos
+        from .authentication import config as config_tenant
+        from .login import config as config_login
+
+        # Desactivar un usuario o cambiarle el proveedor tiene que llegar a todos los workers
+        exigir_caches_compartidos(
+            USUARIOS_CACHE_TENANT=config_tenant()['DJANGO_CACHE'], USUARIOS_LOGIN=config_login()['DJANGO_CACHE'],
+        )
@@ -0,0 +1,188 @@
+"""
+Autenticación JWT sin consultas a la base en cada request.
+
+JWTAuthentication de simplejwt carga el Usuario en cada request y las vistas después
+cargan su proveedor. Aquí los tokens que emite el login llevan en el claim `tenant` lo
+que las vistas usan para filtrar (proveedor_id, role, is_superuser, is_staff), y
+TenantJWTAuthentication arma con eso un UsuarioToken: un usuario liviano que solo va a
+la base si la vista pide algo más (email, el proveedor completo, set_password...).
+También deja request.tenant con el usuario y su proveedor.
+
+Los claims valen mientras el usuario no cambie: al guardar un Usuario o su Proveedor,
+signals.py deja en el cache una marca con la hora del cambio y los tokens emitidos antes
+se resuelven con los datos actuales (cache de TTL corto o, si no están, una consulta).
+Marcas y datos van en CACHES[USUARIOS_CACHE_TENANT['DJANGO_CACHE']]; con varios workers
+tiene que ser un cache compartido (Redis, Memcached) para que la invalidación llegue a todos.
+"""
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+CLAIM = 'tenant'
+CAMPOS = ('proveedor_id', 'role', 'is_superuser', 'is_staff')
+
+
+def config():
+    valores = {'TTL': 300, 'DJANGO_CACHE': 'default'}
+    valores.update(getattr(settings, 'USUARIOS_CACHE_TENANT', {}))
+    return valores
+
+
+def _cache():
+    return caches[config()['DJANGO_CACHE']]
+
+
+def clave_datos(usuario_id):
+    return f'usuarios:tenant:{usuario_id}'
+
+
+def clave_cambio(usuario_id):
+    return f'usuarios:tenant:{usuario_id}:cambio'
+
+
+def datos_de(usuario):
+    return {campo: getattr(usuario, campo) for campo in CAMPOS}
+
+
+def datos_actuales(usuario_id):
+    """CAMPOS más is_active del usuario, del cache o de la base; None si no existe."""
+    cache = _cache()
+    datos = cache.get(clave_datos(usuario_id))
+    if datos is None:
+        filtro = {jwt_settings.USER_ID_FIELD: usuario_id}
+        datos = get_user_model().objects.filter(**filtro).values('is_active', *CAMPOS).first()
+        if datos is None:
+            return None
+        cache.set(clave_datos(usuario_id), datos, config()['TTL'])
+    return datos
+
+
+def claims_vigentes(usuario_id, claims):
+    cambio = _cache().get(clave_cambio(usuario_id))
+    return cambio is None or cambio < claims.get('emitido', 0)
+
+
+def invalidar(*usuario_ids):
+    cache = _cache()
+    # La marca dura lo que un refresh token: después ya no queda ningún token anterior
+    vigencia = jwt_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+    ahora = time.time()
+    cache.delete_many([clave_datos(usuario_id) for usuario_id in usuario_ids])
+    cache.set_many({clave_cambio(usuario_id): ahora for usuario_id in usuario_ids}, vigencia)
+
+
+def invalidar_al_confirmar(*usuario_ids):
+    # Ya y otra vez después del commit, igual que invalidar_libros: un request que lea
+    # los datos viejos mientras la transacción sigue abierta no los deja en el cache
+    if not usuario_ids:
+        return
+    invalidar(*usuario_ids)
+    transaction.on_commit(lambda: invalidar(*usuario_ids))
+
+
+# --- Tokens ---
+
+class TenantRefreshToken(RefreshToken):
+    """RefreshToken con el claim `tenant`; el access token (también al refrescar) lo copia."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[CLAIM] = {**datos_de(user), 'emitido': time.time()}
+        return token
+
+
+# POST /api/token/ (SIMPLE_JWT['TOKEN_OBTAIN_SERIALIZER'])
+class TenantTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = TenantRefreshToken
+
+
+# --- Autenticación ---
+
+@dataclass(frozen=True)
+class Tenant:
+    usuario_id: int
+    proveedor_id: int | None
+    role: str
+    is_superuser: bool
+
+
+class UsuarioToken:
+    """
+    Usuario autenticado armado con los claims del token (o con el cache). Tiene lo que
+    usan los permisos y TenantQuerySet.for_user; cualquier otro atributo carga el Usuario
+    real, con su proveedor, la primera vez que se pide.
+    """
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, usuario_id, datos):
+        self.pk = self.id = usuario_id
+        for campo in CAMPOS:
+            setattr(self, campo, datos[campo])
+
+    @cached_property
+    def usuario(self):
+        modelo = get_user_model()
+        try:
+            return modelo.objects.select_related('proveedor').get(pk=self.pk)
+        except modelo.DoesNotExist:
+            raise AuthenticationFailed('Usuario no encontrado', code='user_not_found')
+
+    def __getattr__(self, nombre):
+        # Solo llega aquí lo que no está en la instancia ni en la clase
+        if nombre.startswith('__'):
+            raise AttributeError(nombre)
+        return getattr(self.usuario, nombre)
+
+    def __eq__(self, otro):
+        if isinstance(otro, (UsuarioToken, get_user_model())):
+            return self.pk == otro.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __str__(self):
+        return str(self.usuario)
+
+
+class TenantJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        resultado = super().authenticate(request)
+        if resultado is not None:
+            user = resultado[0]
+            tenant = Tenant(user.pk, user.proveedor_id, user.role, user.is_superuser)
+            # En el HttpRequest de Django: el Request de DRF lo lee de ahí
+            getattr(request, '_request', request).tenant = tenant
+        return resultado
+
+    def get_user(self, validated_token):
+        try:
+            usuario_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('El token no identifica a ningún usuario')
+
+        claims = validated_token.get(CLAIM)
+        if claims is not None and claims_vigentes(usuario_id, claims):
+            return UsuarioToken(usuario_id, claims)
+
+        # Token anterior a los claims, o el usuario cambió después de emitirlo
+        datos = datos_actuales(usuario_id)
+        if datos is None:
+            raise AuthenticationFailed('Usuario no encontrado', code='user_not_found')
+        if not datos['is_active']:
+            raise AuthenticationFailed('Usuario inactivo', code='user_inactive')
+        return UsuarioToken(usuario_id, datos)
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class PBKDF2Hasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 con las iteraciones de USUARIOS_PBKDF2_ITERACIONES. Mismo algoritmo que
+    el de Django, así los hashes existentes siguen valiendo; los que tienen otra cantidad
+    de iteraciones se recalculan solos en el siguiente login (check_password -> must_update).
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'USUARIOS_PBKDF2_ITERACIONES', PBKDF2PasswordHasher.iterations)
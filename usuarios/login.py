@@ -0,0 +1,66 @@
+"""
+Límite de intentos fallidos de login, por IP y por cuenta desde esa IP.
+
+Los contadores viven en el cache (CACHES[USUARIOS_LOGIN['DJANGO_CACHE']]) durante
+VENTANA segundos desde el primer fallo. Cuando alguno llega a su máximo, LoginView y
+TokenView (/api/token/) responden 429 antes de buscar al usuario o correr el hasher,
+así una ráfaga de credential stuffing no deja a todos los workers calculando PBKDF2.
+
+El contador de la cuenta va junto con la IP: si fuera solo por cuenta, cualquiera que
+conozca un email podría dejar a su dueño sin poder entrar. La IP sale como en los
+throttles de DRF (REMOTE_ADDR, o X-Forwarded-For según REST_FRAMEWORK['NUM_PROXIES']).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+
+def config():
+    valores = {
+        'INTENTOS_IP': 20,
+        'INTENTOS_CUENTA': 5,
+        'VENTANA': 900,
+        'DJANGO_CACHE': 'default',
+    }
+    valores.update(getattr(settings, 'USUARIOS_LOGIN', {}))
+    return valores
+
+
+def _cache():
+    return caches[config()['DJANGO_CACHE']]
+
+
+def claves(request, email):
+    ip = BaseThrottle().get_ident(request)
+    cuenta = hashlib.sha256(f"{(email or '').strip().lower()}|{ip}".encode()).hexdigest()[:32]
+    return {
+        'INTENTOS_IP': f'usuarios:login:ip:{ip}',
+        'INTENTOS_CUENTA': f'usuarios:login:cuenta:{cuenta}',
+    }
+
+
+def bloqueado(request, email):
+    """True si la IP o la cuenta ya agotaron sus intentos en la ventana actual."""
+    ajustes = config()
+    por_limite = claves(request, email)
+    fallos = _cache().get_many(list(por_limite.values()))
+    return any(fallos.get(clave, 0) >= ajustes[limite] for limite, clave in por_limite.items())
+
+
+def registrar_fallo(request, email):
+    cache = _cache()
+    ventana = config()['VENTANA']
+    for clave in claves(request, email).values():
+        # add() fija la ventana solo con el primer fallo; incr() no la renueva
+        if not cache.add(clave, 1, ventana):
+            try:
+                cache.incr(clave)
+            except ValueError:  # expiró entre add() e incr()
+                cache.add(clave, 1, ventana)
+
+
+def limpiar(request, email):
+    """Login correcto: la cuenta en esta IP vuelve a empezar (la IP no, puede estar probando varias)."""
+    _cache().delete(claves(request, email)['INTENTOS_CUENTA'])
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from reclamaciones.models import Proveedor
+from .authentication import invalidar_al_confirmar
+from .models import Usuario
+
+
+# Los tokens emitidos antes de un cambio dejan de usar sus claims (ver authentication.py)
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def usuario_modificado(sender, instance, update_fields=None, **kwargs):
+    # last_login no va en el token
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidar_al_confirmar(instance.pk)
+
+
+@receiver(post_save, sender=Proveedor)
+@receiver(post_delete, sender=Proveedor)
+def proveedor_modificado(sender, instance, **kwargs):
+    invalidar_al_confirmar(*Usuario.objects.filter(proveedor_id=instance.pk).values_list('pk', flat=True))
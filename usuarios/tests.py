@@ -1,3 +1,143 @@
-from django.test import TestCase
+from django.contrib.auth.hashers import identify_hasher
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from reclamaciones.models import Proveedor
+from reclamaciones.sembrado import sembrar
+from .authentication import TenantJWTAuthentication, TenantRefreshToken
+from .models import Usuario
+
+
+def crear_proveedor(ruc='20123456789'):
+    return Proveedor.objects.create(
+        razon_social=f'Proveedor {ruc}', ruc=ruc, domicilio_fiscal='Av. Siempre Viva 123',
+        telefono='999999999', email_contacto=f'{ruc}@proveedor.pe'
+    )
+
+
+class TenantJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.proveedor = crear_proveedor()
+        self.usuario = Usuario.objects.create_user(
+            email='usuario@proveedor.pe', password='ClaveSegura123', proveedor=self.proveedor, role='admin'
+        )
+
+    def autenticar(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        user, _ = TenantJWTAuthentication().authenticate(request)
+        return user, request
+
+    def test_login_emite_claims_y_autentica_sin_consultas(self):
+        response = APIClient().post('/api/login', {'email': 'usuario@proveedor.pe', 'password': 'ClaveSegura123'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(0):
+            user, request = self.autenticar(response.json()['access'])
+            self.assertEqual(user.proveedor_id, self.proveedor.id)
+            self.assertFalse(user.is_superuser)
+            self.assertEqual(request.tenant.proveedor_id, self.proveedor.id)
+            self.assertEqual(request.tenant.role, 'admin')
+        # Lo que no va en el token se carga del Usuario real, una sola vez
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'usuario@proveedor.pe')
+            self.assertEqual(user.proveedor.ruc, self.proveedor.ruc)
+
+    def test_token_sin_claims_usa_el_cache(self):
+        token = str(RefreshToken.for_user(self.usuario).access_token)
+        with self.assertNumQueries(1):
+            self.autenticar(token)
+        with self.assertNumQueries(0):
+            user, _ = self.autenticar(token)
+        self.assertEqual(user.proveedor_id, self.proveedor.id)
+
+    def test_cambios_del_usuario_invalidan_los_claims(self):
+        token = str(TenantRefreshToken.for_user(self.usuario).access_token)
+        otro = crear_proveedor('20987654321')
+
+        self.usuario.proveedor = otro
+        self.usuario.save()
+        user, request = self.autenticar(token)
+        self.assertEqual(user.proveedor_id, otro.id)
+        self.assertEqual(request.tenant.proveedor_id, otro.id)
+
+        self.usuario.is_active = False
+        self.usuario.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.autenticar(token)
+
+
+class LoginTests(TestCase):
+    credenciales = {'email': 'usuario@proveedor.pe', 'password': 'ClaveSegura123'}
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user(proveedor=crear_proveedor(), **self.credenciales)
+
+    def entrar(self, **datos):
+        return APIClient().post('/api/login', {**self.credenciales, **datos}, format='json')
+
+    def test_una_consulta_y_rehash_con_otras_iteraciones(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.entrar().status_code, 200)
+
+        with override_settings(USUARIOS_PBKDF2_ITERACIONES=1000):
+            # Búsqueda + guardar el hash recalculado
+            with self.assertNumQueries(2):
+                response = self.entrar()
+            self.assertEqual(response.status_code, 200)
+            self.usuario.refresh_from_db()
+            self.assertEqual(identify_hasher(self.usuario.password).decode(self.usuario.password)['iterations'], 1000)
+            with self.assertNumQueries(1):
+                self.entrar()
+
+    @override_settings(USUARIOS_LOGIN={'INTENTOS_CUENTA': 3, 'INTENTOS_IP': 100, 'VENTANA': 60})
+    def test_bloquea_la_cuenta_antes_de_consultar(self):
+        for _ in range(3):
+            self.assertEqual(self.entrar(password='incorrecta').status_code, 401)
+        # Ni siquiera la clave correcta pasa, y no se toca la base
+        with self.assertNumQueries(0):
+            response = self.entrar()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+
+
+    @override_settings(USUARIOS_LOGIN={'INTENTOS_CUENTA': 3, 'INTENTOS_IP': 100, 'VENTANA': 60})
+    def test_la_cuenta_se_bloquea_solo_desde_la_ip_que_falla(self):
+        for _ in range(3):
+            self.assertEqual(self.entrar(password='incorrecta').status_code, 401)
+        self.assertEqual(self.entrar().status_code, 429)
+        # El dueño, desde otra IP, sigue entrando
+        response = APIClient(REMOTE_ADDR='10.1.1.1').post('/api/login', self.credenciales, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(USUARIOS_LOGIN={'INTENTOS_CUENTA': 3, 'INTENTOS_IP': 100, 'VENTANA': 60})
+    def test_api_token_tiene_los_mismos_limites(self):
+        client = APIClient()
+        token = {'username': self.credenciales['email'], 'password': self.credenciales['password']}
+        self.assertEqual(client.post('/api/token/', token, format='json').status_code, 200)
+        for _ in range(3):
+            self.assertEqual(client.post('/api/token/', {**token, 'password': 'incorrecta'}, format='json').status_code, 401)
+        with self.assertNumQueries(0):
+            response = client.post('/api/token/', token, format='json')
+        self.assertEqual(response.status_code, 429)
+        # Comparte el contador con /api/login
+        self.assertEqual(self.entrar().status_code, 429)
+
+class UsuariosSembradosTests(TestCase):
+    @override_settings(USUARIOS_PBKDF2_ITERACIONES=1000)
+    def test_cada_proveedor_sembrado_tiene_un_admin(self):
+        cache.clear()
+        sembrar(5, proveedores=3, semilla=1, password='ClaveSembrada123')
+        usuarios = Usuario.objects.filter(email__endswith='.canal.invalid').select_related('proveedor')
+        self.assertEqual(len(usuarios), 3)
+        for usuario in usuarios:
+            self.assertEqual(usuario.email, f'admin@{usuario.proveedor.ruc}.canal.invalid')
+
+        response = APIClient().post('/api/login', {'email': usuarios[0].email, 'password': 'ClaveSembrada123'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        TenantJWTAuthentication().authenticate(request)
+        self.assertEqual(request.tenant.proveedor_id, usuarios[0].proveedor_id)
@@ -1,12 +1,17 @@
-from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth import get_user_model
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 from reclamaciones.serializers import ProveedorSerializer
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import status, serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.views import TokenObtainPairView
+from . import login
+from .authentication import TenantRefreshToken
+import logging
 
 User = get_user_model()
+logger = logging.getLogger('usuarios.login')
 #Crear las vistas
 # Serializador para representar al "cliente" (usuario)
 class UsuarioSerializer(serializers.ModelSerializer):
@@ -16,38 +21,68 @@ class UsuarioSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'email', 'password', 'proveedor', 'role', 'created_at', 'is_active']
 
+def respuesta_bloqueado(email):
+    logger.warning("Login bloqueado por intentos fallidos", extra={'email': email})
+    return Response(
+        {"error": "Demasiados intentos fallidos. Intente más tarde."},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={'Retry-After': str(login.config()['VENTANA'])},
+    )
+
 # POST /api/login
+# Una sola consulta (usuario + proveedor) y check_password directo, sin authenticate(),
+# que volvería a buscar al usuario. Los intentos fallidos se limitan por IP y por cuenta
+# (login.py) y se rechazan antes de correr el hasher.
 class LoginView(APIView):
     permission_classes = [AllowAny]
     
     def post(self, request):
-        print(request.data)
+        logger.debug("Intento de login", extra={'datos': request.data})
         email = request.data.get('email')
         password = request.data.get('password')
 
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
+        if login.bloqueado(request, email):
+            return respuesta_bloqueado(email)
+
+        user = User.objects.select_related('proveedor').filter(email=email).first() if email else None
+        if user is None:
+            login.registrar_fallo(request, email)
             return Response({"error": "Correo no registrado."}, status=status.HTTP_401_UNAUTHORIZED)
 
-        # Autenticar con username=email
-        user = authenticate(username=email, password=password)
-        if user is not None:
-            if not user.is_active:
-                return Response({"error": "Usuario inactivo."}, status=status.HTTP_403_FORBIDDEN)
+        # Si el hash tiene otro número de iteraciones, check_password lo recalcula y guarda
+        if not password or not user.check_password(password):
+            login.registrar_fallo(request, email)
+            return Response({"error": "Credenciales inválidas."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if not user.is_active:
+            return Response({"error": "Usuario inactivo."}, status=status.HTTP_403_FORBIDDEN)
 
-            refresh = RefreshToken.for_user(user)
+        login.limpiar(request, email)
+        refresh = TenantRefreshToken.for_user(user)
 
-            return Response({
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-                'user_id': user.id,
-                'username': user.username,
-                'role': getattr(user, 'role', None),
-                'proveedor': ProveedorSerializer(user.proveedor).data if user.proveedor else None,
-            })
+        return Response({
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+            'user_id': user.id,
+            'username': user.username,
+            'role': getattr(user, 'role', None),
+            'proveedor': ProveedorSerializer(user.proveedor).data if user.proveedor else None,
+        })
 
-        return Response({"error": "Credenciales inválidas."}, status=status.HTTP_401_UNAUTHORIZED)
+# POST /api/token/ (simplejwt, con TenantTokenObtainPairSerializer): los mismos límites
+# de intentos fallidos que LoginView, para que no sea la puerta trasera sin límite
+class TokenView(TokenObtainPairView):
+    def post(self, request, *args, **kwargs):
+        identificador = request.data.get(User.USERNAME_FIELD)
+        if login.bloqueado(request, identificador):
+            return respuesta_bloqueado(identificador)
+        try:
+            response = super().post(request, *args, **kwargs)
+        except AuthenticationFailed:
+            login.registrar_fallo(request, identificador)
+            raise
+        login.limpiar(request, identificador)
+        return response
 
 # GET /api/Usuario
 class UsuarioView(APIView):